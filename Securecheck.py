@@ -1,471 +1,465 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
 import streamlit as st
 import pandas as pd
-import pymysql
 import plotly.express as px
-from contextlib import contextmanager
+from backends import backend
+from codes import OUTCOME_CHOICES, VIOLATION_CHOICES, codes_backfilled
+from crossfilter import FILTER_COLUMNS, CrossFilter
+from db import get_db_cursor, pool
+from instrumentation import query_log
+from live_metrics import LiveMetrics
+from metrics import (coded_core_metrics_query, core_metrics_query, merge_metrics_cubes, snapshot_metrics_cube,
+                     summarize_core_metrics)
+from migrate import generated_columns_present
+from prediction import FORM_DURATIONS, FORM_GENDERS, PredictionIndex
+from queries import filter_stop_dates, indexed_query_map, query_map, query_options, use_code_columns
+from result_cache import result_cache
+from rollups import ROLLUP_QUERY_MAP, RollupRefresher, rollup_query
+from schema import optimize_frame
+from sketches import APPROXIMATE_QUERIES, ApproximateStats
+from snapshot import LocalSnapshot
+from watchlist import WatchlistIndex
+from write_behind import log_writer
 
 # --- Configuration ---
 st.set_page_config(page_title="Dashboard-Securecheck", layout="wide")
 
 # --- 1. DATABASE FUNCTIONS ---
 
-# Use contextmanager to ensure connection is properly closed, even when exceptions occur.
-# This pattern is safer for non-Streamlit caching when you need to be sure it closes.
-@contextmanager
-def get_db_cursor():
-    """A context manager to manage database connection and cursor."""
-    connection = None
+# Queries run on the backend chosen in backends.py: MySQL through the process-wide connection pool,
+# or the embedded DuckDB copy of the local snapshot (SECURECHECK_BACKEND=duckdb) for offline use.
+def run_query(query):
+    """Runs a query on the active backend and returns a typed DataFrame."""
+    started = time.perf_counter()
+    df = backend.execute(query)
+    db_ms = (time.perf_counter() - started) * 1000
+
+    if not df.empty:
+        # Compact dtypes (categories, nullable booleans, small ints) for known columns
+        df = optimize_frame(df)
+
+    event = {'query': query, 'backend': backend.name, 'db_ms': round(db_ms, 3), 'rows': len(df),
+             'result_bytes': int(df.memory_usage(deep=True).sum())}
+    if query_log.explain_enabled:
+        event['plan'], event['full_scan'] = backend.explain(query)
+    query_log.record('database', **event)
+    return df
+
+
+# Results are cached per (query, table version) in result_cache.py, shared by all sessions, so a new
+# stop invalidates them immediately instead of after a fixed one-hour TTL. The date range is written
+# into the SQL itself, so each window is cached separately and MySQL prunes to its partitions.
+def fetch_data(query, date_range=None):
+    """Fetches data from the database using the provided query, limited to `date_range` if given."""
+    query = filter_stop_dates(query, date_range)
+    started = time.perf_counter()
     try:
-        
-        connection = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='usha',
-            database='securecheck',
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        yield connection.cursor()
+        df, cache_status = result_cache.get_with_status(query, run_query)
     except Exception as e:
-        # Print error to the console for debugging, as st.error cannot be used inside st.cache_data
-        print(f"Database Connection Error: {e}")
-        raise
-    finally:
-        if connection:
-            connection.close()
-            
-# Use st.cache_data for fetching data. We rely on get_db_cursor for transient connections.
-@st.cache_data(ttl=3600) # Cache the data for 1 hour
-def fetch_data(query):
-    """Fetches data from the database using the provided query."""
-    
-    try:
-        with get_db_cursor() as cursor:
-            cursor.execute(query)
-            result = cursor.fetchall()
-            df = pd.DataFrame(result)
-            
-            if not df.empty:
-                 # Standardize column names to lowercase for consistent DataFrame access
-                df.columns = df.columns.str.lower()
-            return df
-    except Exception as e:
-        # Display the error to the user outside of the caching layer
+        query_log.record('fetch_data', query=query, wall_ms=round((time.perf_counter() - started) * 1000, 3),
+                         cache='error', error=str(e))
+        # Display the error to the user; failed queries are not cached
         st.error(f"Query Execution Error: The database might be unavailable or the query is invalid. Details: {e}")
         return pd.DataFrame()
+    query_log.record('fetch_data', query=query, wall_ms=round((time.perf_counter() - started) * 1000, 3),
+                     cache=cache_status, rows=len(df))
+    return df
+
+
+# Keyset pagination for the ledger: each page continues after the last (stop_date, stop_time, log_id)
+# seen instead of using OFFSET over the whole table. log_id breaks ties between stops with the same
+# timestamp, so no row is repeated or lost between pages, and idx_stop_date_time (migrate.py) serves
+# the order without a filesort.
+@st.cache_data(ttl=60)
+def fetch_ledger_page(page_key, page_size, descending, date_range=None):
+    """Fetches one ledger page starting after `page_key` = (stop_date, stop_time, log_id)."""
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+    query = "SELECT * FROM policelog_data WHERE stop_date IS NOT NULL AND stop_time IS NOT NULL"
+    params = []
+    if date_range is not None:
+        query += " AND stop_date >= %s AND stop_date <= %s"
+        params = list(date_range)
+    if page_key is not None:
+        query += f" AND (stop_date, stop_time, log_id) {comparison} (%s, %s, %s)"
+        params += list(page_key)
+    query += f" ORDER BY stop_date {direction}, stop_time {direction}, log_id {direction} LIMIT %s"
+    params += [page_size]
+
+    try:
+        df = backend.execute(query, params)
+    except Exception as e:
+        st.error(f"Ledger Page Error: The database might be unavailable. Details: {e}")
+        return pd.DataFrame(), None
+
+    if df.empty:
+        return df, None
+
+    # Build the key for the following page from the last row of this one
+    last = df.iloc[-1]
+    next_key = (last['stop_date'], last['stop_time'], int(last['log_id'])) if len(df) == page_size else None
+    return df, next_key
+
+
+def render_ledger(date_range=None):
+    """Renders the paginated "Crime report summary" ledger, one page per request."""
+    setting_col1, setting_col2 = st.columns(2)
+    with setting_col1:
+        sort_order = st.selectbox("Sort by Stop Date/Time", ["Newest first", "Oldest first"], key="ledger_sort")
+    with setting_col2:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250, 500], index=1, key="ledger_page_size")
+
+    # Page keys are a stack so "Previous" can go back without re-scanning; reset it on setting changes
+    settings = (sort_order, page_size, date_range)
+    if st.session_state.get('ledger_settings') != settings:
+        st.session_state.ledger_settings = settings
+        st.session_state.ledger_page_keys = [None]
+
+    page_keys = st.session_state.ledger_page_keys
+    page, next_key = fetch_ledger_page(page_keys[-1], page_size, sort_order == "Newest first", date_range)
+    st.dataframe(page, use_container_width=True)
+
+    nav_col1, nav_col2, nav_col3 = st.columns([1, 1, 4])
+    with nav_col1:
+        if st.button("◀ Previous", disabled=len(page_keys) == 1, key="ledger_prev"):
+            page_keys.pop()
+            st.rerun()
+    with nav_col2:
+        if st.button("Next ▶", disabled=next_key is None, key="ledger_next"):
+            page_keys.append(next_key)
+            st.rerun()
+    with nav_col3:
+        st.caption(f"Page {len(page_keys)} · {len(page)} row(s)")
+
+
+# The local Arrow snapshot is memory-mapped once per process and synced from MySQL on a
+# background thread, so a cold start or a slow database never blocks the page. The embedded
+# backend runs without MySQL, so there the snapshot is only loaded.
+@st.cache_resource
+def get_snapshot():
+    """Returns the process-wide local snapshot of policelog_data."""
+    snapshot = LocalSnapshot()
+    snapshot.load()
+    if not backend.embedded:
+        snapshot.start_background_sync()
+    return snapshot
+
+
+# The vehicle watchlist is built once per process from the snapshot; stops logged from the form are
+# folded in after each batch write. The background sync that picks up every other writer starts with
+# the first vehicle screened, so processes nobody screens vehicles in never poll MySQL for it.
+@st.cache_resource
+def get_watchlist():
+    """Returns the process-wide vehicle watchlist index."""
+    watchlist = WatchlistIndex()
+    watchlist.seed(get_snapshot().frame)
+    return watchlist
+
+
+# The approximate-mode sketches are seeded once per process from the snapshot and then kept current
+# by log_id; the embedded backend has no other writers, so it needs no background sync.
+@st.cache_resource
+def get_approximate_stats():
+    """Returns the process-wide sketches and sample behind approximate mode."""
+    approximate_stats = ApproximateStats()
+    approximate_stats.seed(get_snapshot().frame)
+    if not backend.embedded:
+        approximate_stats.start_background_sync()
+    return approximate_stats
+
+
+# The date range applies to the ledger, the Core Metrics and every analysis query
+DATE_RANGE_PRESETS = {"All time": None, "Last 7 days": 7, "Last 30 days": 30, "Last 365 days": 365}
+
+
+def select_date_range():
+    """Sidebar stop date filter. Returns (first, last) dates, or None for the whole history."""
+    choice = st.sidebar.selectbox("Stop date range", [*DATE_RANGE_PRESETS, "Custom range"], key="date_range_choice")
+    today = date.today()
+    if choice == "Custom range":
+        picked = st.sidebar.date_input("From / to", value=(today - timedelta(days=29), today), key="date_range_custom")
+        # The picker returns a single date while the second one is being chosen
+        return tuple(picked) if len(picked) == 2 else None
+    days = DATE_RANGE_PRESETS[choice]
+    return None if days is None else (today - timedelta(days=days - 1), today)
+
+
+# Bitmap indexes over the local snapshot (crossfilter.py), shared by all sessions and rebuilt in the
+# background after each snapshot sync, so any filter combination is a few bitset operations.
+@st.cache_resource
+def get_crossfilter():
+    """Returns the process-wide cross-filter index holder."""
+    return CrossFilter()
+
+
+def select_cross_filters():
+    """Sidebar cross-filter controls. Returns ({column: [values]}, 'all' or 'any'); empty when unused."""
+    st.sidebar.subheader("Cross-filter")
+    index = get_crossfilter().index_for(get_snapshot())
+    if index is None:
+        st.sidebar.caption("Available once the local snapshot has data.")
+        return {}, 'all'
+    filters = {column: st.sidebar.multiselect(label, index.values[column], key=f"crossfilter_{column}")
+               for column, label in FILTER_COLUMNS.items()}
+    match = st.sidebar.radio("Combine filters", ["Match all (AND)", "Match any (OR)"], horizontal=True,
+                             key="crossfilter_match")
+    return {column: values for column, values in filters.items() if values}, 'all' if match == "Match all (AND)" else 'any'
+
+
+def render_crossfilter_ledger(cross_filters, match, date_range=None):
+    """Renders the ledger for a cross-filter selection from the bitmap index, paginated locally."""
+    setting_col1, setting_col2 = st.columns(2)
+    with setting_col1:
+        sort_order = st.selectbox("Sort by Stop Date/Time", ["Newest first", "Oldest first"], key="ledger_sort")
+    with setting_col2:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250, 500], index=1, key="ledger_page_size")
+
+    settings = (sort_order, page_size, date_range, match, tuple((column, tuple(values)) for column, values in cross_filters.items()))
+    if st.session_state.get('crossfilter_ledger_settings') != settings:
+        st.session_state.crossfilter_ledger_settings = settings
+        st.session_state.crossfilter_page = 0
+
+    index = get_crossfilter().index_for(get_snapshot())
+    rows = index.ledger_rows(index.select(cross_filters, match, date_range), sort_order == "Newest first")
+    page_number = st.session_state.crossfilter_page
+    page = index.frame.iloc[rows[page_number * page_size:(page_number + 1) * page_size]]
+    st.dataframe(page, use_container_width=True)
+
+    nav_col1, nav_col2, nav_col3 = st.columns([1, 1, 4])
+    with nav_col1:
+        if st.button("◀ Previous", disabled=page_number == 0, key="ledger_prev"):
+            st.session_state.crossfilter_page -= 1
+            st.rerun()
+    with nav_col2:
+        if st.button("Next ▶", disabled=(page_number + 1) * page_size >= len(rows), key="ledger_next"):
+            st.session_state.crossfilter_page += 1
+            st.rerun()
+    with nav_col3:
+        st.caption(f"Page {page_number + 1} of {max(1, -(-len(rows) // page_size))} · {len(rows)} matching stop(s) "
+                   f"in the local snapshot (synced up to {get_snapshot().watermark})")
 
 
 # --- 2. MAIN DASHBOARD LOAD ---
 st.title("Securecheck: Police Check Post Digital Ledger")
 st.markdown("Data-driven decision support for modern law enforcement 🛡️ ")
+date_range = select_date_range()
+cross_filters, cross_match = select_cross_filters()
 
-# Load ALL data once for the overview, charts, and prediction section
+# The ledger is paginated server-side, so the full table is never loaded into the page; a cross-filter
+# selection is paginated from the bitmap index instead
 st.header(" Crime report summary")
-all_data_query = "SELECT * FROM policelog_data"
-data = fetch_data(all_data_query)
-st.dataframe(data, use_container_width=True)
+if cross_filters:
+    render_crossfilter_ledger(cross_filters, cross_match, date_range)
+else:
+    render_ledger(date_range)
 
-if data.empty:
+# --- 3. QUICK METRICS ---
+# The metrics panel re-renders on its own every few seconds; only this fragment reruns, not the page
+METRICS_REFRESH_SECONDS = 5
+
+
+# Running totals (live_metrics.py) shared by all sessions and advanced by log_id on a background
+# thread, so reading the Core Metrics never rescans policelog_data.
+@st.cache_resource
+def get_live_metrics():
+    """Returns the process-wide live Core Metrics counters."""
+    live_metrics = LiveMetrics()
+    live_metrics.start_background_sync(interval=METRICS_REFRESH_SECONDS)
+    return live_metrics
+
+
+# After `python codes.py --backfill` the Core Metrics count outcomes by outcome_code instead of text
+@st.cache_data(ttl=300)
+def metrics_query():
+    """Returns coded_core_metrics_query once the code columns are backfilled, otherwise core_metrics_query."""
+    if backend.embedded:
+        return core_metrics_query
+    try:
+        with get_db_cursor() as cursor:
+            return coded_core_metrics_query if codes_backfilled(cursor) else core_metrics_query
+    except Exception as e:
+        print(f"Schema Check Error: {e}")
+        return core_metrics_query
+
+
+def load_core_metrics(date_range=None, cross_filters=None, match='all'):
+    """Returns (core metrics, note). Falls back to the aggregate query, then the snapshot, until
+    the live counters are seeded. Returns (None, None) when there is no data at all.
+
+    The live counters cover the whole history; a date range always runs the aggregate query, and
+    a cross-filter selection is counted from the bitmap index."""
+    if cross_filters:
+        started = time.perf_counter()
+        index = get_crossfilter().index_for(get_snapshot())
+        core_metrics = index.summary(index.select(cross_filters, match, date_range))
+        if not core_metrics['total_stops']:
+            return None, None
+        return core_metrics, (f"Cross-filtered from the local snapshot (synced up to {get_snapshot().watermark}) "
+                              f"in {(time.perf_counter() - started) * 1000:.0f} ms.")
+    if date_range is None and not backend.embedded and get_live_metrics().seeded:
+        return get_live_metrics().summary(), None
+    # core_metrics_query and its reduction live in metrics.py
+    metrics_cube = fetch_data(metrics_query(), date_range)
+    note = None
+    if metrics_cube.empty and get_snapshot().row_count:
+        # MySQL is unavailable: keep serving the metrics from the local snapshot
+        note = f"Showing Core Metrics from the local snapshot (synced up to {get_snapshot().watermark})."
+        frame = get_snapshot().frame
+        if date_range is not None:
+            frame = frame[frame['stop_date'].between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))]
+        metrics_cube = snapshot_metrics_cube(frame)
+    if metrics_cube.empty:
+        return None, None
+    return summarize_core_metrics(metrics_cube), note
+
+
+if load_core_metrics()[0] is None:
     st.error("Cannot proceed. The main dataset (`policelog_data`) failed to load or is empty. Please check your database connection details.")
     st.stop()
-    
-# --- 3. QUICK METRICS ---
-st.header(" Core Metrics")
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    total_stops = data.shape[0]
-    st.metric("Total Police Stops", total_stops)
-
-with col2:
-    # Use the lowercase column name 'stop_outcome' which is standardized above
-    arrests = data[data['stop_outcome'].astype(str).str.contains("arrest", case=False, na=False)].shape[0]
-    st.metric("Total Arrests", arrests)
-
-with col3:
-    warnings = data[data['stop_outcome'].astype(str).str.contains("warning", case=False, na=False)].shape[0]
-    st.metric("Total Warnings", warnings)
-
-with col4:
-    # Assuming 'drugs_related_stop' is 1/0 or TRUE/FALSE. MySQL uses 1 for TRUE.
-    drug_related = data[pd.to_numeric(data['drugs_related_stop'], errors='coerce') == 1].shape[0]
-    st.metric("Drug Related Stops", drug_related)
-
-# --- 4. VISUAL INSIGHTS ---
-st.header(" Visual Insights")
-
-tab1, tab2 = st.tabs(["Stops by Violation", "Driver Gender Distribution"])
-
-with tab1:
-    if not data.empty and 'violation' in data.columns:
-        violation_data = data['violation'].value_counts().reset_index()
-        violation_data.columns = ['Violation', 'Count']
-        fig = px.bar(violation_data, x='Violation', y='Count', title="Stops by Violation Type", color='Violation')
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.warning("No data available for Violation chart.")
-
-with tab2:
-    if not data.empty and 'driver_gender' in data.columns:
-        gender_data = data['driver_gender'].value_counts().reset_index()
-        gender_data.columns = ['Gender', 'Count']
-        fig = px.pie(gender_data, names='Gender', values='Count', title="Driver Gender Distribution")
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.warning("No data available for Driver Gender chart.")
+
+
+@st.fragment(run_every=METRICS_REFRESH_SECONDS)
+def render_core_metrics(date_range=None, cross_filters=None, match='all'):
+    """Renders the Core Metrics and Visual Insights panels from the current totals."""
+    core_metrics, note = load_core_metrics(date_range, cross_filters, match)
+    if core_metrics is None:
+        if cross_filters:
+            st.info("No stops match the cross-filter.")
+        elif date_range is not None:
+            st.info(f"No stops between {date_range[0]:%B %d, %Y} and {date_range[1]:%B %d, %Y}.")
+        else:
+            st.warning("Core Metrics are temporarily unavailable.")
+        return
+    if note:
+        st.info(note)
+
+    st.header(" Core Metrics")
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("Total Police Stops", core_metrics['total_stops'])
+
+    with col2:
+        # Case-insensitive match on stop_outcome, same as the old str.contains("arrest") scan
+        st.metric("Total Arrests", core_metrics['arrests'])
+
+    with col3:
+        st.metric("Total Warnings", core_metrics['warnings'])
+
+    with col4:
+        # MySQL uses 1 for TRUE, so drugs_related_stop = TRUE counts the 1/0 flag directly.
+        st.metric("Drug Related Stops", core_metrics['drug_related'])
+
+    # --- 4. VISUAL INSIGHTS ---
+    st.header(" Visual Insights")
+
+    tab1, tab2 = st.tabs(["Stops by Violation", "Driver Gender Distribution"])
+
+    with tab1:
+        violation_data = core_metrics['violation_data']
+        if not violation_data.empty:
+            fig = px.bar(violation_data, x='Violation', y='Count', title="Stops by Violation Type", color='Violation')
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.warning("No data available for Violation chart.")
+
+    with tab2:
+        gender_data = core_metrics['gender_data']
+        if not gender_data.empty:
+            fig = px.pie(gender_data, names='Gender', values='Count', title="Driver Gender Distribution")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.warning("No data available for Driver Gender chart.")
+
+
+render_core_metrics(date_range, cross_filters, cross_match)
 
 # --- 5. ADVANCED QUERIES ---
 st.header("In-Depth Data Analysis")
 
-query_options = [
-    "Top 10 vehicle_Number involved in drug-related stops",
-    "Most frequently searched vehicles",
-    "Driver age group with highest arrest rate",
-    "Gender distribution of drivers stopped in each country",
-    "Race and Gender combination with highest search rate",
-    "Time of day with the most traffic stops",
-    "The average stop duration for different violations",
-    "Are stops during the night more likely to lead to arrests",
-    "violations are most associated with searches or arrests",
-    "violations,which are most common among younger drivers (<25)",
-    "What is the arrest rate by country and violation",
-    "Which country has the most stops with search conducted",
-    "Yearly Breakdown of Stops and Arrests by Country",
-    "Driver Violation Trends Based on Age and Race",
-    "Time Period Analysis of Stops , Number of Stops by Year,Month, Hour of the Day",
-    "Violations with High Search and Arrest Rates",
-    "Driver Demographics by Country (Age, Gender, and Race)",
-    "Top 5 Violations with Highest Arrest Rates"
-]
-
+# query_options and query_map (the MySQL SQL behind each option) live in queries.py
 selected_query = st.selectbox("Select a Query to Run", query_options)
+approximate_mode = st.toggle(
+    "Approximate mode",
+    help="Answer the heavy analyses from sketches and a sample kept in memory instead of scanning every stop. "
+         "Each answer states its error bound.",
+)
+if approximate_mode and date_range is not None:
+    # The sketches summarize the whole history; a date range always runs the exact queries
+    st.caption("Approximate mode covers all dates; analyses run exactly while a date range is selected.")
+    approximate_mode = False
+
+# The rollup tables are refreshed on a background thread, at most every 30 s while analyses are run,
+# so a click never waits on (or locks policelog_data for) the INSERT ... SELECT. Rollup queries carry
+# the mark the rollups are current to, so cached answers move on with it. The mark is None until the
+# first refresh has finished or when the rollups are unavailable; the analysis then scans policelog_data.
+# The embedded backend has no rollup tables; its columnar scans are fast enough on their own.
+@st.cache_resource
+def get_rollup_refresher():
+    """Returns the process-wide rollup refresher."""
+    return RollupRefresher()
+
+
+def rollup_mark():
+    """Requests a background rollup refresh and returns the mark the rollups are current to, or None."""
+    if backend.embedded:
+        return None
+    return get_rollup_refresher().request()
+
+
+# After `python migrate.py` the scan fallback reads the indexed generated hour/year/month
+# columns instead of computing HOUR()/YEAR()/MONTH() on every row, and after
+# `python codes.py --backfill` the filters compare the small integer code columns instead of text
+@st.cache_data(ttl=300)
+def scan_query_map():
+    """Returns query_map rewritten for the generated time columns and the code columns that exist."""
+    if backend.embedded:
+        return query_map
+    try:
+        with get_db_cursor() as cursor:
+            queries = indexed_query_map if generated_columns_present(cursor) else query_map
+            if codes_backfilled(cursor):
+                queries = {title: use_code_columns(sql) for title, sql in queries.items()}
+            return queries
+    except Exception as e:
+        print(f"Schema Check Error: {e}")
+        return query_map
+
+
+def approximate_answer(title):
+    """Answers a query from the sketches. Returns (result, note, seconds)."""
+    started = time.perf_counter()
+    result, note = APPROXIMATE_QUERIES[title](get_approximate_stats())
+    seconds = time.perf_counter() - started
+    query_log.record('approximate', query=title, wall_ms=round(seconds * 1000, 3), rows=len(result))
+    return result, note, seconds
 
-# FIX: Updated SQL queries to use MySQL syntax (TRUE/1, YEAR(), HOUR(), etc.)
-query_map = {
-    "Top 10 vehicle_Number involved in drug-related stops":
-    """SELECT 
-    vehicle_number,
-    COUNT(*) AS total_drug_related_stops
-FROM 
-    policelog_data
-WHERE 
-    drugs_related_stop = TRUE
-GROUP BY 
-    vehicle_number
-ORDER BY 
-    total_drug_related_stops DESC
-LIMIT 10""", 
-    
-    "Most frequently searched vehicles":
-    """SELECT 
-    vehicle_number,
-    COUNT(*) AS total_searches
-FROM 
-    policelog_data
-WHERE 
-    search_conducted = TRUE
-GROUP BY 
-    vehicle_number
-ORDER BY 
-    total_searches DESC
-LIMIT 10""",
-    
-    "Driver age group with highest arrest rate":
-    """SELECT 
-    driver_age,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
-FROM 
-    policelog_data
-WHERE driver_age IS NOT NULL AND driver_age > 0
-GROUP BY 
-    driver_age
-HAVING COUNT(*) > 50 
-ORDER BY 
-    arrest_rate_percentage DESC
-LIMIT 10""",
-    
-    "Gender distribution of drivers stopped in each country":
-    """SELECT 
-    country_name,
-    driver_gender,
-    COUNT(*) AS total_stops,
-    ROUND(
-        COUNT(*) * 100.0 / 
-        SUM(COUNT(*)) OVER (PARTITION BY country_name),
-        2
-    ) AS percentage_of_stops
-FROM 
-    policelog_data
-WHERE country_name IS NOT NULL
-GROUP BY 
-    country_name, driver_gender
-ORDER BY 
-    country_name, total_stops DESC""",
-    
-    "Race and Gender combination with highest search rate":
-    """SELECT 
-    driver_race,
-    driver_gender,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
-    ROUND(
-        SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 
-        2
-    ) AS search_rate_percentage
-FROM 
-    policelog_data
-WHERE driver_race IS NOT NULL AND driver_gender IS NOT NULL
-GROUP BY 
-    driver_race, driver_gender
-HAVING COUNT(*) > 100
-ORDER BY 
-    search_rate_percentage DESC
-LIMIT 10""",
-    
-    "Time of day with the most traffic stops":
-    """SELECT 
-    HOUR(stop_time) AS hour_of_day,
-    COUNT(*) AS total_stops
-FROM 
-    policelog_data
-WHERE stop_time IS NOT NULL
-GROUP BY 
-    HOUR(stop_time)
-ORDER BY 
-    total_stops DESC""",
-    
-    "The average stop duration for different violations":
-    """SELECT
-    violation,
-    ROUND(AVG(stop_duration), 2) AS avg_stop_duration
-FROM 
-    policelog_data
-WHERE 
-    stop_duration IS NOT NULL
-GROUP BY 
-    violation
-ORDER BY 
-    avg_stop_duration DESC""",
-    
-    "Are stops during the night more likely to lead to arrests": 
-    """SELECT 
-    CASE
-        WHEN HOUR(stop_time) BETWEEN 6 AND 17 THEN 'Day (6AM-5PM)'
-        ELSE 'Night (6PM-5AM)'
-    END AS time_of_day,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-    ROUND(
-        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100,
-        2
-    ) AS arrest_rate_percentage
-FROM 
-    policelog_data
-WHERE stop_time IS NOT NULL
-GROUP BY 
-    time_of_day
-ORDER BY 
-    arrest_rate_percentage DESC""",
-    
-    "violations are most associated with searches or arrests":
-    """SELECT 
-    violation,
-    COUNT(*) AS total_stops,
-    
-    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
-    ROUND(SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS search_rate_percentage,
-    
-    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
-
-FROM 
-    policelog_data
-WHERE violation IS NOT NULL
-GROUP BY 
-    violation
-HAVING COUNT(*) > 100
-ORDER BY 
-    search_rate_percentage DESC, arrest_rate_percentage DESC
-LIMIT 10""",
-    
-    "violations,which are most common among younger drivers (<25)":
-    """SELECT 
-    violation,
-    COUNT(*) AS total_stops
-FROM 
-    policelog_data
-WHERE 
-    driver_age < 25 AND driver_age IS NOT NULL
-GROUP BY 
-    violation
-ORDER BY 
-    total_stops DESC
-LIMIT 10""",
-    
-    "What is the arrest rate by country and violation":
-    """SELECT 
-    country_name,
-    violation,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-    ROUND(
-        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100,
-        2
-    ) AS arrest_rate_percentage
-FROM 
-    policelog_data
-WHERE country_name IS NOT NULL AND violation IS NOT NULL
-GROUP BY 
-    country_name, violation
-HAVING total_stops > 50
-ORDER BY 
-    arrest_rate_percentage DESC,
-    total_arrests DESC
-LIMIT 20""",
-    
-    "Which country has the most stops with search conducted":
-    """SELECT 
-    country_name,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches
-FROM 
-    policelog_data
-WHERE country_name IS NOT NULL
-GROUP BY 
-    country_name
-ORDER BY 
-    total_searches DESC
-LIMIT 1""",
-    
-    "Yearly Breakdown of Stops and Arrests by Country":
-    """SELECT
-    country_name,
-    year,
-    total_stops,
-    total_arrests,
-    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage,
-    SUM(total_stops) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_stops,
-    SUM(total_arrests) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_arrests
-FROM (
-    SELECT 
-        country_name,
-        YEAR(stop_date) AS year,
-        COUNT(*) AS total_stops,
-        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
-    FROM 
-        policelog_data
-    WHERE stop_date IS NOT NULL AND country_name IS NOT NULL
-    GROUP BY 
-        country_name, YEAR(stop_date)
-) AS yearly_summary
-ORDER BY 
-    country_name, year""",
-    
-    "Driver Violation Trends Based on Age and Race":
-    """SELECT
-    v.driver_race,
-    v.violation,
-    v.avg_driver_age,
-    v.total_stops,
-    ROUND(v.percent_of_race, 2) AS percent_of_race
-FROM (
-    SELECT
-        driver_race,
-        violation,
-        ROUND(AVG(driver_age), 1) AS avg_driver_age,
-        COUNT(*) AS total_stops,
-        COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY driver_race) AS percent_of_race
-    FROM 
-        policelog_data
-    WHERE 
-        driver_age IS NOT NULL 
-        AND violation IS NOT NULL 
-        AND driver_race IS NOT NULL
-    GROUP BY 
-        driver_race, violation
-) AS v
-ORDER BY 
-    v.driver_race, v.percent_of_race DESC""",
-    
-    "Time Period Analysis of Stops , Number of Stops by Year,Month, Hour of the Day":
-    """SELECT 
-    YEAR(stop_date) AS year,
-    MONTH(stop_date) AS month,
-    HOUR(stop_time) AS hour_of_day,
-    COUNT(*) AS total_stops
-FROM 
-    policelog_data
-WHERE stop_date IS NOT NULL AND stop_time IS NOT NULL
-GROUP BY 
-    YEAR(stop_date), MONTH(stop_date), HOUR(stop_time)
-ORDER BY 
-    year, month, hour_of_day""",
-    
-    "Violations with High Search and Arrest Rates":
-    """SELECT
-    violation,
-    total_stops,
-    total_searches,
-    total_arrests,
-    ROUND((CAST(total_searches AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS search_rate_percentage,
-    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage
-FROM (
-    SELECT 
-        violation,
-        COUNT(*) AS total_stops,
-        SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
-        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
-    FROM 
-        policelog_data
-    WHERE violation IS NOT NULL
-    GROUP BY 
-        violation
-    HAVING total_stops > 100
-) AS violation_summary
-ORDER BY 
-    search_rate_percentage DESC
-LIMIT 10""",
-    
-    "Driver Demographics by Country (Age, Gender, and Race)":
-    """SELECT
-    country_name,
-    ROUND(AVG(driver_age), 1) AS avg_driver_age,
-    driver_gender,
-    driver_race,
-    COUNT(*) AS total_stops,
-    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY country_name), 2) AS percent_of_country
-FROM 
-    policelog_data
-WHERE country_name IS NOT NULL AND driver_gender IS NOT NULL AND driver_race IS NOT NULL
-GROUP BY 
-    country_name, driver_gender, driver_race
-HAVING total_stops > 10
-ORDER BY 
-    country_name, total_stops DESC""",
-    
-    "Top 5 Violations with Highest Arrest Rates":
-    """SELECT
-    violation,
-    COUNT(*) AS total_stops,
-    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
-    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
-FROM 
-    policelog_data
-WHERE violation IS NOT NULL
-GROUP BY 
-    violation
-HAVING 
-    COUNT(*) > 50
-ORDER BY 
-    arrest_rate_percentage DESC
-LIMIT 5"""
-}
+
+if approximate_mode:
+    with st.expander("Distinct vehicles (HyperLogLog)"):
+        distinct, note = get_approximate_stats().distinct_vehicles()
+        st.caption(note)
+        st.dataframe(distinct)
 
 if st.button("Run Query"):
-    if selected_query in query_map:
-        query = query_map[selected_query]
-        result = fetch_data(query)
+    if approximate_mode and selected_query in APPROXIMATE_QUERIES:
+        result, note, seconds = approximate_answer(selected_query)
+        st.write(f"### Results for: {selected_query} (approximate)")
+        st.caption(f"{note} Answered in {seconds * 1000:,.1f} ms.")
+        st.dataframe(result)
+    elif selected_query in query_map:
+        if approximate_mode:
+            st.caption("This analysis has no sketch; it runs exactly.")
+        # The rollups have no stop_date, so a date range always reads policelog_data
+        mark = rollup_mark() if date_range is None else None
+        if mark is not None and selected_query in ROLLUP_QUERY_MAP:
+            query = rollup_query(selected_query, mark)
+        else:
+            query = scan_query_map()[selected_query]
+        result = fetch_data(query, date_range)
         if not result.empty:
             st.write(f"### Results for: {selected_query}")
             st.dataframe(result)
@@ -473,8 +467,143 @@ if st.button("Run Query"):
             st.warning("No results found for the selected query, or a database error occurred.")
     else:
         st.error("Selected query not found.")
+
+# --- 5b. REPORT MODE: all analyses at once ---
+# Each worker borrows its own pooled connection, so the report takes about as long as the
+# slowest query instead of the sum of all of them. Never more workers than pooled connections.
+REPORT_WORKERS = min(6, pool.max_size)
+
+
+def timed_query(query):
+    """Runs one report query through the shared result cache and returns (result, seconds)."""
+    started = time.perf_counter()
+    result, cache_status = result_cache.get_with_status(query, run_query)
+    seconds = time.perf_counter() - started
+    query_log.record('fetch_data', query=query, wall_ms=round(seconds * 1000, 3), cache=cache_status, rows=len(result))
+    return result, seconds
+
+
+if st.button("Run All Analyses (Report Mode)"):
+    mark = rollup_mark() if date_range is None else None
+    scan_queries = scan_query_map()
+    # One slot per query, in menu order; each is filled in as soon as its query finishes
+    placeholders = {title: st.empty() for title in query_options}
+    for title, slot in placeholders.items():
+        slot.info(f"⏳ Running: {title}")
+
+    timings = []
+    report_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=REPORT_WORKERS) as executor:
+        futures = {}
+        for title in query_options:
+            if approximate_mode and title in APPROXIMATE_QUERIES:
+                result, note, seconds = approximate_answer(title)
+                with placeholders[title].container():
+                    st.write(f"### {title} (approximate)")
+                    st.caption(f"{seconds * 1000:,.1f} ms · {len(result)} row(s) · {note}")
+                    st.dataframe(result)
+                timings.append({'Query': title, 'Seconds': round(seconds, 3), 'Rows': len(result), 'Status': 'approximate'})
+                continue
+            query = rollup_query(title, mark) if mark is not None and title in ROLLUP_QUERY_MAP else scan_queries[title]
+            futures[executor.submit(timed_query, filter_stop_dates(query, date_range))] = title
+
+        # Streamlit elements must be written from the script thread, so results are rendered here
+        for future in as_completed(futures):
+            title = futures[future]
+            with placeholders[title].container():
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    st.error(f"{title}: query failed. Details: {e}")
+                    timings.append({'Query': title, 'Seconds': None, 'Rows': None, 'Status': 'error'})
+                    continue
+                st.write(f"### {title}")
+                st.caption(f"{seconds * 1000:,.0f} ms · {len(result)} row(s)")
+                st.dataframe(result)
+            timings.append({'Query': title, 'Seconds': round(seconds, 3), 'Rows': len(result), 'Status': 'ok'})
+
+    total_seconds = time.perf_counter() - report_started
+    timing_data = pd.DataFrame(timings).sort_values('Seconds', ascending=False, na_position='first')
+    st.write("### Report timings")
+    st.dataframe(timing_data, use_container_width=True)
+    st.caption(
+        f"All {len(query_options)} queries finished in {total_seconds:.2f}s "
+        f"({timing_data['Seconds'].sum():.2f}s if run one after another, {REPORT_WORKERS} workers)."
+    )
         
 
+# --- ADMIN PANEL (hidden; open the dashboard with ?admin=1) ---
+# The query log and the pool, cache, sync and index stats are for operators, not for every user
+if st.query_params.get("admin") == "1":
+    with st.sidebar.expander("Query instrumentation", expanded=True):
+        query_log.explain_enabled = st.checkbox(
+            "Capture EXPLAIN plans on cache misses", value=query_log.explain_enabled, key="admin_explain"
+        )
+        # Misses run in the report mode's worker threads too, which have no session, so the switch is one flag
+        st.caption("This switch is process-wide: while it is on, every session's cache misses also run EXPLAIN.")
+        summary = query_log.summary()
+        if not summary.empty:
+            st.write("Per-query summary (slowest p95 first)")
+            st.dataframe(summary, use_container_width=True)
+        st.write("Recent events")
+        st.dataframe(query_log.to_frame().head(200), use_container_width=True)
+        st.download_button(
+            "Download query log (JSON lines)", query_log.export_jsonl(),
+            file_name="securecheck_query_log.jsonl", mime="application/json"
+        )
+        if st.button("Clear query log", key="admin_clear_log"):
+            query_log.clear()
+            st.rerun()
+
+    with st.sidebar.expander("Database connection pool"):
+        st.json(pool.stats())
+
+    with st.sidebar.expander("Query result cache"):
+        st.caption(f"Backend: {backend.name}")
+        st.json(result_cache.stats())
+
+    if not backend.embedded:
+        with st.sidebar.expander("Live metrics counters"):
+            live_metrics = get_live_metrics()
+            st.json({
+                'seeded': live_metrics.seeded,
+                'high_water_mark': live_metrics.high_water_mark,
+                'last_synced_at': str(live_metrics.last_synced_at),
+                'last_sync_error': live_metrics.last_sync_error,
+            })
+
+    with st.sidebar.expander("Vehicle watchlist"):
+        watchlist = get_watchlist()
+        st.json({
+            'flagged_vehicles': watchlist.flagged_count(),
+            'rows_indexed': watchlist.rows_indexed,
+            'high_water_mark': watchlist.high_water_mark,
+            'last_sync_error': watchlist.last_sync_error,
+        })
+
+    with st.sidebar.expander("Cross-filter index"):
+        crossfilter = get_crossfilter()
+        st.json({
+            'rows_indexed': crossfilter.index.row_count if crossfilter.index is not None else 0,
+            'build_seconds': crossfilter.build_seconds,
+            'last_build_error': crossfilter.last_build_error,
+        })
+
+    with st.sidebar.expander("New log writes"):
+        st.json(log_writer.stats())
+
+    with st.sidebar.expander("Local snapshot"):
+        snapshot = get_snapshot()
+        st.json({
+            'rows': snapshot.row_count,
+            'watermark': str(snapshot.watermark),
+            # One frame per process, shared by every session
+            'shared_frame_mb': round(snapshot.frame.memory_usage(deep=True, index=False).sum() / 1e6, 1),
+            'load_seconds': snapshot.load_seconds,
+            'last_synced_at': str(snapshot.last_synced_at),
+            'last_sync_error': snapshot.last_sync_error,
+        })
+
 st.markdown("---") 
 st.markdown("Built with ❤️ for Law Enforcement by SecureCheck")
 st.header("🕵️ Custom Natural Language Filter")
@@ -483,6 +612,54 @@ st.markdown("Fill in the details below to get a natural language prediction of t
 
 st.header("✍️ Add New Police Log & Predict **Outcome** and **Violation**")
 
+# The prediction index is built once per process and shared by all sessions (st.cache_resource);
+# each submit only folds in stops logged since the previous sync.
+@st.cache_resource
+def get_prediction_index():
+    """Returns the process-wide stop outcome/violation prediction index."""
+    prediction_index = PredictionIndex()
+    prediction_index.seed(get_snapshot().frame)
+    return prediction_index
+
+
+def show_watchlist_alert(vehicle_number):
+    """Shows an alert when `vehicle_number` is on the watchlist."""
+    watchlist = get_watchlist()
+    if not backend.embedded:
+        watchlist.start_background_sync()
+    hit = watchlist.lookup(vehicle_number)
+    if hit is None:
+        st.caption(f"Vehicle {vehicle_number} is not on the watchlist.")
+        return
+    last_stop = f" Last flagged stop: {hit['last_stop_date']:%B %d, %Y}." if pd.notna(hit['last_stop_date']) else ""
+    st.error(f"🚨 Watchlist alert for {hit['vehicle_number']}: {', '.join(hit['reasons'])}.{last_stop}")
+
+
+# New logs are saved through the process-wide write-behind queue (write_behind.py). After each
+# flush the cached Core Metrics cube is carried forward by the flushed stops and the prediction
+# index folds them in, instead of the whole result cache being dropped and the table re-scanned.
+@st.cache_resource
+def get_log_writer():
+    """Returns the write-behind queue, wired to update the cached metrics and prediction index."""
+    prediction_index = get_prediction_index()
+    watchlist = get_watchlist()
+    live_metrics = None if backend.embedded else get_live_metrics()
+
+    def apply_logged_stops(batch, version_before, version_after):
+        if version_before is not None and not backend.embedded:
+            delta = snapshot_metrics_cube(batch)
+            carry = lambda cube: merge_metrics_cubes(cube, delta)
+            result_cache.advance(version_before, version_after,
+                                 {core_metrics_query: carry, coded_core_metrics_query: carry})
+        if not backend.embedded:
+            prediction_index.sync()
+            watchlist.sync()
+            live_metrics.sync()
+
+    log_writer.add_listener(apply_logged_stops)
+    return log_writer
+
+
 # --- 6. PREDICTION FORM (Input variables defined here) ---
 # Initialize session state variables before the form to ensure they exist
 if 'predicted_outcome' not in st.session_state:
@@ -496,6 +673,11 @@ if 'formatted_time' not in st.session_state:
 if 'formatted_date' not in st.session_state:
     st.session_state.formatted_date = ""
 
+# Quick check before (or without) logging a stop; Enter runs the lookup
+checked_vehicle = st.text_input("🚨 Vehicle Watchlist Check", placeholder="Enter a vehicle number")
+if checked_vehicle.strip():
+    show_watchlist_alert(checked_vehicle.strip())
+
 with st.form("new_log_form"):
         
     stop_date = st.date_input("Stop Date")
@@ -516,6 +698,14 @@ with st.form("new_log_form"):
     stop_duration = st.selectbox("Stop Duration", [""] + stop_duration_options)
     
     vehicle_number = st.text_input("Vehicle Number")
+    # Optional: the actual violation and outcome, when the officer already knows them
+    violation_input = st.selectbox("Violation (if known)", [""] + VIOLATION_CHOICES)
+    stop_outcome_input = st.selectbox("Stop Outcome (if known)", [""] + OUTCOME_CHOICES)
+    # The write-behind queue saves to MySQL; the embedded backend is a read-only copy
+    save_log = st.checkbox(
+        "Save this stop to the ledger", value=not backend.embedded, disabled=backend.embedded,
+        help="Saving is off on the embedded backend, which reads a local copy of the data." if backend.embedded else None,
+    )
     
     submitted = st.form_submit_button("Predict Stop Outcome & Violation")
 
@@ -530,33 +720,60 @@ with st.form("new_log_form"):
             st.session_state.formatted_time = ""
             st.session_state.formatted_date = ""
         else:
+            if vehicle_number.strip():
+                show_watchlist_alert(vehicle_number.strip())
+            if save_log:
+                try:
+                    writer = get_log_writer()
+                    writer.submit({
+                        'stop_date': stop_date.strftime('%Y-%m-%d'),
+                        'stop_time': stop_time.strftime('%H:%M:%S'),
+                        'country_name': country_name.strip(),
+                        'driver_gender': FORM_GENDERS[driver_gender],
+                        'driver_age_raw': int(driver_age),
+                        'driver_age': int(driver_age),
+                        'driver_race': driver_race.strip(),
+                        'violation_raw': violation_input.strip() or None,
+                        'violation': violation_input.strip() or None,
+                        'search_conducted': int(search_conducted_str),
+                        'search_type': search_type.strip() or None,
+                        'stop_outcome': stop_outcome_input.strip() or None,
+                        'is_arrested': int('arrest' in stop_outcome_input.lower()),
+                        'stop_duration': FORM_DURATIONS[stop_duration],
+                        'drugs_related_stop': int(drugs_related_stop_str),
+                        'vehicle_number': vehicle_number.strip() or None,
+                    })
+                    st.success(f"Stop queued for saving ({writer.pending()} awaiting the next batch write).")
+                except Exception as e:
+                    st.error(f"Could not queue the stop for saving: {e}")
             try:
-                # Convert string inputs to integers for database comparison
-                search_conducted_int = int(search_conducted_str)
-                drugs_related_stop_int = int(drugs_related_stop_str)
-                
-                # Filter data for prediction
-                filtered_data = data[
-                    (data['driver_gender'] == driver_gender) &
-                    (data['driver_age'] == driver_age) &
-                    # Ensure the dataframe columns are checked against integers
-                    (pd.to_numeric(data['search_conducted'], errors='coerce') == search_conducted_int) &
-                    (data['stop_duration'] == stop_duration) &
-                    (pd.to_numeric(data['drugs_related_stop'], errors='coerce') == drugs_related_stop_int) &
-                    (data['driver_race'] == driver_race)
-                ]
+                prediction_index = get_prediction_index()
+                if not backend.embedded:
+                    try:
+                        prediction_index.sync()
+                    except Exception as e:
+                        # Predict from the stops already indexed when MySQL is unreachable
+                        print(f"Prediction Index Sync Error: {e}")
+                # The index holds the table's codes, so the form's labels are mapped first
+                prediction = prediction_index.lookup_form(
+                    driver_gender, driver_age, driver_race,
+                    search_conducted_str, drugs_related_stop_str, stop_duration
+                )
                 
                 # Predict stop outcome
-                if not filtered_data.empty:
-                    st.session_state.predicted_outcome = filtered_data['stop_outcome'].mode().iloc[0]
-                    st.session_state.predicted_violation = filtered_data['violation'].mode().iloc[0]
-                    st.success(f"Prediction Found based on {len(filtered_data)} historical match(es)!")
-                    
-                else:
-                    # Default fallback
+                if prediction is None:
+                    # Default fallback, only when there is no history at all
                     st.session_state.predicted_outcome = "Warning or Citation"
                     st.session_state.predicted_violation = "Speeding"
-                    st.warning("No exact historical match found. Reverting to default prediction.")
+                    st.warning("No historical stops available. Reverting to default prediction.")
+                else:
+                    outcome, violation, support, match_level = prediction
+                    st.session_state.predicted_outcome = outcome
+                    st.session_state.predicted_violation = violation
+                    if match_level == "exact match":
+                        st.success(f"Prediction Found based on {support} historical match(es)!")
+                    else:
+                        st.info(f"No exact historical match found. Prediction based on {support} similar stop(s) (matched on: {match_level}).")
                 
                 # Store formatted date/time for the summary
                 st.session_state.formatted_time = stop_time.strftime('%I:%M %p')
@@ -0,0 +1,209 @@
+"""Query backends behind the dashboard's fetch_data.
+
+- mysql (default): the live securecheck database through the connection pool in db.py.
+- duckdb: an embedded, in-process columnar engine loaded from the local snapshot
+  (snapshot.py) or any Arrow/Parquet export of policelog_data. Aggregations are
+  vectorized and no server is needed, so a field post can run the whole dashboard
+  offline from a copied snapshot file. The data reloads whenever the snapshot files change,
+  e.g. after the dashboard's background snapshot sync.
+
+Choose the backend with SECURECHECK_BACKEND (and optionally SECURECHECK_EMBEDDED_PATH):
+
+    SECURECHECK_BACKEND=duckdb streamlit run Securecheck.py
+    python backends.py --backend duckdb     # run every query_map query and print timings
+
+Both backends take the MySQL SQL in queries.py and metrics.py. DuckDB already
+understands HOUR()/YEAR()/MONTH(), window functions and TRUE comparisons; the few
+MySQL-only behaviours are rewritten by translate_mysql().
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from db import get_db_cursor, require_columns, require_table
+from instrumentation import explain
+from snapshot import SNAPSHOT_PATH, snapshot_chain
+
+# MySQL behaviours DuckDB does not share, rewritten before a query runs on the embedded engine
+EMBEDDED_REWRITES = [
+    # MySQL coerces text to its leading number in arithmetic ('16-30 Min' -> 16, no number -> 0)
+    ("AVG(stop_duration)",
+     "AVG(COALESCE(TRY_CAST(regexp_extract(stop_duration, '^[0-9]+([.][0-9]+)?') AS DOUBLE), 0))"),
+]
+
+
+def translate_mysql(sql, params=None):
+    """Rewrites a MySQL query for DuckDB; pymysql's %s placeholders become ?."""
+    for expression, replacement in EMBEDDED_REWRITES:
+        sql = sql.replace(expression, replacement)
+    if params:
+        sql = sql.replace('%s', '?')
+    return sql
+
+
+class MySQLBackend:
+    """The live MySQL database, through the shared connection pool."""
+
+    name = 'mysql'
+    embedded = False
+
+    def execute(self, query, params=None):
+        """Runs a query and returns the rows as a DataFrame with lowercase column names."""
+        with get_db_cursor() as cursor:
+            cursor.execute(query, params)
+            df = pd.DataFrame(cursor.fetchall())
+        if not df.empty:
+            df.columns = df.columns.str.lower()
+        return df
+
+    def explain(self, query):
+        with get_db_cursor() as cursor:
+            return explain(cursor, query)
+
+    def version(self):
+        """Returns a cheap change marker for policelog_data: both maxima are index lookups, and the
+        delete counter (migrate.py) is one primary-key read, so deletes change it too."""
+        require_columns('log_id', 'updated_at')
+        require_table('policelog_version')
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                """SELECT MAX(log_id) AS max_log_id, MAX(updated_at) AS max_updated_at,
+    (SELECT deletes FROM policelog_version WHERE id = 1) AS deletes
+FROM policelog_data"""
+            )
+            row = cursor.fetchone()
+        return row['max_log_id'], row['max_updated_at'], row['deletes']
+
+
+class EmbeddedBackend:
+    """In-process DuckDB copy of policelog_data, loaded from an Arrow or Parquet file."""
+
+    name = 'duckdb'
+    embedded = True
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The embedded backend needs DuckDB: pip install duckdb") from e
+        self.path = path
+        self.connection = duckdb.connect()
+        self.row_count = 0
+        self._loaded_files = None
+        self._lock = threading.Lock()
+
+    def _read_table(self, path):
+        if path.endswith('.parquet'):
+            return pq.read_table(path)
+        return ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+    def _reload_if_changed(self):
+        """Loads the newest snapshot (base file and deltas) into DuckDB when any of its files is new or replaced."""
+        chain = snapshot_chain(self.path)
+        if not chain:
+            raise FileNotFoundError(
+                f"No local data at {self.path}; run `python snapshot.py` while MySQL is reachable, "
+                "or point SECURECHECK_EMBEDDED_PATH at a Parquet/Arrow export."
+            )
+        files = tuple((path, os.stat(path).st_mtime_ns) for path in chain)
+        with self._lock:
+            if files == self._loaded_files:
+                return
+            sources = [self._read_table(path) for path in chain]
+            for number, source in enumerate(sources):
+                self.connection.register(f'policelog_source_{number}', source)
+            if len(sources) == 1:
+                source_sql = "policelog_source_0"
+            else:
+                # Deltas are typed from their own rows, so columns are matched by name; the newest
+                # version of each log_id wins, as in LocalSnapshot.load
+                pieces = "\n    UNION ALL BY NAME\n    ".join(
+                    f"SELECT *, {number} AS snapshot_piece FROM policelog_source_{number}" for number in range(len(sources)))
+                source_sql = f"""(
+    SELECT * EXCLUDE (snapshot_piece) FROM (
+    {pieces}
+    )
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY log_id ORDER BY snapshot_piece DESC) = 1
+)"""
+            try:
+                # Same column types as MySQL (DATE and TIME), so ledger keys and comparisons behave alike;
+                # CREATE OR REPLACE swaps the table atomically for queries already running. Rows are
+                # stored in stop_date order, so the min/max zone map of each row group lets a date
+                # range filter skip the row groups outside it, like partition pruning in MySQL.
+                self.connection.execute(
+                    f"""CREATE OR REPLACE TABLE policelog_data AS
+SELECT * REPLACE (
+    CAST(stop_date AS DATE) AS stop_date,
+    CAST(TIME '00:00:00' + stop_time AS TIME) AS stop_time
+)
+FROM {source_sql}
+ORDER BY stop_date"""
+                )
+            finally:
+                for number in range(len(sources)):
+                    self.connection.unregister(f'policelog_source_{number}')
+            self.row_count = self.connection.execute("SELECT COUNT(*) FROM policelog_data").fetchone()[0]
+            self._loaded_files = files
+
+    def execute(self, query, params=None):
+        """Runs a MySQL query on the embedded copy and returns the rows as a DataFrame."""
+        self._reload_if_changed()
+        # One cursor per call, so report mode's worker threads run their queries concurrently
+        cursor = self.connection.cursor()
+        try:
+            df = cursor.execute(translate_mysql(query, params), params).df()
+        finally:
+            cursor.close()
+        df.columns = df.columns.str.lower()
+        return df
+
+    def explain(self, query):
+        """Returns DuckDB's physical plan text; the embedded copy has no indexes, so every read is a scan."""
+        self._reload_if_changed()
+        plan = self.connection.cursor().execute(f"EXPLAIN {translate_mysql(query)}").fetchall()
+        text = '\n'.join(row[1] for row in plan)
+        return json.dumps(text), 'SEQ_SCAN' in text
+
+    def version(self):
+        """The data version is the loaded files: a new delta or base invalidates cached results."""
+        self._reload_if_changed()
+        return self._loaded_files, self.row_count
+
+
+def create_backend(name='mysql', path=None):
+    if name == 'mysql':
+        return MySQLBackend()
+    if name == 'duckdb':
+        return EmbeddedBackend(path or SNAPSHOT_PATH)
+    raise ValueError(f"Unknown backend {name!r}; expected 'mysql' or 'duckdb'")
+
+
+# Module-level backend, shared by every session in the process like the connection pool in db.py.
+backend = create_backend(os.environ.get('SECURECHECK_BACKEND', 'mysql'), os.environ.get('SECURECHECK_EMBEDDED_PATH'))
+
+
+if __name__ == '__main__':
+    from metrics import core_metrics_query
+    from queries import query_map
+
+    parser = argparse.ArgumentParser(description="Run every analysis query on a backend and print timings.")
+    parser.add_argument('--backend', choices=['mysql', 'duckdb'], default=backend.name, help="backend to run on")
+    parser.add_argument('--path', help="Arrow or Parquet file for the duckdb backend (default: the local snapshot)")
+    args = parser.parse_args()
+
+    selected = create_backend(args.backend, args.path)
+    for title, query in {**query_map, "Core Metrics": core_metrics_query}.items():
+        started = time.perf_counter()
+        try:
+            rows = len(selected.execute(query))
+        except Exception as e:
+            print(f"  {title:<85} failed: {e}")
+            continue
+        print(f"  {title:<85} {(time.perf_counter() - started) * 1000:>10.1f} ms  {rows:>6} row(s)")
@@ -0,0 +1,274 @@
+"""Benchmark harness for the dashboard's data paths at several table sizes.
+
+For each size, synthetic stops (synthetic.py) are loaded into a database stand-in,
+then the following are timed:
+
+- every query_map query, as SQL
+- the Core Metrics aggregate query plus its reduction
+- the Core Metrics and chart aggregation from an in-memory frame (the snapshot path)
+- the legacy boolean-mask prediction filter against the PredictionIndex build and lookup
+
+The default stand-in is an in-process SQLite database, with HOUR/YEAR/MONTH
+registered as Python functions so the MySQL SQL runs unchanged. SQLite divides
+integers as integers, so rate columns differ from MySQL; the timings are what
+matter here. Use --backend mysql to load a scratch `securecheck_bench` database
+on the configured server instead.
+
+Results are written as JSON; pass --compare to print the ratio against an earlier run.
+
+    python benchmark.py --sizes 100000 1000000 10000000 --output bench.json
+    python benchmark.py --sizes 100000 --compare bench.json
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from metrics import core_metrics_query, snapshot_metrics_cube, summarize_core_metrics
+from prediction import PredictionIndex
+from queries import query_map
+from schema import optimize_frame
+from synthetic import COLUMNS, generate_chunks
+
+TABLE_SCHEMA = """CREATE TABLE policelog_data (
+    stop_date DATE,
+    stop_time TIME,
+    country_name VARCHAR(50),
+    driver_gender VARCHAR(10),
+    driver_age_raw INT,
+    driver_age INT,
+    driver_race VARCHAR(50),
+    violation_raw VARCHAR(250),
+    violation VARCHAR(50),
+    search_conducted BOOLEAN,
+    search_type VARCHAR(50),
+    stop_outcome VARCHAR(50),
+    is_arrested BOOLEAN,
+    stop_duration VARCHAR(50),
+    drugs_related_stop BOOLEAN,
+    vehicle_number VARCHAR(50)
+)"""
+
+
+# --- 1. DATABASE STAND-INS ---
+
+class SQLiteStandIn:
+    """In-process SQLite database that accepts the dashboard's MySQL queries."""
+
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Times are stored as 'HH:MM:SS' and dates as 'YYYY-MM-DD'
+        self.connection.create_function('HOUR', 1, lambda t: None if t is None else int(t[:2]), deterministic=True)
+        self.connection.create_function('YEAR', 1, lambda d: None if d is None else int(d[:4]), deterministic=True)
+        self.connection.create_function('MONTH', 1, lambda d: None if d is None else int(d[5:7]), deterministic=True)
+        self.connection.execute("DROP TABLE IF EXISTS policelog_data")
+        self.connection.execute(TABLE_SCHEMA)
+
+    def insert(self, chunk):
+        placeholders = ", ".join(["?"] * len(COLUMNS))
+        rows = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+        self.connection.executemany(f"INSERT INTO policelog_data ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+        self.connection.commit()
+
+    def query(self, sql):
+        cursor = self.connection.execute(sql)
+        columns = [description[0].lower() for description in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def close(self):
+        self.connection.close()
+
+
+class MySQLStandIn:
+    """Scratch `securecheck_bench` database on the dashboard's MySQL server."""
+
+    name = 'mysql'
+
+    def __init__(self, database='securecheck_bench'):
+        import pymysql
+        from db import DB_CONFIG
+
+        config = {key: value for key, value in DB_CONFIG.items() if key != 'database'}
+        self.connection = pymysql.connect(**config)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+            cursor.execute(f"USE {database}")
+            cursor.execute("DROP TABLE IF EXISTS policelog_data")
+            cursor.execute(TABLE_SCHEMA)
+
+    def insert(self, chunk):
+        placeholders = ", ".join(["%s"] * len(COLUMNS))
+        rows = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+        with self.connection.cursor() as cursor:
+            for offset in range(0, len(rows), 10000):
+                cursor.executemany(
+                    f"INSERT INTO policelog_data ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                    rows[offset:offset + 10000],
+                )
+        self.connection.commit()
+
+    def query(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+            df = pd.DataFrame(cursor.fetchall())
+        if not df.empty:
+            df.columns = df.columns.str.lower()
+        return df
+
+    def close(self):
+        self.connection.close()
+
+
+# --- 2. LEGACY CODE PATHS (kept to measure the gain against) ---
+
+def legacy_prediction_filter(data, driver_gender, driver_age, driver_race, search_conducted, drugs_related_stop,
+                             stop_duration):
+    """The boolean-mask prediction the dashboard used before the PredictionIndex."""
+    filtered_data = data[
+        (data['driver_gender'] == driver_gender) &
+        (data['driver_age'] == driver_age) &
+        (pd.to_numeric(data['search_conducted'], errors='coerce') == search_conducted) &
+        (data['stop_duration'] == stop_duration) &
+        (pd.to_numeric(data['drugs_related_stop'], errors='coerce') == drugs_related_stop) &
+        (data['driver_race'] == driver_race)
+    ]
+    if filtered_data.empty:
+        return None
+    return filtered_data['stop_outcome'].mode().iloc[0], filtered_data['violation'].mode().iloc[0]
+
+
+def legacy_chart_aggregations(data):
+    """The value_counts the Visual Insights tabs ran over the full frame."""
+    return data['violation'].value_counts(), data['driver_gender'].value_counts()
+
+
+# --- 3. HARNESS ---
+
+def measure(function, repeat):
+    """Runs `function` `repeat` times and returns timing statistics plus the row count of its result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    rows = len(result) if hasattr(result, '__len__') else None
+    return {
+        'seconds_min': round(min(timings), 6),
+        'seconds_median': round(statistics.median(timings), 6),
+        'seconds_max': round(max(timings), 6),
+        'rows': rows,
+    }
+
+
+def benchmark_size(size, backend, repeat, chunk_size, seed):
+    """Loads `size` synthetic stops and times every operation. Returns a list of result records."""
+    records = []
+
+    def record(name, kind, stats):
+        records.append({'size': size, 'name': name, 'kind': kind, **stats})
+        print(f"  {kind:<8} {name:<85} {stats['seconds_median'] * 1000:>10.1f} ms")
+
+    print(f"Size {size:,}:")
+    database = SQLiteStandIn() if backend == 'sqlite' else MySQLStandIn()
+    try:
+        frames = []
+        started = time.perf_counter()
+        for chunk in generate_chunks(size, chunk_size=chunk_size, seed=seed):
+            database.insert(chunk)
+            frames.append(chunk)
+        load_seconds = time.perf_counter() - started
+        record('load synthetic stops', 'load', {
+            'seconds_min': round(load_seconds, 6), 'seconds_median': round(load_seconds, 6),
+            'seconds_max': round(load_seconds, 6), 'rows': size,
+            'rows_per_second': round(size / load_seconds, 1),
+        })
+        # What the dashboard held before optimize_frame: pymysql's SELECT * rows, every column object
+        raw = pd.concat(frames, ignore_index=True).astype(object)
+        del frames
+        data = optimize_frame(raw)
+
+        for title, sql in query_map.items():
+            record(title, 'sql', measure(lambda sql=sql: database.query(sql), repeat))
+
+        record('core metrics (aggregate query + reduction)', 'sql',
+               measure(lambda: summarize_core_metrics(database.query(core_metrics_query))['violation_data'], repeat))
+        record('core metrics + charts from frame', 'pandas',
+               measure(lambda: summarize_core_metrics(snapshot_metrics_cube(data))['violation_data'], repeat))
+        record('chart value_counts over full frame (legacy)', 'pandas',
+               measure(lambda: legacy_chart_aggregations(raw)[0], repeat))
+
+        probe = data.iloc[0]
+        probe_args = (probe['driver_gender'], int(probe['driver_age']), probe['driver_race'],
+                      int(probe['search_conducted']), int(probe['drugs_related_stop']), probe['stop_duration'])
+        record('prediction mask filter (legacy)', 'pandas',
+               measure(lambda: legacy_prediction_filter(raw, *probe_args), repeat))
+
+        index = PredictionIndex()
+        record('prediction index build', 'pandas', measure(lambda: _build_index(data), 1))
+        index.add_rows(data)
+        record('prediction index lookup', 'pandas', measure(lambda: index.lookup(*probe_args), repeat))
+    finally:
+        database.close()
+    return records
+
+
+def _build_index(data):
+    index = PredictionIndex()
+    index.add_rows(data)
+    return index
+
+
+def compare(current, baseline_path):
+    """Prints median time ratios of this run against an earlier JSON result file."""
+    with open(baseline_path) as handle:
+        baseline = {(r['size'], r['kind'], r['name']): r for r in json.load(handle)['results']}
+    print(f"\nComparison with {baseline_path} (ratio < 1.0 is faster):")
+    for result in current:
+        before = baseline.get((result['size'], result['kind'], result['name']))
+        if before and before['seconds_median']:
+            ratio = result['seconds_median'] / before['seconds_median']
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"  {result['size']:>10,} {result['name']:<85} {ratio:6.2f}x{flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Securecheck dashboard data paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000], help="row counts to test")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite', help="database stand-in")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per timed operation (median is reported)")
+    parser.add_argument('--chunk-size', type=int, default=500000, help="rows generated and loaded per chunk")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument('--output', default='bench_results.json', help="JSON result file")
+    parser.add_argument('--compare', help="earlier JSON result file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(size, args.backend, args.repeat, args.chunk_size, args.seed))
+
+    report = {
+        'meta': {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'backend': args.backend,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2, default=str)
+    print(f"\nWrote {len(results)} result(s) to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
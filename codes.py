@@ -0,0 +1,183 @@
+"""Canonical codes for the categorical stop fields.
+
+Each coded field has a lookup table from canonical label to a small integer, and a
+synonym table from lower-cased source text to canonical label. Ingest (ingest.py)
+and form writes (write_behind.py) keep the text as the source spells it, so new
+rows group with the rows already in the table ('Arrest Driver' and 'Arrest
+Passenger' stay distinct), and store the canonical code in a TINYINT column next
+to it:
+
+    driver_gender  -> gender_code      M, F
+    violation      -> violation_code   Speeding, Moving violation, Equipment, ...
+    stop_outcome   -> outcome_code     Warning, Ticket, Arrest, No Action, N/D
+    stop_duration  -> duration_code    0-15 Min, 16-30 Min, 30+ Min
+
+Text that matches no synonym fails validation, and ingest quarantines the row
+(ingest_quarantine) instead of loading it. To accept a new spelling, add it to
+the synonym table. The codes and labels are also written to the stop_codes table,
+so SQL can join labels back.
+
+Run `python codes.py` to add the columns and tables, and `python codes.py --backfill`
+to code the rows already in policelog_data. The backfill is recorded in the
+code_backfill table; from then on the dashboard's queries compare the codes
+instead of text (codes_backfilled).
+"""
+import argparse
+
+from db import get_db_cursor
+
+GENDER_LABELS = {1: 'M', 2: 'F'}
+GENDER_SYNONYMS = {'m': 'M', 'male': 'M', 'man': 'M', 'f': 'F', 'female': 'F', 'woman': 'F'}
+
+VIOLATION_LABELS = {
+    1: 'Speeding', 2: 'Moving violation', 3: 'Equipment', 4: 'Registration/plates',
+    5: 'Seat belt', 6: 'DUI', 7: 'Other',
+}
+VIOLATION_SYNONYMS = {
+    **{label.lower(): label for label in VIOLATION_LABELS.values()},
+    'moving violations': 'Moving violation', 'registration': 'Registration/plates',
+    'seatbelt': 'Seat belt', 'seat belt violation': 'Seat belt', 'drunk driving': 'DUI', 'dwi': 'DUI',
+}
+
+OUTCOME_LABELS = {1: 'Warning', 2: 'Ticket', 3: 'Arrest', 4: 'No Action', 5: 'N/D'}
+OUTCOME_SYNONYMS = {
+    **{label.lower(): label for label in OUTCOME_LABELS.values()},
+    'citation': 'Ticket', 'summons': 'Ticket', 'arrest driver': 'Arrest', 'arrest passenger': 'Arrest',
+    'not documented': 'N/D',
+}
+OUTCOME_ARREST = 3
+OUTCOME_WARNING = 1
+
+# The spellings the traffic_stops source data uses, offered by the dashboard form so a logged
+# stop groups with the existing rows; every choice maps through the synonym tables above
+VIOLATION_CHOICES = ['Speeding', 'Moving violation', 'Equipment', 'Registration/plates', 'Seat belt', 'DUI', 'Other']
+OUTCOME_CHOICES = ['Citation', 'Warning', 'Arrest Driver', 'Arrest Passenger', 'No Action', 'N/D']
+
+DURATION_LABELS = {1: '0-15 Min', 2: '16-30 Min', 3: '30+ Min'}
+DURATION_SYNONYMS = {
+    '0-15 min': '0-15 Min', '0-15 minutes': '0-15 Min',
+    '16-30 min': '16-30 Min', '16-30 minutes': '16-30 Min',
+    '30+ min': '30+ Min', '31-60 minutes': '30+ Min', '1-2 hours': '30+ Min', 'more than 2 hours': '30+ Min',
+}
+
+# source column -> (code column, code -> label, synonym -> label)
+CODE_TABLES = {
+    'driver_gender': ('gender_code', GENDER_LABELS, GENDER_SYNONYMS),
+    'violation': ('violation_code', VIOLATION_LABELS, VIOLATION_SYNONYMS),
+    'stop_outcome': ('outcome_code', OUTCOME_LABELS, OUTCOME_SYNONYMS),
+    'stop_duration': ('duration_code', DURATION_LABELS, DURATION_SYNONYMS),
+}
+CODE_COLUMNS = [code_column for code_column, _, _ in CODE_TABLES.values()]
+
+
+def canonicalize(series, column):
+    """Maps source text to (canonical labels, codes, invalid mask) with two dictionary lookups.
+
+    Missing values stay missing and are not invalid; text matching no synonym is invalid.
+    """
+    _, labels, synonyms = CODE_TABLES[column]
+    codes_by_label = {label: code for code, label in labels.items()}
+    text = series.astype('string').str.strip().str.lower()
+    label = text.map(synonyms, na_action='ignore')
+    code = label.map(codes_by_label, na_action='ignore').astype('UInt8')
+    invalid = text.notna() & label.isna()
+    return label.astype(object).where(label.notna(), None), code, invalid.fillna(False).astype(bool)
+
+
+# --- SCHEMA ---
+
+CODE_LOOKUP_SCHEMA = """CREATE TABLE IF NOT EXISTS stop_codes (
+    column_name VARCHAR(50) NOT NULL,
+    code TINYINT UNSIGNED NOT NULL,
+    label VARCHAR(50) NOT NULL,
+    PRIMARY KEY (column_name, code)
+)"""
+
+QUARANTINE_SCHEMA = """CREATE TABLE IF NOT EXISTS ingest_quarantine (
+    quarantine_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    source VARCHAR(255) NOT NULL,
+    reason VARCHAR(500) NOT NULL,
+    record JSON NOT NULL,
+    quarantined_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_quarantine_source (source)
+)"""
+
+CODE_BACKFILL_SCHEMA = """CREATE TABLE IF NOT EXISTS code_backfill (
+    code_column VARCHAR(50) NOT NULL PRIMARY KEY,
+    backfilled_at DATETIME NOT NULL
+)"""
+
+_codes_ready = False
+
+
+def ensure_code_schema():
+    """Adds the code columns, the stop_codes lookup table and the quarantine table if missing."""
+    global _codes_ready
+    if _codes_ready:
+        return
+    with get_db_cursor() as cursor:
+        cursor.execute(CODE_LOOKUP_SCHEMA)
+        cursor.execute(QUARANTINE_SCHEMA)
+        cursor.execute(CODE_BACKFILL_SCHEMA)
+        cursor.executemany(
+            "INSERT INTO stop_codes (column_name, code, label) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE label = VALUES(label)",
+            [(column, code, label) for column, (_, labels, _) in CODE_TABLES.items() for code, label in labels.items()],
+        )
+        cursor.execute(
+            """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'"""
+        )
+        existing = {row['name'].lower() for row in cursor.fetchall()}
+        missing = [column for column in CODE_COLUMNS if column not in existing]
+        if missing:
+            cursor.execute(
+                "ALTER TABLE policelog_data " + ", ".join(f"ADD COLUMN {column} TINYINT UNSIGNED NULL" for column in missing)
+            )
+    _codes_ready = True
+
+
+def backfill_codes():
+    """Codes existing rows from their text, one UPDATE per field. Returns the rows updated per code column."""
+    ensure_code_schema()
+    updated = {}
+    with get_db_cursor() as cursor:
+        for column, (code_column, labels, synonyms) in CODE_TABLES.items():
+            codes_by_label = {label: code for code, label in labels.items()}
+            cases = " ".join(f"WHEN {cursor.connection.escape(synonym)} THEN {codes_by_label[label]}"
+                             for synonym, label in synonyms.items())
+            updated[code_column] = cursor.execute(
+                f"UPDATE policelog_data SET {code_column} = CASE LOWER(TRIM({column})) {cases} END "
+                f"WHERE {code_column} IS NULL AND {column} IS NOT NULL"
+            )
+            # Ingest and form writes code every new row, so one backfill keeps the column complete
+            cursor.execute(
+                "INSERT INTO code_backfill (code_column, backfilled_at) VALUES (%s, NOW()) "
+                "ON DUPLICATE KEY UPDATE backfilled_at = VALUES(backfilled_at)",
+                (code_column,),
+            )
+    return updated
+
+
+def codes_backfilled(cursor):
+    """True once every code column has been backfilled, so queries can compare codes instead of text."""
+    cursor.execute(
+        """SELECT COUNT(*) AS present FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'code_backfill'"""
+    )
+    if not cursor.fetchone()['present']:
+        return False
+    cursor.execute("SELECT code_column FROM code_backfill")
+    return set(CODE_COLUMNS) <= {row['code_column'] for row in cursor.fetchall()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add canonical code columns to policelog_data.")
+    parser.add_argument('--backfill', action='store_true', help="also code the rows already in the table")
+    args = parser.parse_args()
+
+    ensure_code_schema()
+    print(f"Code columns ready: {', '.join(CODE_COLUMNS)}.")
+    if args.backfill:
+        for code_column, rows in backfill_codes().items():
+            print(f"  {code_column}: {rows} row(s) coded")
@@ -0,0 +1,214 @@
+"""Bitmap indexes for cross-filtering the dashboard by country, violation, race, gender and outcome.
+
+The index is built once per loaded version of the local snapshot. It holds one bitset for
+each value of each filter column, where bit i is set when row i has that value. It also holds
+bitsets for the arrest, warning and drug-related flags. A filter combination is a handful
+of word-wise ORs (values within a column) and ANDs or ORs (across columns) over n/64 words:
+
+    (country = India OR country = USA) AND (violation = Speeding) AND (gender = F)
+
+Every panel is then computed from the selected bitset without scanning the frame:
+- the counters are popcounts of the selection ANDed with a flag bitset;
+- each chart bar is a popcount with one value's bitset;
+- the ledger is the selected rows taken from a precomputed newest-first order.
+
+When the snapshot syncs, the next index is built on a background thread. Until it is
+ready, the previous index keeps answering.
+
+Run `python crossfilter.py --rows 1000000` to time index builds and selections on synthetic data.
+"""
+import argparse
+import threading
+import time
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = {
+    'country_name': "Country",
+    'violation': "Violation",
+    'driver_race': "Race",
+    'driver_gender': "Gender",
+    'stop_outcome': "Outcome",
+}
+# Cached date-range bitsets per index; ranges come from a few sidebar presets
+DATE_CACHE_SIZE = 8
+
+
+def _pack(mask):
+    """Packs a boolean array into little-endian uint64 words (bit i of the result is mask[i])."""
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    padded = np.zeros(-(-len(packed) // 8) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view(np.uint64)
+
+
+def _count(bits):
+    return int(np.bitwise_count(bits).sum())
+
+
+class BitmapIndex:
+    """Per-value bitsets over one frame of stops, with the Core Metrics flags and a ledger order."""
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.row_count = len(self.frame)
+        self.all_rows = _pack(np.ones(self.row_count, dtype=bool))
+        self.bitmaps = {}
+        self.values = {}
+        for column in FILTER_COLUMNS:
+            values = self.frame[column].astype('category')
+            codes = values.cat.codes.to_numpy()
+            self.bitmaps[column] = {value: _pack(codes == code) for code, value in enumerate(values.cat.categories)}
+            self.values[column] = sorted(self.bitmaps[column], key=str)
+
+        # Same definitions as core_metrics_query, evaluated once per outcome value instead of per row
+        outcomes = self.bitmaps['stop_outcome']
+        self.arrests = self._any_of([value for value in outcomes if "arrest" in str(value).lower()])
+        self.warnings = self._any_of([value for value in outcomes if "warning" in str(value).lower()])
+        drugs = pd.to_numeric(self.frame['drugs_related_stop'], errors='coerce').eq(1)
+        self.drug_related = _pack(drugs.fillna(False).to_numpy(dtype=bool))
+
+        self.stop_dates = pd.to_datetime(self.frame['stop_date'], errors='coerce').to_numpy('datetime64[ns]')
+        stop_times = pd.to_timedelta(self.frame['stop_time'], errors='coerce').to_numpy('timedelta64[ns]')
+        # Oldest first by (stop_date, stop_time); rows without both are not in the ledger, as in MySQL
+        order = np.lexsort((stop_times, self.stop_dates))
+        dated = ~np.isnat(self.stop_dates) & ~np.isnat(stop_times)
+        self.ledger_order = order[dated[order]]
+        self._date_bits = {}
+        self._lock = threading.Lock()
+
+    def _any_of(self, outcome_values):
+        bits = np.zeros_like(self.all_rows)
+        for value in outcome_values:
+            np.bitwise_or(bits, self.bitmaps['stop_outcome'][value], out=bits)
+        return bits
+
+    def _date_range_bits(self, date_range):
+        with self._lock:
+            bits = self._date_bits.get(date_range)
+        if bits is None:
+            first, last = (np.datetime64(day, 'ns') for day in date_range)
+            bits = _pack((self.stop_dates >= first) & (self.stop_dates < last + np.timedelta64(1, 'D')))
+            with self._lock:
+                if len(self._date_bits) >= DATE_CACHE_SIZE:
+                    self._date_bits.clear()
+                self._date_bits[date_range] = bits
+        return bits
+
+    def select(self, filters, match='all', date_range=None):
+        """Returns the bitset of the stops matching `filters` ({column: [values]}).
+
+        Values of one column are ORed; the columns are ANDed (match='all') or ORed (match='any').
+        A date range, (first, last) inclusive, always narrows the result.
+        """
+        parts = []
+        for column, values in filters.items():
+            bits = np.zeros_like(self.all_rows)
+            for value in values:
+                if value in self.bitmaps[column]:
+                    np.bitwise_or(bits, self.bitmaps[column][value], out=bits)
+            parts.append(bits)
+        if not parts:
+            selection = self.all_rows.copy()
+        else:
+            selection = reduce(np.bitwise_and if match == 'all' else np.bitwise_or, parts)
+        if date_range is not None:
+            np.bitwise_and(selection, self._date_range_bits(tuple(date_range)), out=selection)
+        return selection
+
+    def summary(self, selection):
+        """Returns the metrics of a selection in the shape of metrics.summarize_core_metrics."""
+        def breakdown(column, label):
+            counts = [(value, _count(selection & bits)) for value, bits in self.bitmaps[column].items()]
+            data = pd.DataFrame([item for item in counts if item[1]], columns=[label, 'Count'])
+            return data.sort_values('Count', ascending=False, ignore_index=True)
+
+        return {
+            'total_stops': _count(selection),
+            'arrests': _count(selection & self.arrests),
+            'warnings': _count(selection & self.warnings),
+            'drug_related': _count(selection & self.drug_related),
+            'violation_data': breakdown('violation', 'Violation'),
+            'gender_data': breakdown('driver_gender', 'Gender'),
+        }
+
+    def ledger_rows(self, selection, descending=True):
+        """Returns the row positions of a selection in ledger order."""
+        mask = np.unpackbits(selection.view(np.uint8), count=self.row_count, bitorder='little').astype(bool)
+        order = self.ledger_order[::-1] if descending else self.ledger_order
+        return order[mask[order]]
+
+
+class CrossFilter:
+    """Keeps a BitmapIndex in step with the local snapshot, rebuilding it off the request path."""
+
+    def __init__(self):
+        self.index = None
+        self.built_for = None
+        self.build_seconds = None
+        self.last_build_error = None
+        self._lock = threading.Lock()
+        self._building = False
+
+    def _build(self, snapshot, table):
+        try:
+            started = time.perf_counter()
+            index = BitmapIndex(snapshot.frame)
+            with self._lock:
+                self.index, self.built_for = index, table
+                self.build_seconds = round(time.perf_counter() - started, 3)
+                self.last_build_error = None
+        except Exception as e:
+            self.last_build_error = str(e)
+            print(f"Cross-Filter Build Error: {e}")
+        finally:
+            self._building = False
+
+    def index_for(self, snapshot):
+        """Returns the index for the snapshot's loaded data, or None when there is no local data yet."""
+        table = snapshot.table
+        if table is None or not snapshot.row_count:
+            return self.index
+        with self._lock:
+            stale = table is not self.built_for
+            start = stale and not self._building
+            if start:
+                self._building = True
+        if start and self.index is None:
+            # Nothing to serve yet: build on this request
+            self._build(snapshot, table)
+        elif start:
+            threading.Thread(target=self._build, args=(snapshot, table), name='crossfilter-build', daemon=True).start()
+        return self.index
+
+
+if __name__ == '__main__':
+    from schema import optimize_frame
+    from synthetic import generate_stops
+
+    parser = argparse.ArgumentParser(description="Time bitmap index builds and cross-filter selections.")
+    parser.add_argument('--rows', type=int, default=1000000, help="synthetic stops to index")
+    args = parser.parse_args()
+
+    frame = optimize_frame(generate_stops(args.rows))
+    started = time.perf_counter()
+    index = BitmapIndex(frame)
+    print(f"Built the index over {index.row_count} row(s) in {time.perf_counter() - started:.2f}s.")
+
+    combinations = {
+        "one country": ({'country_name': index.values['country_name'][:1]}, 'all'),
+        "two countries AND one violation AND one gender": (
+            {'country_name': index.values['country_name'][:2], 'violation': index.values['violation'][:1],
+             'driver_gender': index.values['driver_gender'][:1]}, 'all'),
+        "one race OR one outcome": (
+            {'driver_race': index.values['driver_race'][:1], 'stop_outcome': index.values['stop_outcome'][:1]}, 'any'),
+    }
+    for label, (filters, match) in combinations.items():
+        started = time.perf_counter()
+        selection = index.select(filters, match)
+        metrics = index.summary(selection)
+        page = index.frame.iloc[index.ledger_rows(selection)[:50]]
+        print(f"  {label:<50} {metrics['total_stops']:>9} stop(s)  {len(page):>3} ledger row(s)  "
+              f"{(time.perf_counter() - started) * 1000:>7.1f} ms")
@@ -0,0 +1,315 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pymysql
+
+from instrumentation import query_log
+
+# --- Configuration ---
+# Connection settings shared by the dashboard and every helper that talks to MySQL.
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'usha',
+    'database': 'securecheck',
+    'cursorclass': pymysql.cursors.DictCursor,
+    # Pooled connections are reused, so autocommit keeps each query on a fresh snapshot
+    # instead of an old REPEATABLE READ transaction left open by the previous borrower.
+    'autocommit': True,
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the acquire timeout."""
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of pymysql connections.
+
+    Streamlit runs every session in its own thread of the same process, so one pool
+    (created once at import time of this module) is shared across all sessions.
+    """
+
+    def __init__(self, max_size=10, acquire_timeout=5.0, idle_recycle=300,
+                 max_lifetime=3600, health_check_interval=30, **connect_kwargs):
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_recycle = idle_recycle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+
+        self._lock = threading.Condition()
+        self._idle = []          # list of (connection, created_at, last_used)
+        self._in_use = {}        # id(connection) -> created_at
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'acquired': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'recycled': 0,
+            'total_wait_seconds': 0.0,
+        }
+
+    # --- internal helpers ---
+    def _connect(self):
+        connection = pymysql.connect(**self.connect_kwargs)
+        with self._lock:
+            self._stats['created'] += 1
+        return connection
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closed'] += 1
+
+    def _is_healthy(self, connection, last_used):
+        """Pings connections that have been idle longer than the health check interval."""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    # --- public API ---
+    def acquire(self):
+        """Borrows a connection, waiting up to `acquire_timeout` seconds for a free slot."""
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        while True:
+            candidate = None
+            with self._lock:
+                while not self._idle and len(self._in_use) >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.acquire_timeout}s "
+                            f"(pool size {self.max_size})."
+                        )
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    candidate = self._idle.pop()
+                    connection, created_at, last_used = candidate
+                else:
+                    connection, created_at, last_used = None, time.monotonic(), None
+                # Reserve the slot before doing any network I/O outside the lock
+                slot = object()
+                self._in_use[id(slot)] = created_at
+
+            now = time.monotonic()
+            if connection is not None:
+                expired = (now - last_used > self.idle_recycle) or (now - created_at > self.max_lifetime)
+                if expired or not self._is_healthy(connection, last_used):
+                    if expired:
+                        with self._lock:
+                            self._stats['recycled'] += 1
+                    self._close(connection)
+                    connection = None
+
+            try:
+                if connection is None:
+                    connection = self._connect()
+                    created_at = time.monotonic()
+            except Exception:
+                with self._lock:
+                    self._in_use.pop(id(slot), None)
+                    self._lock.notify()
+                raise
+
+            with self._lock:
+                self._in_use.pop(id(slot), None)
+                self._in_use[id(connection)] = created_at
+                self._stats['acquired'] += 1
+                self._stats['total_wait_seconds'] += time.monotonic() - started
+            return connection
+
+    def release(self, connection, discard=False):
+        """Returns a borrowed connection; broken connections are discarded instead of reused."""
+        with self._lock:
+            created_at = self._in_use.pop(id(connection), time.monotonic())
+
+        if not discard:
+            try:
+                # Drop any transaction the borrower left open before handing it to someone else
+                connection.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, created_at, time.monotonic()))
+        with self._lock:
+            self._lock.notify()
+
+    def stats(self):
+        """Returns a snapshot of pool counters for monitoring."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['in_use'] = len(self._in_use)
+            snapshot['idle'] = len(self._idle)
+            snapshot['max_size'] = self.max_size
+        acquired = snapshot['acquired']
+        snapshot['avg_wait_ms'] = round(snapshot['total_wait_seconds'] / acquired * 1000, 2) if acquired else 0.0
+        return snapshot
+
+    def close_all(self):
+        """Closes every idle connection; borrowed ones are closed when released."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._close(connection)
+
+
+# Module-level pool: Streamlit re-executes the dashboard script on every rerun, but imports
+# this module only once per process, so every session shares the same connections.
+pool = ConnectionPool()
+
+
+# Use contextmanager to ensure the connection is returned to the pool, even when exceptions occur.
+@contextmanager
+def get_db_cursor():
+    """A context manager that borrows a pooled connection and yields its cursor."""
+    connection = None
+    broken = False
+    started = time.perf_counter()
+    acquired = None
+    try:
+        connection = pool.acquire()
+        acquired = time.perf_counter()
+        yield connection.cursor()
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+        # Lost or unusable connection: do not hand it back out to another session
+        broken = True
+        print(f"Database Connection Error: {e}")
+        raise
+    except Exception as e:
+        # Print error to the console for debugging, as st.error cannot be used inside st.cache_data
+        print(f"Database Connection Error: {e}")
+        raise
+    finally:
+        if connection:
+            pool.release(connection, discard=broken)
+        finished = time.perf_counter()
+        query_log.record(
+            'connection',
+            acquire_ms=round(((acquired or finished) - started) * 1000, 3),
+            held_ms=round((finished - acquired) * 1000, 3) if acquired else None,
+            status='broken' if broken else ('ok' if acquired else 'unavailable'),
+        )
+
+
+_present_columns = set()
+
+
+def require_columns(*columns):
+    """Raises RuntimeError unless policelog_data has `columns`; `python migrate.py` adds them.
+
+    The incremental syncs need log_id (and the snapshot updated_at). Adding them rebuilds the
+    table, so it is an explicit migration step instead of something a page load may trigger.
+    """
+    if _present_columns.issuperset(columns):
+        return
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'"""
+        )
+        existing = {row['name'].lower() for row in cursor.fetchall()}
+    missing = [column for column in columns if column not in existing]
+    if missing:
+        raise RuntimeError(f"policelog_data has no {', '.join(missing)} column; run `python migrate.py` to add it.")
+    _present_columns.update(columns)
+
+
+_present_tables = set()
+
+
+def require_table(table):
+    """Raises RuntimeError unless `table` exists; `python migrate.py` creates the ones the dashboard reads."""
+    if table in _present_tables:
+        return
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """SELECT COUNT(*) AS present FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+            (table,),
+        )
+        present = cursor.fetchone()['present']
+    if not present:
+        raise RuntimeError(f"There is no {table} table; run `python migrate.py` to create it.")
+    _present_tables.add(table)
+
+
+# AUTO_INCREMENT ids are allocated at insert time, not commit time, so a row can become visible
+# after rows with higher ids. A missing id holds the log_id syncs back until it appears, or for at
+# most this many seconds, after which it is taken as a rolled-back or failed insert.
+LOG_ID_GAP_TIMEOUT = 60
+# Marks computed from MAX(log_id) only look for gaps among this many of the newest ids
+LOG_ID_GAP_WINDOW = 20000
+
+
+class LogIdGaps:
+    """Tracks the log_id gaps one incremental sync has seen, so its high-water mark never skips
+    a row that commits after higher ids (e.g. one of ingest's 5000-row transactions)."""
+
+    def __init__(self, timeout=LOG_ID_GAP_TIMEOUT):
+        self.timeout = timeout
+        self._first_seen = {}   # first missing id of a gap -> time.monotonic() when first seen
+        self._lock = threading.Lock()
+
+    def _advance(self, start, ids):
+        # `start`: every id up to it is accounted for (None: nothing comes before the first id)
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if start is not None:
+            ids = ids[ids > start]
+        if not len(ids):
+            return start or 0
+        previous = np.concatenate(([ids[0] - 1 if start is None else start], ids[:-1]))
+        now = time.monotonic()
+        mark = None
+        with self._lock:
+            first_seen = {}
+            for position in np.flatnonzero(ids != previous + 1):
+                gap = int(previous[position]) + 1
+                first_seen[gap] = self._first_seen.get(gap, now)
+                if mark is None and now - first_seen[gap] < self.timeout:
+                    mark = int(previous[position])
+            mark = int(ids[-1]) if mark is None else mark
+            # Gaps below the new mark are settled; the rest keep their age for the next sync
+            self._first_seen = {gap: seen for gap, seen in first_seen.items() if gap > mark}
+        return mark
+
+    def safe_mark(self, high_water_mark, log_ids):
+        """Returns how far the mark can advance over `log_ids`, the ids just read above it.
+
+        The mark stops below the first gap younger than the timeout; rows above it are read
+        again on the next sync. A mark of 0 has nothing before it, so it starts at the first id.
+        """
+        return self._advance(high_water_mark or None, log_ids)
+
+    def read_mark(self, cursor, high_water_mark):
+        """safe_mark for syncs that aggregate up to a bound in SQL: reads the newest ids itself."""
+        cursor.execute("SELECT COALESCE(MAX(log_id), 0) AS max_log_id FROM policelog_data")
+        newest = int(cursor.fetchone()['max_log_id'])
+        if newest <= high_water_mark:
+            return high_water_mark
+        window_start = max(high_water_mark, newest - LOG_ID_GAP_WINDOW)
+        cursor.execute("SELECT log_id FROM policelog_data WHERE log_id > %s", (window_start,))
+        ids = [row['log_id'] for row in cursor.fetchall()]
+        # Ids below the window count as present, as does everything before the first id of a first sync
+        start = high_water_mark if window_start == high_water_mark and high_water_mark else None
+        return self._advance(start, ids)
@@ -0,0 +1,205 @@
+"""Headless export of the analysis queries and the ledger, for scheduled reports.
+
+Runs any or all query_map queries, or the whole policelog_data ledger, without
+Streamlit. Rows are streamed with a server-side cursor (pymysql SSCursor) and
+written in batches to CSV, Parquet or Arrow, so memory stays at one batch no
+matter how many rows the extract has. fetch_data's fetchall() holds every row in a
+DataFrame at once.
+
+    python export.py --list
+    python export.py --all --format parquet --output-dir reports/
+    python export.py --query 3 --query "Top 5 Violations with Highest Arrest Rates" --format csv
+    python export.py --ledger --format arrow --from 2024-01-01 --to 2024-12-31
+
+Output columns are typed from the MySQL result metadata, so every batch of an
+extract has the same Arrow schema. Files are written under a temporary name and
+renamed when complete.
+"""
+import argparse
+import csv
+import os
+import re
+import time
+from datetime import date, timedelta
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pymysql
+from pymysql.constants import FIELD_TYPE
+
+from db import DB_CONFIG
+from migrate import generated_columns_present
+from queries import filter_stop_dates, indexed_query_map, query_map, query_options
+
+LEDGER_QUERY = "SELECT * FROM policelog_data ORDER BY log_id"
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+# MySQL result column types -> Arrow types; anything else (text, JSON, ...) is written as a string
+ARROW_TYPES = {
+    FIELD_TYPE.TINY: pa.int64(), FIELD_TYPE.SHORT: pa.int64(), FIELD_TYPE.INT24: pa.int64(),
+    FIELD_TYPE.LONG: pa.int64(), FIELD_TYPE.LONGLONG: pa.int64(), FIELD_TYPE.YEAR: pa.int64(),
+    FIELD_TYPE.FLOAT: pa.float64(), FIELD_TYPE.DOUBLE: pa.float64(),
+    # Rates and averages come back as DECIMAL; reports read them as floats, as pandas does
+    FIELD_TYPE.DECIMAL: pa.float64(), FIELD_TYPE.NEWDECIMAL: pa.float64(),
+    FIELD_TYPE.DATE: pa.date32(),
+    FIELD_TYPE.DATETIME: pa.timestamp('us'), FIELD_TYPE.TIMESTAMP: pa.timestamp('us'),
+    # pymysql returns TIME as timedelta
+    FIELD_TYPE.TIME: pa.duration('us'),
+}
+
+
+def arrow_schema(description):
+    """Builds the Arrow schema of a result from its DB-API cursor description."""
+    return pa.schema([(column[0].lower(), ARROW_TYPES.get(column[1], pa.string())) for column in description])
+
+
+def _to_arrow(rows, schema):
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_floating(field.type):
+            values = [None if value is None else float(value) for value in values]
+        elif pa.types.is_string(field.type):
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _CsvWriter:
+    def __init__(self, path, schema):
+        self.handle = open(path, 'w', newline='')
+        self.writer = csv.writer(self.handle)
+        self.writer.writerow(schema.names)
+
+    def write(self, rows, schema):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.handle.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, schema):
+        self.writer = pq.ParquetWriter(path, schema)
+
+    def write(self, rows, schema):
+        self.writer.write_batch(_to_arrow(rows, schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path, schema):
+        self.sink = pa.OSFile(path, 'wb')
+        self.writer = ipc.new_file(self.sink, schema)
+
+    def write(self, rows, schema):
+        self.writer.write_batch(_to_arrow(rows, schema))
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+
+WRITERS = {'csv': _CsvWriter, 'parquet': _ParquetWriter, 'arrow': _ArrowWriter}
+
+
+def stream_query(cursor, sql, path, file_format, batch_size=10000):
+    """Streams the rows of `sql` from a server-side cursor into `path`. Returns the number of rows."""
+    cursor.execute(sql)
+    schema = arrow_schema(cursor.description)
+    temp_path = f"{path}.tmp"
+    writer = WRITERS[file_format](temp_path, schema)
+    rows_written = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.write(rows, schema)
+            rows_written += len(rows)
+    except BaseException:
+        writer.close()
+        os.remove(temp_path)
+        raise
+    writer.close()
+    os.replace(temp_path, path)
+    return rows_written
+
+
+def output_name(title):
+    """File name stem for a query title, e.g. 'top_5_violations_with_highest_arrest_rates'."""
+    return re.sub(r'[^0-9a-z]+', '_', title.lower()).strip('_')
+
+
+def resolve_queries(selections):
+    """Maps --query values (menu numbers from --list, or exact titles) to query titles."""
+    titles = []
+    for selection in selections:
+        if selection.isdigit() and 1 <= int(selection) <= len(query_options):
+            titles.append(query_options[int(selection) - 1])
+        elif selection in query_map:
+            titles.append(selection)
+        else:
+            raise ValueError(f"Unknown query {selection!r}; run `python export.py --list` for the choices.")
+    return titles
+
+
+def export(titles, include_ledger, file_format, output_dir, date_range=None, batch_size=10000, database=None):
+    """Exports the given query_map titles (and the ledger) and returns one summary dict per file."""
+    os.makedirs(output_dir, exist_ok=True)
+    # A dedicated unbuffered connection: an SSCursor holds it until its result is fully read
+    connection = pymysql.connect(**{**DB_CONFIG, 'database': database or DB_CONFIG['database'],
+                                    'cursorclass': pymysql.cursors.SSCursor})
+    summaries = []
+    try:
+        with connection.cursor() as cursor:
+            # Writing a large Parquet batch can pause reading longer than the 60s default
+            cursor.execute("SET SESSION net_write_timeout = 600")
+            with connection.cursor(pymysql.cursors.DictCursor) as schema_cursor:
+                queries = indexed_query_map if generated_columns_present(schema_cursor) else query_map
+            jobs = [(title, queries[title]) for title in titles]
+            if include_ledger:
+                jobs.append(("ledger", LEDGER_QUERY))
+            for title, sql in jobs:
+                path = os.path.join(output_dir, output_name(title) + FORMATS[file_format])
+                started = time.perf_counter()
+                rows = stream_query(cursor, filter_stop_dates(sql, date_range), path, file_format, batch_size)
+                summaries.append({'query': title, 'path': path, 'rows': rows,
+                                  'seconds': round(time.perf_counter() - started, 2)})
+    finally:
+        connection.close()
+    return summaries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export analysis results or the ledger without the dashboard.")
+    parser.add_argument('--list', action='store_true', help="print the numbered analysis queries and exit")
+    parser.add_argument('--query', action='append', default=[], metavar='NUMBER_OR_TITLE',
+                        help="analysis query to export; repeat for several")
+    parser.add_argument('--all', action='store_true', help="export every analysis query")
+    parser.add_argument('--ledger', action='store_true', help="export the full policelog_data ledger")
+    parser.add_argument('--format', choices=list(FORMATS), default='csv', help="output file format")
+    parser.add_argument('--output-dir', default='exports', help="directory for the output files")
+    parser.add_argument('--from', dest='first', type=date.fromisoformat, help="first stop date (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='last', type=date.fromisoformat, help="last stop date (YYYY-MM-DD)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="rows fetched and written per batch")
+    parser.add_argument('--database', default=DB_CONFIG['database'], help="database to export from")
+    args = parser.parse_args()
+
+    if args.list:
+        for number, title in enumerate(query_options, start=1):
+            print(f"{number:>3}. {title}")
+        raise SystemExit(0)
+    titles = list(query_options) if args.all else resolve_queries(args.query)
+    if not titles and not args.ledger:
+        parser.error("nothing to export; pass --query, --all or --ledger")
+    date_range = None
+    if args.first or args.last:
+        # filter_stop_dates compares with the day after the last date, so stop one day short of date.max
+        date_range = (args.first or date.min, args.last or date.max - timedelta(days=1))
+
+    for summary in export(titles, args.ledger, args.format, args.output_dir, date_range, args.batch_size, args.database):
+        print(f"  {summary['query']:<85} {summary['rows']:>10} row(s) {summary['seconds']:>8.2f}s  {summary['path']}")
@@ -0,0 +1,97 @@
+"""Lightweight query instrumentation for the dashboard's database hot path.
+
+Three kinds of events are recorded into one process-wide ring buffer:
+
+- fetch_data: wall time, rows returned and result cache status (hit / miss / coalesced)
+- database: query execution time on a cache miss, rows and result size in bytes, and
+  optionally the EXPLAIN plan with a full_scan flag when MySQL reports access type ALL
+- connection: time spent waiting for a pooled connection and how long it was held
+
+Recording is a perf_counter and a deque append, cheap enough to leave on. The log is
+viewable in the hidden admin panel (open the dashboard with ?admin=1) and can be
+downloaded as JSON lines; set SECURECHECK_QUERY_LOG to also append every event to a file.
+"""
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+
+class QueryLog:
+    """Thread-safe ring buffer of query events."""
+
+    def __init__(self, max_records=2000, log_path=None):
+        self.explain_enabled = False
+        self.log_path = log_path
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, source, **fields):
+        event = {'timestamp': datetime.now().isoformat(timespec='milliseconds'), 'source': source, **fields}
+        with self._lock:
+            self._records.append(event)
+            if self.log_path:
+                with open(self.log_path, 'a') as handle:
+                    handle.write(json.dumps(event, default=str) + '\n')
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def to_frame(self):
+        """Returns the recorded events, newest first."""
+        frame = pd.DataFrame(self.records())
+        return frame.iloc[::-1].reset_index(drop=True) if not frame.empty else frame
+
+    def summary(self):
+        """Aggregates fetch_data and database events per query: calls, latency percentiles, cache hits, errors, scans."""
+        frame = pd.DataFrame(self.records())
+        if frame.empty or 'query' not in frame.columns:
+            return pd.DataFrame()
+        frame = frame[frame['source'].isin(['fetch_data', 'database'])]
+        if frame.empty:
+            return pd.DataFrame()
+        fetches = frame[frame['source'] == 'fetch_data']
+        executions = frame[frame['source'] == 'database']
+        summary = fetches.groupby('query').agg(
+            calls=('wall_ms', 'size'),
+            p50_ms=('wall_ms', 'median'),
+            p95_ms=('wall_ms', lambda ms: ms.quantile(0.95)),
+            cache_hits=('cache', lambda status: int(status.isin(['hit', 'coalesced']).sum())),
+            errors=('cache', lambda status: int((status == 'error').sum())),
+            rows=('rows', 'max'),
+        )
+        if not executions.empty:
+            database = executions.groupby('query').agg(
+                executions=('db_ms', 'size'),
+                max_db_ms=('db_ms', 'max'),
+                result_bytes=('result_bytes', 'max'),
+            )
+            if 'full_scan' in executions.columns:
+                database['full_scan'] = executions.groupby('query')['full_scan'].max()
+            summary = summary.join(database, how='outer')
+        return summary.sort_values('p95_ms', ascending=False).round(2).reset_index()
+
+    def export_jsonl(self):
+        """Returns every recorded event as JSON lines, oldest first."""
+        return '\n'.join(json.dumps(event, default=str) for event in self.records())
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+def explain(cursor, query):
+    """Returns the EXPLAIN rows for `query` as JSON text and whether any table is read with a full scan."""
+    cursor.execute(f"EXPLAIN {query}")
+    plan = [dict(row) for row in cursor.fetchall()]
+    full_scan = any(str(row.get('type', '')).upper() == 'ALL' for row in plan)
+    # JSON text keeps the event flat enough for st.dataframe and the JSON lines export
+    return json.dumps(plan, default=str), full_scan
+
+
+# Module-level log, shared by every session in the process like the connection pool in db.py.
+query_log = QueryLog(log_path=os.environ.get('SECURECHECK_QUERY_LOG'))
@@ -0,0 +1,153 @@
+"""Running totals behind the dashboard's Core Metrics and Visual Insights charts.
+
+One process-wide store keeps the counters the page shows: stops, arrests, warnings
+and drug-related stops, plus stop counts per violation and per driver gender. It is
+seeded once with the aggregate core_metrics_query (comparing outcome codes once
+codes.py has backfilled them), bounded by the current MAX(log_id),
+and from then on only stops past that high-water mark are read and added. That
+covers every writer: form logs after each write-behind flush, bulk ingest batches,
+and other dashboards on the next background sync.
+
+Reading a metric is a dictionary lookup, so the metrics panel can re-render every
+few seconds without rescanning policelog_data. Edits and deletes of existing rows
+are not seen incrementally; seed() recounts from scratch.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+from codes import codes_backfilled
+from db import LogIdGaps, get_db_cursor, require_columns
+from metrics import coded_core_metrics_query, core_metrics_query, snapshot_metrics_cube
+
+COUNTER_COLUMNS = ['total_stops', 'total_arrests', 'total_warnings', 'total_drug_related']
+
+
+def _bounded(query):
+    """The cube query limited to the stops up to a high-water mark. It runs with parameters,
+    so the LIKE wildcards are escaped from pymysql's % formatting."""
+    return query.replace('%', '%%').replace("GROUP BY", "WHERE log_id <= %s\nGROUP BY")
+
+
+BOUNDED_CORE_METRICS_QUERY = _bounded(core_metrics_query)
+BOUNDED_CODED_CORE_METRICS_QUERY = _bounded(coded_core_metrics_query)
+
+
+class LiveMetrics:
+    """Thread-safe running totals for the Core Metrics, advanced by log_id high-water mark."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._log_id_gaps = LogIdGaps()
+        self._sync_thread = None
+        # Set at seed time: once the codes are backfilled the outcomes are counted by outcome_code
+        self._coded = False
+        self._reset()
+        self.last_sync_error = None
+        self.last_synced_at = None
+
+    def _reset(self):
+        with self._lock:
+            self.totals = dict.fromkeys(COUNTER_COLUMNS, 0)
+            self.by_violation = Counter()
+            self.by_gender = Counter()
+            self.high_water_mark = 0
+            self.seeded = False
+
+    def add_cube(self, cube):
+        """Adds a (violation x gender) metrics cube, as returned by core_metrics_query, to the totals."""
+        if cube.empty:
+            return
+        cube = cube.copy()
+        cube[COUNTER_COLUMNS] = cube[COUNTER_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+        violations = cube.groupby('violation', observed=True)['total_stops'].sum()
+        genders = cube.groupby('driver_gender', observed=True)['total_stops'].sum()
+        sums = cube[COUNTER_COLUMNS].sum()
+        with self._lock:
+            for column in COUNTER_COLUMNS:
+                self.totals[column] += int(sums[column])
+            self.by_violation.update({value: int(count) for value, count in violations.items()})
+            self.by_gender.update({value: int(count) for value, count in genders.items()})
+
+    def summary(self):
+        """Returns the metrics in the shape of metrics.summarize_core_metrics, without touching the data."""
+        with self._lock:
+            totals = dict(self.totals)
+            violation_data = pd.DataFrame(self.by_violation.most_common(), columns=['Violation', 'Count'])
+            gender_data = pd.DataFrame(self.by_gender.most_common(), columns=['Gender', 'Count'])
+        return {
+            'total_stops': totals['total_stops'],
+            'arrests': totals['total_arrests'],
+            'warnings': totals['total_warnings'],
+            'drug_related': totals['total_drug_related'],
+            'violation_data': violation_data,
+            'gender_data': gender_data,
+        }
+
+    def seed(self):
+        """Counts every stop up to the current MAX(log_id) with one aggregate query."""
+        require_columns('log_id')
+        with self._sync_lock:
+            with get_db_cursor() as cursor:
+                # Up to MAX(log_id), short of any recent gap that may still commit
+                high_water_mark = self._log_id_gaps.read_mark(cursor, 0)
+                self._coded = codes_backfilled(cursor)
+                query = BOUNDED_CODED_CORE_METRICS_QUERY if self._coded else BOUNDED_CORE_METRICS_QUERY
+                cursor.execute(query, (high_water_mark,))
+                cube = pd.DataFrame(cursor.fetchall())
+            self._reset()
+            if not cube.empty:
+                cube.columns = cube.columns.str.lower()
+                self.add_cube(cube)
+            self.high_water_mark = high_water_mark
+            self.seeded = True
+            self.last_synced_at = datetime.now()
+
+    def sync(self):
+        """Adds the stops logged since the last sync. Returns the number of new rows."""
+        if not self.seeded:
+            self.seed()
+            return 0
+        with self._sync_lock:
+            with get_db_cursor() as cursor:
+                # snapshot_metrics_cube counts by outcome_code when the column is there
+                outcome = "stop_outcome, outcome_code" if self._coded else "stop_outcome"
+                cursor.execute(
+                    f"""SELECT log_id, violation, driver_gender, {outcome}, drugs_related_stop
+FROM policelog_data WHERE log_id > %s ORDER BY log_id""",
+                    (self.high_water_mark,),
+                )
+                new_rows = pd.DataFrame(cursor.fetchall())
+            self.last_synced_at = datetime.now()
+            if new_rows.empty:
+                return 0
+            new_rows.columns = new_rows.columns.str.lower()
+            # Rows above a log_id gap that may still commit are read again on the next sync
+            mark = self._log_id_gaps.safe_mark(self.high_water_mark, new_rows['log_id'])
+            new_rows = new_rows[new_rows['log_id'].astype('int64') <= mark]
+            if not new_rows.empty:
+                self.add_cube(snapshot_metrics_cube(new_rows))
+            self.high_water_mark = mark
+            return len(new_rows)
+
+    def start_background_sync(self, interval=5):
+        """Keeps the totals current on a daemon thread, so page renders never wait on MySQL."""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sync()
+                    self.last_sync_error = None
+                except Exception as e:
+                    self.last_sync_error = str(e)
+                    print(f"Live Metrics Sync Error: {e}")
+                time.sleep(interval)
+
+        self._sync_thread = threading.Thread(target=run, name='live-metrics-sync', daemon=True)
+        self._sync_thread.start()
@@ -0,0 +1,85 @@
+"""Core Metrics and Visual Insights aggregation, shared by the dashboard and the benchmarks."""
+import pandas as pd
+
+from codes import OUTCOME_ARREST, OUTCOME_WARNING
+
+# Core Metrics and both Visual Insights charts are answered by one aggregate query.
+# MySQL returns a small (violation x gender) cube instead of every row, and pandas only
+# has to sum a few hundred rows, so page load no longer grows with the table size.
+core_metrics_query = """SELECT 
+    violation,
+    driver_gender,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN LOWER(stop_outcome) LIKE '%arrest%' THEN 1 ELSE 0 END) AS total_arrests,
+    SUM(CASE WHEN LOWER(stop_outcome) LIKE '%warning%' THEN 1 ELSE 0 END) AS total_warnings,
+    SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END) AS total_drug_related
+FROM 
+    policelog_data
+GROUP BY 
+    violation, driver_gender"""
+
+# After `python codes.py --backfill` the outcome counters compare outcome_code instead of matching text.
+# 'Arrest Driver' and 'Arrest Passenger' both code as Arrest, so the counts are unchanged.
+coded_core_metrics_query = (
+    core_metrics_query
+    .replace("LOWER(stop_outcome) LIKE '%arrest%'", f"outcome_code = {OUTCOME_ARREST}")
+    .replace("LOWER(stop_outcome) LIKE '%warning%'", f"outcome_code = {OUTCOME_WARNING}")
+)
+
+
+def summarize_core_metrics(cube):
+    """Reduces the aggregated metrics cube to the four counters and the two chart breakdowns."""
+    counter_columns = ['total_stops', 'total_arrests', 'total_warnings', 'total_drug_related']
+    cube = cube.copy()
+    cube[counter_columns] = cube[counter_columns].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+
+    totals = cube[counter_columns].sum()
+    violation_data = (
+        cube.groupby('violation', observed=True)['total_stops'].sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+    violation_data.columns = ['Violation', 'Count']
+    gender_data = (
+        cube.groupby('driver_gender', observed=True)['total_stops'].sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+    gender_data.columns = ['Gender', 'Count']
+    return {
+        'total_stops': int(totals['total_stops']),
+        'arrests': int(totals['total_arrests']),
+        'warnings': int(totals['total_warnings']),
+        'drug_related': int(totals['total_drug_related']),
+        'violation_data': violation_data,
+        'gender_data': gender_data,
+    }
+
+
+def snapshot_metrics_cube(frame):
+    """Builds the same (violation x gender) cube as core_metrics_query from the local snapshot."""
+    codes = pd.to_numeric(frame['outcome_code'], errors='coerce') if 'outcome_code' in frame.columns else None
+    if codes is not None and codes.notna().all():
+        # Coded rows (codes.py) compare small integers instead of matching text
+        arrests, warnings = codes.eq(OUTCOME_ARREST), codes.eq(OUTCOME_WARNING)
+    else:
+        outcome = frame['stop_outcome'].astype('string').str.lower()
+        arrests, warnings = outcome.str.contains("arrest", na=False), outcome.str.contains("warning", na=False)
+    counters = pd.DataFrame({
+        'violation': frame['violation'],
+        'driver_gender': frame['driver_gender'],
+        'total_stops': 1,
+        'total_arrests': arrests.astype(int),
+        'total_warnings': warnings.astype(int),
+        'total_drug_related': pd.to_numeric(frame['drugs_related_stop'], errors='coerce').eq(1).fillna(False).astype(int),
+    })
+    return counters.groupby(['violation', 'driver_gender'], dropna=False, observed=True).sum().reset_index()
+
+
+def merge_metrics_cubes(cube, delta):
+    """Adds the cube of newly logged stops to a cached cube, so the metrics need no full recount."""
+    counter_columns = ['total_stops', 'total_arrests', 'total_warnings', 'total_drug_related']
+    merged = pd.concat([cube.astype({'violation': object, 'driver_gender': object}),
+                        delta.astype({'violation': object, 'driver_gender': object})], ignore_index=True)
+    merged[counter_columns] = merged[counter_columns].apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+    return merged.groupby(['violation', 'driver_gender'], dropna=False).sum().reset_index()
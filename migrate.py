@@ -0,0 +1,195 @@
+"""Index-friendly schema migration for policelog_data.
+
+Adds the change-tracking columns the incremental syncs read (an AUTO_INCREMENT
+log_id and an indexed updated_at) and the unique client_log_id that makes the
+form's write-behind inserts safe to replay, so the dashboard never alters the
+table from a page load. Also creates the policelog_version counter row that a
+DELETE trigger bumps, so the result cache notices deletes without counting rows. Also adds stored generated columns for the stop hour, year and month, plus composite
+indexes shaped after the predicates and GROUP BY keys of the shipped query_map
+queries (most are covering, so MySQL answers them from the index alone). The
+migration is one ALTER TABLE, only for the pieces that are missing, so it is
+safe to re-run. Adding stored columns rebuilds the table: run it off-hours.
+
+With --benchmark, every query_map query is timed before the migration and its
+indexed_query_map rewrite after it, and the per-query numbers are printed and
+written as JSON.
+
+    python migrate.py --benchmark --output migration_bench.json
+    python migrate.py --database securecheck_bench --benchmark   # after benchmark.py --backend mysql
+"""
+import argparse
+import json
+import statistics
+import time
+
+import pymysql
+
+from db import DB_CONFIG
+from queries import indexed_query_map, query_map
+
+# Read by the rollups, the snapshot, the live metrics and the other log_id/updated_at syncs,
+# plus the replay key of the form's write-behind inserts
+SYNC_COLUMNS = {
+    'log_id': "BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY",
+    'updated_at': "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)",
+    # Set by write_behind.py for each form stop; bulk-loaded rows leave it NULL
+    'client_log_id': "CHAR(36) NULL",
+}
+# Every unique key of a partitioned table must include the partitioning column (partitions.py);
+# form stops always have a stop_date, so a replayed stop still collides with its first insert
+UNIQUE_INDEXES = {'uq_client_log_id': "(client_log_id, stop_date)"}
+
+# Deletes move neither MAX(log_id) nor MAX(updated_at); this counter, read by backends.py with
+# the maxima, does. DROP PARTITION fires no trigger, so partitions.py bumps it itself.
+VERSION_STATEMENTS = {
+    'policelog_version': [
+        """CREATE TABLE policelog_version (
+    id TINYINT NOT NULL PRIMARY KEY,
+    deletes BIGINT NOT NULL DEFAULT 0
+)""",
+        "INSERT INTO policelog_version (id) VALUES (1)",
+    ],
+    'policelog_count_deletes': [
+        """CREATE TRIGGER policelog_count_deletes AFTER DELETE ON policelog_data
+FOR EACH ROW UPDATE policelog_version SET deletes = deletes + 1 WHERE id = 1""",
+    ],
+}
+
+GENERATED_COLUMNS = {
+    'stop_hour': "TINYINT AS (HOUR(stop_time)) STORED",
+    'stop_year': "SMALLINT AS (YEAR(stop_date)) STORED",
+    'stop_month': "TINYINT AS (MONTH(stop_date)) STORED",
+}
+
+# Each index is named after the queries it serves
+INDEXES = {
+    'idx_drugs_vehicle': "(drugs_related_stop, vehicle_number)",               # top drug-related vehicles
+    'idx_search_vehicle': "(search_conducted, vehicle_number)",                # most searched vehicles
+    'idx_age_arrest_violation': "(driver_age, is_arrested, violation)",        # age arrest rate, young drivers
+    'idx_country_gender_race_age': "(country_name, driver_gender, driver_race, driver_age)",  # gender/demographics by country
+    'idx_race_gender_search': "(driver_race, driver_gender, search_conducted)",  # race and gender search rate
+    'idx_hour_arrest': "(stop_hour, is_arrested)",                             # time of day, day vs night arrests
+    'idx_violation_duration': "(violation, stop_duration)",                    # average stop duration
+    'idx_violation_search_arrest': "(violation, search_conducted, is_arrested)",  # violation search/arrest rates
+    'idx_country_violation_arrest_search': "(country_name, violation, is_arrested, search_conducted)",  # country rates
+    'idx_country_year_arrest': "(country_name, stop_year, is_arrested)",       # yearly breakdown by country
+    'idx_race_violation_age': "(driver_race, violation, driver_age)",          # violation trends by age and race
+    'idx_year_month_hour': "(stop_year, stop_month, stop_hour)",               # year/month/hour time analysis
+    'idx_policelog_updated_at': "(updated_at)",                                # snapshot and version syncs
+    'idx_stop_date_time': "(stop_date, stop_time, log_id)",                    # ledger keyset pages
+}
+
+
+def generated_columns_present(cursor):
+    """True when the generated time columns exist, i.e. indexed_query_map can be used."""
+    cursor.execute(
+        """SELECT COUNT(*) AS present
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'
+    AND COLUMN_NAME IN ('stop_hour', 'stop_year', 'stop_month')"""
+    )
+    return cursor.fetchone()['present'] == len(GENERATED_COLUMNS)
+
+
+def pending_alterations(cursor):
+    """Returns the ALTER TABLE clauses for the columns and indexes that do not exist yet."""
+    cursor.execute(
+        """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'"""
+    )
+    columns = {row['name'].lower() for row in cursor.fetchall()}
+    cursor.execute(
+        """SELECT DISTINCT INDEX_NAME AS name FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'"""
+    )
+    indexes = {row['name'].lower() for row in cursor.fetchall()}
+
+    # Existing rows get log_ids in storage order; new rows get increasing ids
+    clauses = [f"ADD COLUMN {name} {definition}" for name, definition in {**SYNC_COLUMNS, **GENERATED_COLUMNS}.items()
+               if name not in columns]
+    clauses += [f"ADD INDEX {name} {definition}" for name, definition in INDEXES.items()
+                if name not in indexes]
+    clauses += [f"ADD UNIQUE INDEX {name} {definition}" for name, definition in UNIQUE_INDEXES.items()
+                if name not in indexes]
+    return clauses
+
+
+def pending_statements(cursor):
+    """Returns the statements that create the delete counter table and trigger, if they do not exist yet."""
+    cursor.execute(
+        """SELECT TABLE_NAME AS name FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()
+UNION ALL
+SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()"""
+    )
+    existing = {row['name'].lower() for row in cursor.fetchall()}
+    return [statement for name, statements in VERSION_STATEMENTS.items() if name not in existing
+            for statement in statements]
+
+
+def migrate(cursor):
+    """Applies the missing columns and indexes in a single table rebuild, then creates the delete
+    counter. Returns the clauses and statements applied."""
+    clauses = pending_alterations(cursor)
+    if clauses:
+        cursor.execute("ALTER TABLE policelog_data\n    " + ",\n    ".join(clauses))
+    statements = pending_statements(cursor)
+    for statement in statements:
+        cursor.execute(statement)
+    return clauses + statements
+
+
+def time_queries(cursor, queries, repeat):
+    """Returns the median milliseconds of each query over `repeat` runs."""
+    timings = {}
+    for title, sql in queries.items():
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            runs.append((time.perf_counter() - started) * 1000)
+        timings[title] = statistics.median(runs)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add generated time columns and composite indexes to policelog_data.")
+    parser.add_argument('--database', default=DB_CONFIG['database'], help="database to migrate")
+    parser.add_argument('--benchmark', action='store_true', help="time every query before and after the migration")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per query when benchmarking")
+    parser.add_argument('--output', default='migration_bench.json', help="JSON file for the benchmark numbers")
+    args = parser.parse_args()
+
+    connection = pymysql.connect(**{**DB_CONFIG, 'database': args.database})
+    try:
+        with connection.cursor() as cursor:
+            # SQL_NO_CACHE is gone in MySQL 8, so plain repeats measure the real plans
+            before = time_queries(cursor, query_map, args.repeat) if args.benchmark else None
+
+            started = time.perf_counter()
+            applied = migrate(cursor)
+            print(f"Applied {len(applied)} change(s) in {time.perf_counter() - started:.1f}s.")
+            for clause in applied:
+                print(f"  {clause}")
+
+            if args.benchmark:
+                cursor.execute("ANALYZE TABLE policelog_data")
+                cursor.fetchall()
+                after = time_queries(cursor, indexed_query_map, args.repeat)
+                results = [
+                    {
+                        'query': title,
+                        'before_ms': round(before[title], 2),
+                        'after_ms': round(after[title], 2),
+                        'speedup': round(before[title] / after[title], 2) if after[title] else None,
+                    }
+                    for title in query_map
+                ]
+                for result in results:
+                    print(f"  {result['query']:<85} {result['before_ms']:>10.1f} ms -> "
+                          f"{result['after_ms']:>10.1f} ms  ({result['speedup']}x)")
+                with open(args.output, 'w') as handle:
+                    json.dump({'database': args.database, 'repeat': args.repeat, 'results': results}, handle, indent=2)
+                print(f"Wrote before/after numbers to {args.output}")
+    finally:
+        connection.close()
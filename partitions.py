@@ -0,0 +1,223 @@
+"""Monthly range partitioning of policelog_data by stop_date, and archiving of cold years.
+
+Most questions at the check post are about the last week or month. With one
+partition per month, a query filtered by stop_date (the dashboard's date range,
+queries.filter_stop_dates) only reads the partitions for those months instead of
+the whole history:
+
+    PARTITION BY RANGE COLUMNS (stop_date)
+        p_old     rows older than the first month (late backfills)
+        p202401   2024-01-01 <= stop_date < 2024-02-01
+        ...
+        p_future  rows past the last monthly partition
+
+MySQL requires the partitioning column in every unique key, so the primary key
+becomes (log_id, stop_date), any other unique key gets stop_date appended, and
+stop_date becomes NOT NULL. Ingest already
+quarantines rows without a stop date. Partitioning rebuilds the table, so run it
+off-hours. Running it again later only adds the months that are missing, so run
+it monthly from cron:
+
+    python partitions.py                      # partition, or add upcoming months
+    python partitions.py --check-pruning 30   # partitions each analysis reads for the last 30 days
+    python partitions.py --archive 2019       # move a cold year to snapshots/archive/
+
+Archiving writes a year's stops to Parquet, verifies the row count, and then
+drops that year's partitions (a metadata operation, no row-by-row delete). An
+archived year stays queryable offline on the embedded backend:
+
+    SECURECHECK_BACKEND=duckdb SECURECHECK_EMBEDDED_PATH=snapshots/archive/policelog_2019.parquet streamlit run Securecheck.py
+
+The rollups and the local snapshot still count archived stops until they are
+rebuilt (`python rollups.py --rebuild`, `python snapshot.py --rebuild`).
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pymysql
+
+from db import DB_CONFIG
+from queries import filter_stop_dates, query_map
+from schema import optimize_frame
+from snapshot import SNAPSHOT_PATH
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(SNAPSHOT_PATH), 'archive')
+# Monthly partitions are kept this many months past the current one, so new stops never land in p_future
+MONTHS_AHEAD = 3
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month_start, months):
+    month = month_start.month - 1 + months
+    return date(month_start.year + month // 12, month % 12 + 1, 1)
+
+
+def _monthly_partitions(first_month, last_month):
+    """Returns the PARTITION clauses for every month from `first_month` to `last_month`, inclusive."""
+    clauses = []
+    month = first_month
+    while month <= last_month:
+        clauses.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1).isoformat()}')")
+        month = _add_months(month, 1)
+    return clauses
+
+
+def partition_layout(cursor):
+    """Returns [(partition name, upper bound, rows)] in order, or [] when the table is not partitioned."""
+    cursor.execute(
+        """SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS table_rows
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data' AND PARTITION_NAME IS NOT NULL
+ORDER BY PARTITION_ORDINAL_POSITION"""
+    )
+    return [(row['name'], row['bound'], row['table_rows']) for row in cursor.fetchall()]
+
+
+def unique_keys_without_stop_date(cursor):
+    """Returns {index name: [columns]} for the unique keys other than the primary key that lack stop_date."""
+    cursor.execute(
+        """SELECT INDEX_NAME AS name, COLUMN_NAME AS column_name
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data' AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'
+ORDER BY INDEX_NAME, SEQ_IN_INDEX"""
+    )
+    keys = {}
+    for row in cursor.fetchall():
+        keys.setdefault(row['name'], []).append(row['column_name'].lower())
+    return {name: key_columns for name, key_columns in keys.items() if 'stop_date' not in key_columns}
+
+
+def partition_table(cursor, months_ahead=MONTHS_AHEAD):
+    """Partitions policelog_data by month of stop_date. Returns the number of monthly partitions created."""
+    cursor.execute("SELECT COUNT(*) AS undated FROM policelog_data WHERE stop_date IS NULL")
+    undated = cursor.fetchone()['undated']
+    if undated:
+        raise ValueError(f"{undated} row(s) have no stop_date; fix or delete them before partitioning by date.")
+    cursor.execute("SELECT MIN(stop_date) AS first_date FROM policelog_data")
+    first_date = cursor.fetchone()['first_date'] or date.today()
+    first_month = _month_start(first_date)
+    last_month = _add_months(_month_start(date.today()), months_ahead)
+
+    cursor.execute(
+        """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'policelog_data'"""
+    )
+    columns = {row['name'].lower() for row in cursor.fetchall()}
+    key_changes = ["MODIFY stop_date DATE NOT NULL"]
+    if 'log_id' in columns:
+        key_changes += ["DROP PRIMARY KEY", "ADD PRIMARY KEY (log_id, stop_date)"]
+    else:
+        key_changes += ["ADD COLUMN log_id BIGINT NOT NULL AUTO_INCREMENT", "ADD PRIMARY KEY (log_id, stop_date)"]
+    for name, key_columns in unique_keys_without_stop_date(cursor).items():
+        key_changes += [f"DROP INDEX {name}", f"ADD UNIQUE INDEX {name} ({', '.join(key_columns + ['stop_date'])})"]
+    cursor.execute("ALTER TABLE policelog_data\n    " + ",\n    ".join(key_changes))
+
+    partitions = [f"PARTITION p_old VALUES LESS THAN ('{first_month.isoformat()}')"]
+    partitions += _monthly_partitions(first_month, last_month)
+    partitions += ["PARTITION p_future VALUES LESS THAN (MAXVALUE)"]
+    cursor.execute(
+        "ALTER TABLE policelog_data\nPARTITION BY RANGE COLUMNS (stop_date) (\n    " + ",\n    ".join(partitions) + "\n)"
+    )
+    return len(partitions) - 2
+
+
+def extend_partitions(cursor, months_ahead=MONTHS_AHEAD):
+    """Splits the upcoming months out of p_future. Returns the number of monthly partitions added."""
+    layout = partition_layout(cursor)
+    monthly = [name for name, _, _ in layout if name not in ('p_old', 'p_future')]
+    next_month = _add_months(date(int(monthly[-1][1:5]), int(monthly[-1][5:7]), 1), 1)
+    last_month = _add_months(_month_start(date.today()), months_ahead)
+    partitions = _monthly_partitions(next_month, last_month)
+    if partitions:
+        # Only the rows already in p_future are copied
+        cursor.execute(
+            "ALTER TABLE policelog_data REORGANIZE PARTITION p_future INTO (\n    "
+            + ",\n    ".join(partitions + ["PARTITION p_future VALUES LESS THAN (MAXVALUE)"]) + "\n)"
+        )
+    return len(partitions)
+
+
+def check_pruning(cursor, days):
+    """Returns {query title: partitions read} for every query_map query filtered to the last `days` days."""
+    today = date.today()
+    date_range = (today - timedelta(days=days - 1), today)
+    touched = {}
+    for title, sql in query_map.items():
+        cursor.execute("EXPLAIN " + filter_stop_dates(sql, date_range))
+        partitions = set()
+        for row in cursor.fetchall():
+            if row.get('table') == 'policelog_data' and row.get('partitions'):
+                partitions.update(row['partitions'].split(','))
+        touched[title] = sorted(partitions)
+    return touched
+
+
+def archive_year(cursor, year, directory=ARCHIVE_DIR):
+    """Moves the stops of a past `year` to a Parquet file and drops them from policelog_data.
+
+    Returns (rows archived, Parquet path).
+    """
+    if year >= date.today().year:
+        raise ValueError(f"{year} is not a past year; only completed years can be archived.")
+    first, end = date(year, 1, 1), date(year + 1, 1, 1)
+    cursor.execute("SELECT * FROM policelog_data WHERE stop_date >= %s AND stop_date < %s", (first, end))
+    frame = pd.DataFrame(cursor.fetchall())
+    path = os.path.join(directory, f"policelog_{year}.parquet")
+    if frame.empty:
+        return 0, path
+    frame.columns = frame.columns.str.lower()
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    pq.write_table(pa.Table.from_pandas(optimize_frame(frame), preserve_index=False), temp_path)
+    # Nothing is dropped unless the file holds every row
+    if pq.ParquetFile(temp_path).metadata.num_rows != len(frame):
+        os.remove(temp_path)
+        raise RuntimeError(f"Archive file for {year} is incomplete; nothing was dropped.")
+    os.replace(temp_path, path)
+
+    layout = {name for name, _, _ in partition_layout(cursor)}
+    year_partitions = [f"p{year}{month:02d}" for month in range(1, 13) if f"p{year}{month:02d}" in layout]
+    if year_partitions:
+        cursor.execute(f"ALTER TABLE policelog_data DROP PARTITION {', '.join(year_partitions)}")
+        # Dropping a partition fires no DELETE trigger, so the version the result caches read is moved here
+        cursor.execute("UPDATE policelog_version SET deletes = deletes + 1 WHERE id = 1")
+    # Rows outside the monthly partitions (p_old, or an unpartitioned table) are deleted
+    cursor.execute("DELETE FROM policelog_data WHERE stop_date >= %s AND stop_date < %s", (first, end))
+    return len(frame), path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Partition policelog_data by month and archive cold years.")
+    parser.add_argument('--database', default=DB_CONFIG['database'], help="database to partition")
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD, help="empty monthly partitions to keep ahead")
+    parser.add_argument('--check-pruning', type=int, metavar='DAYS',
+                        help="show the partitions each analysis reads for the last DAYS days")
+    parser.add_argument('--archive', type=int, metavar='YEAR', help="move a past year to Parquet and drop it")
+    args = parser.parse_args()
+
+    connection = pymysql.connect(**{**DB_CONFIG, 'database': args.database})
+    try:
+        with connection.cursor() as cursor:
+            if args.archive:
+                rows, path = archive_year(cursor, args.archive)
+                print(f"Archived {rows} stop(s) from {args.archive} to {path}.")
+                print("Run `python rollups.py --rebuild` and `python snapshot.py --rebuild` to drop them from the caches.")
+            elif args.check_pruning:
+                total = len(partition_layout(cursor))
+                for title, partitions in check_pruning(cursor, args.check_pruning).items():
+                    print(f"  {title:<85} {len(partitions):>4} of {total} partition(s)")
+            elif partition_layout(cursor):
+                added = extend_partitions(cursor, args.months_ahead)
+                print(f"Added {added} monthly partition(s).")
+            else:
+                created = partition_table(cursor, args.months_ahead)
+                print(f"Partitioned policelog_data into {created} monthly partition(s).")
+    finally:
+        connection.close()
@@ -0,0 +1,163 @@
+"""Precomputed lookup index for the stop outcome / violation prediction form.
+
+Instead of masking the whole dataset on every form submit, the index keeps, for every
+combination of the form's key fields, how often each outcome and violation occurred.
+The modal values are maintained as counts arrive, so a prediction is a dictionary lookup.
+
+When the exact combination has never been seen, the lookup backs off to coarser keys
+(age band instead of exact age, then dropping age, race and duration) rather than a
+fixed default. New stops are folded in incrementally by log_id high-water mark.
+"""
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from db import LogIdGaps, get_db_cursor, require_columns
+from schema import optimize_frame
+
+KEY_COLUMNS = ['driver_gender', 'driver_age', 'driver_race', 'search_conducted', 'drugs_related_stop', 'stop_duration']
+
+# Finest to coarsest; the first level with any history answers the lookup.
+BACKOFF_LEVELS = [
+    ("exact match", ['driver_gender', 'driver_age', 'driver_race', 'search_conducted', 'drugs_related_stop', 'stop_duration']),
+    ("gender, age band, race, search, drugs and duration", ['driver_gender', 'age_band', 'driver_race', 'search_conducted', 'drugs_related_stop', 'stop_duration']),
+    ("gender, race, search, drugs and duration", ['driver_gender', 'driver_race', 'search_conducted', 'drugs_related_stop', 'stop_duration']),
+    ("gender, search, drugs and duration", ['driver_gender', 'search_conducted', 'drugs_related_stop', 'stop_duration']),
+    ("search and drug flags", ['search_conducted', 'drugs_related_stop']),
+    ("all historical stops", []),
+]
+
+AGE_BAND_WIDTH = 10
+
+# The form's labels -> the short codes the table stores (as in the traffic_stops source data)
+FORM_GENDERS = {"Male": "M", "Female": "F"}
+FORM_DURATIONS = {
+    "0-15 Minutes": "0-15 Min", "16-30 Minutes": "16-30 Min",
+    "31-60 Minutes": "30+ Min", "1-2 Hours": "30+ Min", "More than 2 Hours": "30+ Min",
+}
+
+
+class _Entry:
+    """Outcome/violation counts for one key, with the current modes kept up to date."""
+
+    __slots__ = ('outcomes', 'violations', 'outcome', 'violation', 'support')
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.violations = Counter()
+        self.outcome = None
+        self.violation = None
+        self.support = 0
+
+    @staticmethod
+    def _better(counter, candidate, current):
+        # Ties go to the smaller value, matching pandas Series.mode().iloc[0]
+        if current is None:
+            return True
+        return (counter[candidate], current) > (counter[current], candidate)
+
+    def add(self, outcome, violation, count):
+        self.support += count
+        if outcome is not None:
+            self.outcomes[outcome] += count
+            if self._better(self.outcomes, outcome, self.outcome):
+                self.outcome = outcome
+        if violation is not None:
+            self.violations[violation] += count
+            if self._better(self.violations, violation, self.violation):
+                self.violation = violation
+
+
+class PredictionIndex:
+    """Hash index from form keys to modal stop outcome and violation, with backoff."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._log_id_gaps = LogIdGaps()
+        self._levels = [{} for _ in BACKOFF_LEVELS]
+        self.high_water_mark = 0
+        self.rows_indexed = 0
+
+    @staticmethod
+    def _prepare(frame):
+        """Coerces the flags and age once, at index time, instead of on every submit."""
+        frame = frame.copy()
+        for column in ('search_conducted', 'drugs_related_stop', 'driver_age'):
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype('Int64')
+        frame['age_band'] = frame['driver_age'] // AGE_BAND_WIDTH
+        return frame
+
+    def add_rows(self, frame):
+        """Folds a batch of stops into every backoff level."""
+        if frame.empty:
+            return
+        frame = self._prepare(frame)
+        with self._lock:
+            for level, (_, columns) in zip(self._levels, BACKOFF_LEVELS):
+                # Count each (key, outcome, violation) once per batch with a vectorized groupby;
+                # observed=True keeps categorical keys from expanding into every combination
+                counts = frame.groupby(columns + ['stop_outcome', 'violation'], dropna=False, observed=True).size()
+                for group, count in counts.items():
+                    group = group if isinstance(group, tuple) else (group,)
+                    key = tuple(None if pd.isna(value) else value for value in group[:len(columns)])
+                    outcome, violation = (None if pd.isna(value) else value for value in group[len(columns):])
+                    entry = level.get(key)
+                    if entry is None:
+                        entry = level[key] = _Entry()
+                    entry.add(outcome, violation, int(count))
+            self.rows_indexed += len(frame)
+
+    def lookup(self, driver_gender, driver_age, driver_race, search_conducted, drugs_related_stop, stop_duration):
+        """Returns (outcome, violation, support, level name) from the finest key with history."""
+        values = {
+            'driver_gender': driver_gender,
+            'driver_age': int(driver_age),
+            'age_band': int(driver_age) // AGE_BAND_WIDTH,
+            'driver_race': driver_race,
+            'search_conducted': int(search_conducted),
+            'drugs_related_stop': int(drugs_related_stop),
+            'stop_duration': stop_duration,
+        }
+        for level, (name, columns) in zip(self._levels, BACKOFF_LEVELS):
+            entry = level.get(tuple(values[column] for column in columns))
+            if entry is not None and entry.outcome is not None and entry.violation is not None:
+                return entry.outcome, entry.violation, entry.support, name
+        return None
+
+    def lookup_form(self, driver_gender, driver_age, driver_race, search_conducted, drugs_related_stop, stop_duration):
+        """lookup() for the prediction form's labels ("Male", "0-15 Minutes", ...)."""
+        return self.lookup(FORM_GENDERS[driver_gender], driver_age, driver_race,
+                           search_conducted, drugs_related_stop, FORM_DURATIONS[stop_duration])
+
+    def seed(self, frame):
+        """Indexes a local snapshot of the table so the first sync only fetches newer stops."""
+        if frame.empty or 'log_id' not in frame.columns:
+            return
+        with self._sync_lock:
+            self.add_rows(frame[['log_id'] + KEY_COLUMNS + ['stop_outcome', 'violation']])
+            self.high_water_mark = max(self.high_water_mark, int(frame['log_id'].max()))
+
+    def sync(self):
+        """Indexes stops logged since the last sync. Returns the number of new rows."""
+        require_columns('log_id')
+        columns = ", ".join(KEY_COLUMNS + ['stop_outcome', 'violation'])
+        # One sync at a time, so two sessions never fold the same rows in twice
+        with self._sync_lock:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT log_id, {columns} FROM policelog_data WHERE log_id > %s ORDER BY log_id",
+                    (self.high_water_mark,),
+                )
+                new_rows = pd.DataFrame(cursor.fetchall())
+            if new_rows.empty:
+                return 0
+            new_rows.columns = new_rows.columns.str.lower()
+            # Rows above a log_id gap that may still commit are read again on the next sync
+            mark = self._log_id_gaps.safe_mark(self.high_water_mark, new_rows['log_id'])
+            new_rows = new_rows[new_rows['log_id'].astype('int64') <= mark]
+            if not new_rows.empty:
+                self.add_rows(optimize_frame(new_rows))
+            self.high_water_mark = mark
+            return len(new_rows)
@@ -0,0 +1,409 @@
+"""SQL for the "In-Depth Data Analysis" section, shared by the dashboard and the command-line tools."""
+import re
+from datetime import timedelta
+
+from codes import DURATION_LABELS
+
+query_options = [
+    "Top 10 vehicle_Number involved in drug-related stops",
+    "Most frequently searched vehicles",
+    "Driver age group with highest arrest rate",
+    "Gender distribution of drivers stopped in each country",
+    "Race and Gender combination with highest search rate",
+    "Time of day with the most traffic stops",
+    "The average stop duration for different violations",
+    "Are stops during the night more likely to lead to arrests",
+    "violations are most associated with searches or arrests",
+    "violations,which are most common among younger drivers (<25)",
+    "What is the arrest rate by country and violation",
+    "Which country has the most stops with search conducted",
+    "Yearly Breakdown of Stops and Arrests by Country",
+    "Driver Violation Trends Based on Age and Race",
+    "Time Period Analysis of Stops , Number of Stops by Year,Month, Hour of the Day",
+    "Violations with High Search and Arrest Rates",
+    "Driver Demographics by Country (Age, Gender, and Race)",
+    "Top 5 Violations with Highest Arrest Rates"
+]
+
+# FIX: Updated SQL queries to use MySQL syntax (TRUE/1, YEAR(), HOUR(), etc.)
+query_map = {
+    "Top 10 vehicle_Number involved in drug-related stops":
+    """SELECT 
+    vehicle_number,
+    COUNT(*) AS total_drug_related_stops
+FROM 
+    policelog_data
+WHERE 
+    drugs_related_stop = TRUE
+GROUP BY 
+    vehicle_number
+ORDER BY 
+    total_drug_related_stops DESC
+LIMIT 10""", 
+    
+    "Most frequently searched vehicles":
+    """SELECT 
+    vehicle_number,
+    COUNT(*) AS total_searches
+FROM 
+    policelog_data
+WHERE 
+    search_conducted = TRUE
+GROUP BY 
+    vehicle_number
+ORDER BY 
+    total_searches DESC
+LIMIT 10""",
+    
+    "Driver age group with highest arrest rate":
+    """SELECT 
+    driver_age,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
+FROM 
+    policelog_data
+WHERE driver_age IS NOT NULL AND driver_age > 0
+GROUP BY 
+    driver_age
+HAVING COUNT(*) > 50 
+ORDER BY 
+    arrest_rate_percentage DESC
+LIMIT 10""",
+    
+    "Gender distribution of drivers stopped in each country":
+    """SELECT 
+    country_name,
+    driver_gender,
+    COUNT(*) AS total_stops,
+    ROUND(
+        COUNT(*) * 100.0 / 
+        SUM(COUNT(*)) OVER (PARTITION BY country_name),
+        2
+    ) AS percentage_of_stops
+FROM 
+    policelog_data
+WHERE country_name IS NOT NULL
+GROUP BY 
+    country_name, driver_gender
+ORDER BY 
+    country_name, total_stops DESC""",
+    
+    "Race and Gender combination with highest search rate":
+    """SELECT 
+    driver_race,
+    driver_gender,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
+    ROUND(
+        SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 
+        2
+    ) AS search_rate_percentage
+FROM 
+    policelog_data
+WHERE driver_race IS NOT NULL AND driver_gender IS NOT NULL
+GROUP BY 
+    driver_race, driver_gender
+HAVING COUNT(*) > 100
+ORDER BY 
+    search_rate_percentage DESC
+LIMIT 10""",
+    
+    "Time of day with the most traffic stops":
+    """SELECT 
+    HOUR(stop_time) AS hour_of_day,
+    COUNT(*) AS total_stops
+FROM 
+    policelog_data
+WHERE stop_time IS NOT NULL
+GROUP BY 
+    HOUR(stop_time)
+ORDER BY 
+    total_stops DESC""",
+    
+    "The average stop duration for different violations":
+    """SELECT
+    violation,
+    ROUND(AVG(stop_duration), 2) AS avg_stop_duration
+FROM 
+    policelog_data
+WHERE 
+    stop_duration IS NOT NULL
+GROUP BY 
+    violation
+ORDER BY 
+    avg_stop_duration DESC""",
+    
+    "Are stops during the night more likely to lead to arrests": 
+    """SELECT 
+    CASE
+        WHEN HOUR(stop_time) BETWEEN 6 AND 17 THEN 'Day (6AM-5PM)'
+        ELSE 'Night (6PM-5AM)'
+    END AS time_of_day,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+    ROUND(
+        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100,
+        2
+    ) AS arrest_rate_percentage
+FROM 
+    policelog_data
+WHERE stop_time IS NOT NULL
+GROUP BY 
+    time_of_day
+ORDER BY 
+    arrest_rate_percentage DESC""",
+    
+    "violations are most associated with searches or arrests":
+    """SELECT 
+    violation,
+    COUNT(*) AS total_stops,
+    
+    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
+    ROUND(SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS search_rate_percentage,
+    
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
+
+FROM 
+    policelog_data
+WHERE violation IS NOT NULL
+GROUP BY 
+    violation
+HAVING COUNT(*) > 100
+ORDER BY 
+    search_rate_percentage DESC, arrest_rate_percentage DESC
+LIMIT 10""",
+    
+    "violations,which are most common among younger drivers (<25)":
+    """SELECT 
+    violation,
+    COUNT(*) AS total_stops
+FROM 
+    policelog_data
+WHERE 
+    driver_age < 25 AND driver_age IS NOT NULL
+GROUP BY 
+    violation
+ORDER BY 
+    total_stops DESC
+LIMIT 10""",
+    
+    "What is the arrest rate by country and violation":
+    """SELECT 
+    country_name,
+    violation,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+    ROUND(
+        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100,
+        2
+    ) AS arrest_rate_percentage
+FROM 
+    policelog_data
+WHERE country_name IS NOT NULL AND violation IS NOT NULL
+GROUP BY 
+    country_name, violation
+HAVING total_stops > 50
+ORDER BY 
+    arrest_rate_percentage DESC,
+    total_arrests DESC
+LIMIT 20""",
+    
+    "Which country has the most stops with search conducted":
+    """SELECT 
+    country_name,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches
+FROM 
+    policelog_data
+WHERE country_name IS NOT NULL
+GROUP BY 
+    country_name
+ORDER BY 
+    total_searches DESC
+LIMIT 1""",
+    
+    "Yearly Breakdown of Stops and Arrests by Country":
+    """SELECT
+    country_name,
+    year,
+    total_stops,
+    total_arrests,
+    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage,
+    SUM(total_stops) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_stops,
+    SUM(total_arrests) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_arrests
+FROM (
+    SELECT 
+        country_name,
+        YEAR(stop_date) AS year,
+        COUNT(*) AS total_stops,
+        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
+    FROM 
+        policelog_data
+    WHERE stop_date IS NOT NULL AND country_name IS NOT NULL
+    GROUP BY 
+        country_name, YEAR(stop_date)
+) AS yearly_summary
+ORDER BY 
+    country_name, year""",
+    
+    "Driver Violation Trends Based on Age and Race":
+    """SELECT
+    v.driver_race,
+    v.violation,
+    v.avg_driver_age,
+    v.total_stops,
+    ROUND(v.percent_of_race, 2) AS percent_of_race
+FROM (
+    SELECT
+        driver_race,
+        violation,
+        ROUND(AVG(driver_age), 1) AS avg_driver_age,
+        COUNT(*) AS total_stops,
+        COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY driver_race) AS percent_of_race
+    FROM 
+        policelog_data
+    WHERE 
+        driver_age IS NOT NULL 
+        AND violation IS NOT NULL 
+        AND driver_race IS NOT NULL
+    GROUP BY 
+        driver_race, violation
+) AS v
+ORDER BY 
+    v.driver_race, v.percent_of_race DESC""",
+    
+    "Time Period Analysis of Stops , Number of Stops by Year,Month, Hour of the Day":
+    """SELECT 
+    YEAR(stop_date) AS year,
+    MONTH(stop_date) AS month,
+    HOUR(stop_time) AS hour_of_day,
+    COUNT(*) AS total_stops
+FROM 
+    policelog_data
+WHERE stop_date IS NOT NULL AND stop_time IS NOT NULL
+GROUP BY 
+    YEAR(stop_date), MONTH(stop_date), HOUR(stop_time)
+ORDER BY 
+    year, month, hour_of_day""",
+    
+    "Violations with High Search and Arrest Rates":
+    """SELECT
+    violation,
+    total_stops,
+    total_searches,
+    total_arrests,
+    ROUND((CAST(total_searches AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS search_rate_percentage,
+    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage
+FROM (
+    SELECT 
+        violation,
+        COUNT(*) AS total_stops,
+        SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS total_searches,
+        SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests
+    FROM 
+        policelog_data
+    WHERE violation IS NOT NULL
+    GROUP BY 
+        violation
+    HAVING total_stops > 100
+) AS violation_summary
+ORDER BY 
+    search_rate_percentage DESC
+LIMIT 10""",
+    
+    "Driver Demographics by Country (Age, Gender, and Race)":
+    """SELECT
+    country_name,
+    ROUND(AVG(driver_age), 1) AS avg_driver_age,
+    driver_gender,
+    driver_race,
+    COUNT(*) AS total_stops,
+    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY country_name), 2) AS percent_of_country
+FROM 
+    policelog_data
+WHERE country_name IS NOT NULL AND driver_gender IS NOT NULL AND driver_race IS NOT NULL
+GROUP BY 
+    country_name, driver_gender, driver_race
+HAVING total_stops > 10
+ORDER BY 
+    country_name, total_stops DESC""",
+    
+    "Top 5 Violations with Highest Arrest Rates":
+    """SELECT
+    violation,
+    COUNT(*) AS total_stops,
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS total_arrests,
+    ROUND(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) / COUNT(*) * 100, 2) AS arrest_rate_percentage
+FROM 
+    policelog_data
+WHERE violation IS NOT NULL
+GROUP BY 
+    violation
+HAVING 
+    COUNT(*) > 50
+ORDER BY 
+    arrest_rate_percentage DESC
+LIMIT 5"""
+}
+
+
+# After `python migrate.py`, policelog_data has stored generated stop_hour, stop_year and
+# stop_month columns with composite indexes. These rewrites group and filter on the plain
+# columns, which the indexes can serve, instead of wrapping stop_time/stop_date in functions.
+GENERATED_COLUMN_REWRITES = [
+    ("HOUR(stop_time)", "stop_hour"),
+    ("YEAR(stop_date)", "stop_year"),
+    ("MONTH(stop_date)", "stop_month"),
+    # The generated columns are NULL exactly when their source is NULL
+    ("stop_time IS NOT NULL", "stop_hour IS NOT NULL"),
+    ("stop_date IS NOT NULL", "stop_year IS NOT NULL"),
+]
+
+
+def use_generated_columns(sql):
+    """Rewrites a query_map query to use the generated time columns."""
+    for expression, column in GENERATED_COLUMN_REWRITES:
+        sql = sql.replace(expression, column)
+    return sql
+
+
+indexed_query_map = {title: use_generated_columns(sql) for title, sql in query_map.items()}
+
+
+# After `python codes.py --backfill`, filters compare the TINYINT code columns instead of text.
+# MySQL averages stop_duration text by its leading number ('16-30 Min' -> 16), so each duration
+# code stands for the leading number of its label and the averages do not change.
+DURATION_MINUTES = {code: int(re.match(r'\d+', label).group()) for code, label in DURATION_LABELS.items()}
+CODE_COLUMN_REWRITES = [
+    ("AVG(stop_duration)",
+     "AVG(CASE duration_code " + " ".join(f"WHEN {code} THEN {minutes}" for code, minutes in DURATION_MINUTES.items())
+     + " END)"),
+    ("stop_duration IS NOT NULL", "duration_code IS NOT NULL"),
+]
+
+
+def use_code_columns(sql):
+    """Rewrites a query_map (or indexed_query_map) query to compare the code columns."""
+    for expression, replacement in CODE_COLUMN_REWRITES:
+        sql = sql.replace(expression, replacement)
+    return sql
+
+
+# Every read of the table is a `FROM policelog_data`, optionally followed by a WHERE whose top-level
+# conditions are joined with AND, so a date window can be pushed into each of them with one rewrite.
+TABLE_READ = re.compile(r'(FROM\s+policelog_data\b)(\s+WHERE\b)?')
+
+
+def filter_stop_dates(sql, date_range):
+    """Restricts every read of policelog_data in `sql` to `date_range` = (first, last) stop dates, inclusive.
+
+    The bounds are plain stop_date comparisons, so MySQL prunes to the matching partitions
+    (partitions.py). With no range the query is returned unchanged.
+    """
+    if date_range is None:
+        return sql
+    first, last = date_range
+    predicate = f"stop_date >= '{first.isoformat()}' AND stop_date < '{(last + timedelta(days=1)).isoformat()}'"
+    return TABLE_READ.sub(lambda match: f"{match.group(1)}\nWHERE {predicate}" + (" AND" if match.group(2) else ""), sql)
@@ -0,0 +1,178 @@
+"""Version-aware query result cache shared by every dashboard session.
+
+Results are keyed on (query text, table data version) instead of living for a
+fixed hour. The version comes from the active backend (backends.py): on MySQL it
+is MAX(log_id) and MAX(updated_at) of policelog_data, both index lookups, plus
+the delete counter in policelog_version (added by migrate.py), so a new, edited
+or deleted stop invalidates cached results on the next version check and nothing
+expires all at once.
+
+- Single-flight: concurrent misses on the same key wait for one loader.
+- LRU eviction keeps the cached DataFrames under a byte budget.
+- stats() reports hits, misses, coalesced waits, evictions and invalidations.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from backends import backend
+
+
+class _Flight:
+    """A load in progress that other sessions can wait on."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class VersionedResultCache:
+    """LRU cache of query results, invalidated when the table version changes."""
+
+    def __init__(self, version_fn=backend.version, max_bytes=256 * 1024 * 1024, version_ttl=1.0):
+        self.version_fn = version_fn
+        self.max_bytes = max_bytes
+        # Reruns within this many seconds share one version check
+        self.version_ttl = version_ttl
+
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._entries = OrderedDict()   # (query, version) -> (DataFrame, size in bytes)
+        self._inflight = {}             # (query, version) -> _Flight
+        self._bytes = 0
+        self._version = None
+        self._version_checked_at = 0.0
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'invalidations': 0,
+                       'version_check_failures': 0, 'carried_forward': 0}
+
+    def current_version(self):
+        """Returns the table version, re-reading it at most once per `version_ttl` seconds."""
+        with self._version_lock:
+            if time.monotonic() - self._version_checked_at < self.version_ttl and self._version is not None:
+                return self._version
+            try:
+                version = self.version_fn()
+            except Exception as e:
+                # Keep serving cached results under the last known version while the backend is unreachable
+                if self._version is None:
+                    raise
+                with self._lock:
+                    self._stats['version_check_failures'] += 1
+                print(f"Table Version Check Error: {e}")
+                return self._version
+            self._version_checked_at = time.monotonic()
+            if version != self._version:
+                self._invalidate_except(version)
+                self._version = version
+            return version
+
+    def _invalidate_except(self, version):
+        with self._lock:
+            stale = [key for key in self._entries if key[1] != version]
+            for key in stale:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
+            self._stats['invalidations'] += len(stale)
+
+    def _store(self, key, result):
+        size = int(result.memory_usage(deep=True).sum())
+        with self._lock:
+            # advance() can store a key another request already filled
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def get(self, query, loader):
+        """Returns the cached result for `query`, calling `loader(query)` once on a miss."""
+        return self.get_with_status(query, loader)[0]
+
+    def get_with_status(self, query, loader):
+        """Like get(), but returns (result, 'hit' | 'miss' | 'coalesced') for instrumentation."""
+        key = (query, self.current_version())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0].copy(deep=False), 'hit'
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.copy(deep=False), 'coalesced'
+
+        try:
+            flight.result = loader(query)
+            self._store(key, flight.result)
+            return flight.result.copy(deep=False), 'miss'
+        except Exception as e:
+            # Errors are not cached; the waiting sessions see the same error
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def advance(self, old_version, new_version, updates):
+        """Moves the cache from `old_version` to `new_version`, carrying the cached results of the
+        queries in `updates` ({query: function(result) -> result}) forward instead of recomputing them.
+
+        Used when the caller knows exactly what changed between the versions. Returns False and
+        changes nothing when the cache is not at `old_version`; the next lookup then invalidates as usual.
+        """
+        with self._version_lock:
+            if self._version != old_version:
+                return False
+            with self._lock:
+                carried = {query: self._entries[(query, old_version)][0] for query in updates
+                           if (query, old_version) in self._entries}
+            carried = {query: updates[query](result) for query, result in carried.items()}
+            self._invalidate_except(new_version)
+            for query, result in carried.items():
+                self._store((query, new_version), result)
+            self._version = new_version
+            self._version_checked_at = time.monotonic()
+            with self._lock:
+                self._stats['carried_forward'] += len(carried)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns a snapshot of cache counters for monitoring."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            snapshot['bytes'] = self._bytes
+            snapshot['max_bytes'] = self.max_bytes
+        lookups = snapshot['hits'] + snapshot['misses'] + snapshot['coalesced']
+        snapshot['hit_rate_percentage'] = round((snapshot['hits'] + snapshot['coalesced']) / lookups * 100, 2) if lookups else 0.0
+        snapshot['version'] = str(self._version)
+        return snapshot
+
+
+# Module-level cache, shared by every session in the process like the connection pool in db.py.
+result_cache = VersionedResultCache()
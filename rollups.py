@@ -0,0 +1,563 @@
+"""Pre-aggregated rollup tables for the "In-Depth Data Analysis" queries.
+
+Every query in the dashboard's query_map groups policelog_data by a handful of
+dimensions. The rollups below keep those groups pre-summed, so the analysis
+queries read a few thousand rollup rows instead of scanning every stop:
+
+- rollup_demographics: country, violation, age, race, gender, stop duration
+- rollup_time: country, year, month, hour
+- rollup_vehicle: vehicle_number, only for drug-related or searched stops
+
+Refreshes are incremental. policelog_data has an AUTO_INCREMENT `log_id` (added by
+`python migrate.py`), and rollup_state stores the highest log_id already folded in
+(the high-water mark). Each refresh only aggregates rows above that mark and adds
+them onto the existing rollup rows. The mark stops short of a recent gap in log_id,
+since ids are allocated before their transaction commits (db.LogIdGaps). The
+ledger is append-only; if old rows are edited or deleted, run
+`python rollups.py --rebuild`.
+
+The dashboard never refreshes on the click that runs a query: the INSERT ... SELECT
+statements take next-key locks on policelog_data. RollupRefresher refreshes on a
+background thread at most once per interval, and rollup_query() tags each query
+with the mark its rollups are current to, so a cached answer is never reused once
+the rollups have moved past it.
+
+Run `python rollups.py` from cron to keep the rollups warm between dashboard visits.
+"""
+import argparse
+import threading
+import time
+
+from db import LogIdGaps, get_db_cursor, require_columns
+
+# Rows with NULL dimensions still need a unique key for ON DUPLICATE KEY UPDATE,
+# so every rollup row is keyed by an MD5 of its dimensions with NULLs spelled out.
+NULL_MARKER = "'<null>'"
+
+
+def _dim_key(columns):
+    parts = ", ".join(f"IFNULL({column}, {NULL_MARKER})" for column in columns)
+    return f"MD5(CONCAT_WS('|', {parts}))"
+
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup_name VARCHAR(50) PRIMARY KEY,
+    high_water_mark BIGINT NOT NULL DEFAULT 0,
+    refreshed_at DATETIME
+)""",
+    """CREATE TABLE IF NOT EXISTS rollup_demographics (
+    dim_key CHAR(32) PRIMARY KEY,
+    country_name VARCHAR(50),
+    violation VARCHAR(50),
+    driver_age INT,
+    driver_race VARCHAR(50),
+    driver_gender VARCHAR(10),
+    stop_duration VARCHAR(50),
+    total_stops BIGINT NOT NULL,
+    total_arrests BIGINT NOT NULL,
+    total_searches BIGINT NOT NULL,
+    total_drug_related BIGINT NOT NULL
+)""",
+    """CREATE TABLE IF NOT EXISTS rollup_time (
+    dim_key CHAR(32) PRIMARY KEY,
+    country_name VARCHAR(50),
+    stop_year SMALLINT,
+    stop_month TINYINT,
+    stop_hour TINYINT,
+    total_stops BIGINT NOT NULL,
+    total_arrests BIGINT NOT NULL
+)""",
+    """CREATE TABLE IF NOT EXISTS rollup_vehicle (
+    dim_key CHAR(32) PRIMARY KEY,
+    vehicle_number VARCHAR(50),
+    total_drug_related_stops BIGINT NOT NULL,
+    total_searches BIGINT NOT NULL
+)""",
+    """INSERT IGNORE INTO rollup_state (rollup_name, high_water_mark) VALUES ('policelog_data', 0)""",
+]
+
+DEMOGRAPHIC_DIMENSIONS = ['country_name', 'violation', 'driver_age', 'driver_race', 'driver_gender', 'stop_duration']
+
+# Each statement folds the rows in (high-water mark, new mark] into its rollup.
+REFRESH_STATEMENTS = [
+    f"""INSERT INTO rollup_demographics (
+    dim_key, country_name, violation, driver_age, driver_race, driver_gender, stop_duration,
+    total_stops, total_arrests, total_searches, total_drug_related
+)
+SELECT
+    {_dim_key(DEMOGRAPHIC_DIMENSIONS)},
+    country_name, violation, driver_age, driver_race, driver_gender, stop_duration,
+    COUNT(*),
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END),
+    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END),
+    SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END)
+FROM
+    policelog_data
+WHERE log_id > %s AND log_id <= %s
+GROUP BY
+    country_name, violation, driver_age, driver_race, driver_gender, stop_duration
+ON DUPLICATE KEY UPDATE
+    total_stops = total_stops + VALUES(total_stops),
+    total_arrests = total_arrests + VALUES(total_arrests),
+    total_searches = total_searches + VALUES(total_searches),
+    total_drug_related = total_drug_related + VALUES(total_drug_related)""",
+
+    f"""INSERT INTO rollup_time (
+    dim_key, country_name, stop_year, stop_month, stop_hour, total_stops, total_arrests
+)
+SELECT
+    {_dim_key(['country_name', 'YEAR(stop_date)', 'MONTH(stop_date)', 'HOUR(stop_time)'])},
+    country_name, YEAR(stop_date), MONTH(stop_date), HOUR(stop_time),
+    COUNT(*),
+    SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END)
+FROM
+    policelog_data
+WHERE log_id > %s AND log_id <= %s
+GROUP BY
+    country_name, YEAR(stop_date), MONTH(stop_date), HOUR(stop_time)
+ON DUPLICATE KEY UPDATE
+    total_stops = total_stops + VALUES(total_stops),
+    total_arrests = total_arrests + VALUES(total_arrests)""",
+
+    f"""INSERT INTO rollup_vehicle (
+    dim_key, vehicle_number, total_drug_related_stops, total_searches
+)
+SELECT
+    {_dim_key(['vehicle_number'])},
+    vehicle_number,
+    SUM(CASE WHEN drugs_related_stop = TRUE THEN 1 ELSE 0 END),
+    SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END)
+FROM
+    policelog_data
+WHERE log_id > %s AND log_id <= %s
+    AND (drugs_related_stop = TRUE OR search_conducted = TRUE)
+GROUP BY
+    vehicle_number
+ON DUPLICATE KEY UPDATE
+    total_drug_related_stops = total_drug_related_stops + VALUES(total_drug_related_stops),
+    total_searches = total_searches + VALUES(total_searches)""",
+]
+
+# Same titles and result columns as the dashboard's query_map, answered from the rollups.
+ROLLUP_QUERY_MAP = {
+    "Top 10 vehicle_Number involved in drug-related stops":
+    """SELECT
+    vehicle_number,
+    total_drug_related_stops
+FROM
+    rollup_vehicle
+WHERE
+    total_drug_related_stops > 0
+ORDER BY
+    total_drug_related_stops DESC
+LIMIT 10""",
+
+    "Most frequently searched vehicles":
+    """SELECT
+    vehicle_number,
+    total_searches
+FROM
+    rollup_vehicle
+WHERE
+    total_searches > 0
+ORDER BY
+    total_searches DESC
+LIMIT 10""",
+
+    "Driver age group with highest arrest rate":
+    """SELECT
+    driver_age,
+    SUM(total_stops) AS total_stops,
+    SUM(total_arrests) AS total_arrests,
+    ROUND(SUM(total_arrests) / SUM(total_stops) * 100, 2) AS arrest_rate_percentage
+FROM
+    rollup_demographics
+WHERE driver_age IS NOT NULL AND driver_age > 0
+GROUP BY
+    driver_age
+HAVING SUM(total_stops) > 50
+ORDER BY
+    arrest_rate_percentage DESC
+LIMIT 10""",
+
+    "Gender distribution of drivers stopped in each country":
+    """SELECT
+    country_name,
+    driver_gender,
+    SUM(total_stops) AS total_stops,
+    ROUND(
+        SUM(total_stops) * 100.0 /
+        SUM(SUM(total_stops)) OVER (PARTITION BY country_name),
+        2
+    ) AS percentage_of_stops
+FROM
+    rollup_demographics
+WHERE country_name IS NOT NULL
+GROUP BY
+    country_name, driver_gender
+ORDER BY
+    country_name, total_stops DESC""",
+
+    "Race and Gender combination with highest search rate":
+    """SELECT
+    driver_race,
+    driver_gender,
+    SUM(total_stops) AS total_stops,
+    SUM(total_searches) AS total_searches,
+    ROUND(SUM(total_searches) / SUM(total_stops) * 100, 2) AS search_rate_percentage
+FROM
+    rollup_demographics
+WHERE driver_race IS NOT NULL AND driver_gender IS NOT NULL
+GROUP BY
+    driver_race, driver_gender
+HAVING SUM(total_stops) > 100
+ORDER BY
+    search_rate_percentage DESC
+LIMIT 10""",
+
+    "Time of day with the most traffic stops":
+    """SELECT
+    stop_hour AS hour_of_day,
+    SUM(total_stops) AS total_stops
+FROM
+    rollup_time
+WHERE stop_hour IS NOT NULL
+GROUP BY
+    stop_hour
+ORDER BY
+    total_stops DESC""",
+
+    # stop_duration is a dimension here, so the weighted sum reproduces AVG(stop_duration) exactly
+    "The average stop duration for different violations":
+    """SELECT
+    violation,
+    ROUND(SUM(stop_duration * total_stops) / SUM(total_stops), 2) AS avg_stop_duration
+FROM
+    rollup_demographics
+WHERE
+    stop_duration IS NOT NULL
+GROUP BY
+    violation
+ORDER BY
+    avg_stop_duration DESC""",
+
+    "Are stops during the night more likely to lead to arrests":
+    """SELECT
+    CASE
+        WHEN stop_hour BETWEEN 6 AND 17 THEN 'Day (6AM-5PM)'
+        ELSE 'Night (6PM-5AM)'
+    END AS time_of_day,
+    SUM(total_stops) AS total_stops,
+    SUM(total_arrests) AS total_arrests,
+    ROUND(SUM(total_arrests) / SUM(total_stops) * 100, 2) AS arrest_rate_percentage
+FROM
+    rollup_time
+WHERE stop_hour IS NOT NULL
+GROUP BY
+    time_of_day
+ORDER BY
+    arrest_rate_percentage DESC""",
+
+    "violations are most associated with searches or arrests":
+    """SELECT
+    violation,
+    SUM(total_stops) AS total_stops,
+    SUM(total_searches) AS total_searches,
+    ROUND(SUM(total_searches) / SUM(total_stops) * 100, 2) AS search_rate_percentage,
+    SUM(total_arrests) AS total_arrests,
+    ROUND(SUM(total_arrests) / SUM(total_stops) * 100, 2) AS arrest_rate_percentage
+FROM
+    rollup_demographics
+WHERE violation IS NOT NULL
+GROUP BY
+    violation
+HAVING SUM(total_stops) > 100
+ORDER BY
+    search_rate_percentage DESC, arrest_rate_percentage DESC
+LIMIT 10""",
+
+    "violations,which are most common among younger drivers (<25)":
+    """SELECT
+    violation,
+    SUM(total_stops) AS total_stops
+FROM
+    rollup_demographics
+WHERE
+    driver_age < 25 AND driver_age IS NOT NULL
+GROUP BY
+    violation
+ORDER BY
+    total_stops DESC
+LIMIT 10""",
+
+    "What is the arrest rate by country and violation":
+    """SELECT
+    country_name,
+    violation,
+    SUM(total_stops) AS total_stops,
+    SUM(total_arrests) AS total_arrests,
+    ROUND(SUM(total_arrests) / SUM(total_stops) * 100, 2) AS arrest_rate_percentage
+FROM
+    rollup_demographics
+WHERE country_name IS NOT NULL AND violation IS NOT NULL
+GROUP BY
+    country_name, violation
+HAVING SUM(total_stops) > 50
+ORDER BY
+    arrest_rate_percentage DESC,
+    total_arrests DESC
+LIMIT 20""",
+
+    "Which country has the most stops with search conducted":
+    """SELECT
+    country_name,
+    SUM(total_stops) AS total_stops,
+    SUM(total_searches) AS total_searches
+FROM
+    rollup_demographics
+WHERE country_name IS NOT NULL
+GROUP BY
+    country_name
+ORDER BY
+    total_searches DESC
+LIMIT 1""",
+
+    "Yearly Breakdown of Stops and Arrests by Country":
+    """SELECT
+    country_name,
+    year,
+    total_stops,
+    total_arrests,
+    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage,
+    SUM(total_stops) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_stops,
+    SUM(total_arrests) OVER (PARTITION BY country_name ORDER BY year) AS cumulative_arrests
+FROM (
+    SELECT
+        country_name,
+        stop_year AS year,
+        SUM(total_stops) AS total_stops,
+        SUM(total_arrests) AS total_arrests
+    FROM
+        rollup_time
+    WHERE stop_year IS NOT NULL AND country_name IS NOT NULL
+    GROUP BY
+        country_name, stop_year
+) AS yearly_summary
+ORDER BY
+    country_name, year""",
+
+    "Driver Violation Trends Based on Age and Race":
+    """SELECT
+    v.driver_race,
+    v.violation,
+    v.avg_driver_age,
+    v.total_stops,
+    ROUND(v.percent_of_race, 2) AS percent_of_race
+FROM (
+    SELECT
+        driver_race,
+        violation,
+        ROUND(SUM(driver_age * total_stops) / SUM(total_stops), 1) AS avg_driver_age,
+        SUM(total_stops) AS total_stops,
+        SUM(total_stops) * 100.0 / SUM(SUM(total_stops)) OVER (PARTITION BY driver_race) AS percent_of_race
+    FROM
+        rollup_demographics
+    WHERE
+        driver_age IS NOT NULL
+        AND violation IS NOT NULL
+        AND driver_race IS NOT NULL
+    GROUP BY
+        driver_race, violation
+) AS v
+ORDER BY
+    v.driver_race, v.percent_of_race DESC""",
+
+    "Time Period Analysis of Stops , Number of Stops by Year,Month, Hour of the Day":
+    """SELECT
+    stop_year AS year,
+    stop_month AS month,
+    stop_hour AS hour_of_day,
+    SUM(total_stops) AS total_stops
+FROM
+    rollup_time
+WHERE stop_year IS NOT NULL AND stop_hour IS NOT NULL
+GROUP BY
+    stop_year, stop_month, stop_hour
+ORDER BY
+    year, month, hour_of_day""",
+
+    "Violations with High Search and Arrest Rates":
+    """SELECT
+    violation,
+    total_stops,
+    total_searches,
+    total_arrests,
+    ROUND((CAST(total_searches AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS search_rate_percentage,
+    ROUND((CAST(total_arrests AS DECIMAL(10, 2)) / total_stops) * 100, 2) AS arrest_rate_percentage
+FROM (
+    SELECT
+        violation,
+        SUM(total_stops) AS total_stops,
+        SUM(total_searches) AS total_searches,
+        SUM(total_arrests) AS total_arrests
+    FROM
+        rollup_demographics
+    WHERE violation IS NOT NULL
+    GROUP BY
+        violation
+    HAVING SUM(total_stops) > 100
+) AS violation_summary
+ORDER BY
+    search_rate_percentage DESC
+LIMIT 10""",
+
+    # AVG(driver_age) ignores NULL ages, so only stops with a known age go into the denominator
+    "Driver Demographics by Country (Age, Gender, and Race)":
+    """SELECT
+    country_name,
+    ROUND(
+        SUM(driver_age * total_stops) /
+        SUM(CASE WHEN driver_age IS NOT NULL THEN total_stops END),
+        1
+    ) AS avg_driver_age,
+    driver_gender,
+    driver_race,
+    SUM(total_stops) AS total_stops,
+    ROUND(SUM(total_stops) * 100.0 / SUM(SUM(total_stops)) OVER (PARTITION BY country_name), 2) AS percent_of_country
+FROM
+    rollup_demographics
+WHERE country_name IS NOT NULL AND driver_gender IS NOT NULL AND driver_race IS NOT NULL
+GROUP BY
+    country_name, driver_gender, driver_race
+HAVING SUM(total_stops) > 10
+ORDER BY
+    country_name, total_stops DESC""",
+
+    "Top 5 Violations with Highest Arrest Rates":
+    """SELECT
+    violation,
+    SUM(total_stops) AS total_stops,
+    SUM(total_arrests) AS total_arrests,
+    ROUND(SUM(total_arrests) / SUM(total_stops) * 100, 2) AS arrest_rate_percentage
+FROM
+    rollup_demographics
+WHERE violation IS NOT NULL
+GROUP BY
+    violation
+HAVING
+    SUM(total_stops) > 50
+ORDER BY
+    arrest_rate_percentage DESC
+LIMIT 5""",
+}
+
+_schema_ready = False
+# Refreshes stop short of a log_id gap from a transaction that has not committed yet
+_log_id_gaps = LogIdGaps()
+
+
+def ensure_rollup_schema():
+    """Creates the rollup tables; policelog_data needs its log_id column (`python migrate.py`)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    require_columns('log_id')
+    with get_db_cursor() as cursor:
+        for statement in SCHEMA_STATEMENTS:
+            cursor.execute(statement)
+    _schema_ready = True
+
+
+def rollup_query(title, mark):
+    """Returns the rollup query for `title`, tagged with the log_id mark the rollups are current to.
+
+    Results are cached per query text and table version; the version already counts rows the
+    refresh held back at a log_id gap, so the mark has to be part of the cache key as well.
+    """
+    return f"{ROLLUP_QUERY_MAP[title]}\n/* rollups through log_id {mark} */"
+
+
+def refresh_rollups():
+    """Folds rows above the high-water mark into the rollups. Returns the number of new rows."""
+    high_water_mark, new_mark = _refresh()
+    return new_mark - high_water_mark
+
+
+def _refresh():
+    """Refreshes the rollups and returns (old mark, new mark)."""
+    ensure_rollup_schema()
+    with get_db_cursor() as cursor:
+        connection = cursor.connection
+        connection.begin()
+        try:
+            # Lock the state row so concurrent refreshes never fold the same rows twice
+            cursor.execute(
+                "SELECT high_water_mark FROM rollup_state WHERE rollup_name = 'policelog_data' FOR UPDATE"
+            )
+            high_water_mark = cursor.fetchone()['high_water_mark']
+            new_mark = _log_id_gaps.read_mark(cursor, high_water_mark)
+
+            if new_mark > high_water_mark:
+                for statement in REFRESH_STATEMENTS:
+                    cursor.execute(statement, (high_water_mark, new_mark))
+                cursor.execute(
+                    "UPDATE rollup_state SET high_water_mark = %s, refreshed_at = NOW() "
+                    "WHERE rollup_name = 'policelog_data'",
+                    (new_mark,),
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return high_water_mark, new_mark
+
+
+class RollupRefresher:
+    """Refreshes the rollups on a daemon thread, at most once per `interval` seconds of use."""
+
+    def __init__(self, interval=30):
+        self.interval = interval
+        self.mark = None
+        self.last_error = None
+        self._requested_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        """Starts a refresh when the last one is `interval` seconds old. Returns the log_id mark the
+        rollups are current to, or None until the first refresh has finished."""
+        with self._lock:
+            due = self._requested_at is None or time.monotonic() - self._requested_at >= self.interval
+            if due and (self._thread is None or not self._thread.is_alive()):
+                self._requested_at = time.monotonic()
+                self._thread = threading.Thread(target=self._run, name='rollup-refresh', daemon=True)
+                self._thread.start()
+        return self.mark
+
+    def _run(self):
+        try:
+            self.mark = _refresh()[1]
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Rollup Refresh Error: {e}")
+
+
+def rebuild_rollups():
+    """Empties the rollups and re-aggregates the whole table from log_id 0."""
+    ensure_rollup_schema()
+    with get_db_cursor() as cursor:
+        for table in ('rollup_demographics', 'rollup_time', 'rollup_vehicle'):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("UPDATE rollup_state SET high_water_mark = 0 WHERE rollup_name = 'policelog_data'")
+    return refresh_rollups()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refresh the Securecheck analysis rollup tables.")
+    parser.add_argument('--rebuild', action='store_true', help="re-aggregate the whole table from scratch")
+    args = parser.parse_args()
+
+    new_rows = rebuild_rollups() if args.rebuild else refresh_rollups()
+    print(f"Rollups refreshed: {new_rows} new row(s) folded in.")
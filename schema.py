@@ -0,0 +1,100 @@
+"""Schema-aware typing for frames read from policelog_data.
+
+pymysql returns every value as a Python object, so a plain DataFrame of the table
+stores each string, flag and age as a separate boxed object. optimize_frame applies
+compact dtypes by column name:
+
+- low-cardinality text (country, gender, race, violation, outcome, ...) -> category
+- 0/1 flags -> nullable boolean
+- ages, ids and the canonical codes (codes.py) -> the smallest nullable integer that fits
+- stop_date and updated_at -> datetime64, stop_time -> timedelta64 (MySQL TIME comes back as timedelta)
+
+Columns not listed in the schema (aggregates, aliases) are left untouched, so the
+same function is safe to apply to any query result. Columns that already have their
+compact dtype (e.g. read back from the Arrow snapshot) are kept as they are, without
+a copy.
+
+Run `python schema.py` to print the memory saved on the live table.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = [
+    'country_name', 'driver_gender', 'driver_race', 'violation_raw', 'violation',
+    'search_type', 'stop_outcome', 'stop_duration',
+]
+BOOLEAN_COLUMNS = ['search_conducted', 'is_arrested', 'drugs_related_stop']
+INTEGER_COLUMNS = ['driver_age_raw', 'driver_age', 'log_id', 'gender_code', 'violation_code', 'outcome_code', 'duration_code']
+
+INTEGER_DTYPES = ['UInt8', 'Int8', 'UInt16', 'Int16', 'UInt32', 'Int32', 'Int64']
+
+
+def _smallest_integer(series):
+    numbers = pd.to_numeric(series, errors='coerce')
+    if numbers.notna().any():
+        low, high = numbers.min(), numbers.max()
+        for dtype in INTEGER_DTYPES:
+            limits = np.iinfo(dtype.lower())
+            if limits.min <= low and high <= limits.max:
+                return numbers.round().astype(dtype)
+    return numbers.round().astype('Int64')
+
+
+def _to_boolean(series):
+    numbers = pd.to_numeric(series, errors='coerce')
+    return numbers.map({1: True, 0: False}, na_action='ignore').astype('boolean')
+
+
+def optimize_frame(df):
+    """Returns a copy of `df` with compact dtypes applied to the known policelog_data columns."""
+    if df.empty:
+        return df
+    # Columns are replaced, never written in place, so a shallow copy leaves `df` unchanged
+    df = df.copy(deep=False)
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in CATEGORY_COLUMNS and not isinstance(dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+        elif column in BOOLEAN_COLUMNS and dtype != 'boolean':
+            df[column] = _to_boolean(df[column])
+        elif column in INTEGER_COLUMNS and not (pd.api.types.is_extension_array_dtype(dtype)
+                                                 and pd.api.types.is_integer_dtype(dtype)):
+            df[column] = _smallest_integer(df[column])
+        elif column in ('stop_date', 'updated_at') and not pd.api.types.is_datetime64_dtype(dtype):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        elif column == 'stop_time' and not pd.api.types.is_timedelta64_dtype(dtype):
+            df[column] = pd.to_timedelta(df[column].astype('string'), errors='coerce')
+    return df
+
+
+def memory_report(before, after):
+    """Compares deep memory usage of the untyped and typed frames, overall and per column."""
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    total_before, total_after = int(before_bytes.sum()), int(after_bytes.sum())
+    return {
+        'rows': len(after),
+        'bytes_before': total_before,
+        'bytes_after': total_after,
+        'reduction_percentage': round((1 - total_after / total_before) * 100, 2) if total_before else 0.0,
+        'columns': pd.DataFrame({
+            'dtype': after.dtypes.astype(str),
+            'bytes_before': before_bytes,
+            'bytes_after': after_bytes,
+        }),
+    }
+
+
+if __name__ == '__main__':
+    from db import get_db_cursor
+
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT * FROM policelog_data")
+        raw = pd.DataFrame(cursor.fetchall())
+    raw.columns = raw.columns.str.lower()
+    report = memory_report(raw, optimize_frame(raw))
+    print(report['columns'].to_string())
+    print(
+        f"{report['rows']} row(s): {report['bytes_before'] / 1e6:,.1f} MB -> "
+        f"{report['bytes_after'] / 1e6:,.1f} MB ({report['reduction_percentage']}% smaller)"
+    )
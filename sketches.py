@@ -0,0 +1,351 @@
+"""Approximate analytics: fixed-size sketches and a sample, maintained as stops arrive.
+
+The dashboard's opt-in approximate mode answers some heavy analyses from these
+structures instead of scanning policelog_data. Each answer reads only the
+sketches, so it takes the same time at a thousand rows or a billion.
+
+- Distinct vehicles (overall and per country): HyperLogLog with 2^14 registers,
+  about 0.8% standard error.
+- Top drug-related and searched vehicles: count-min sketches (4 x 4096 counters)
+  plus a small candidate list of heavy hitters. An estimate is never below the
+  true count and exceeds it by at most e/4096 of all counted stops, except with
+  probability e^-4.
+- Age by race and violation, and violations of drivers under 25: a histogram with
+  one bin per year of age for each (race, violation). Ages are small integers, so
+  the histogram is a constant-size quantile sketch whose counts are exact.
+- Demographics by country: a uniform reservoir sample of 20,000 stops. Counts,
+  shares and average ages get 95% margins of error.
+
+The sketches are seeded from the local snapshot and then advanced by log_id
+high-water mark like the live metrics. Edits and deletes of existing rows are not
+seen; seed() recounts from scratch.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db import LogIdGaps, get_db_cursor, require_columns
+from schema import optimize_frame
+
+SKETCH_COLUMNS = ['vehicle_number', 'country_name', 'driver_gender', 'driver_race', 'driver_age',
+                  'violation', 'drugs_related_stop', 'search_conducted']
+SAMPLE_COLUMNS = ['country_name', 'driver_gender', 'driver_race', 'driver_age']
+
+HLL_PRECISION = 14
+CMS_WIDTH = 4096
+CMS_DEPTH = 4
+HEAVY_HITTER_CANDIDATES = 100
+SAMPLE_SIZE = 20000
+MAX_AGE = 120
+Z_95 = 1.96
+
+
+def _hash(values, key='0123456789123456'):
+    return pd.util.hash_array(np.asarray(values, dtype=object), hash_key=key, categorize=False)
+
+
+class HyperLogLog:
+    """Distinct-count sketch: 2^precision one-byte registers, mergeable by register maximum."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        hashes = _hash(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        # Rank = position of the first 1-bit in the remaining bits; they fit in a float64 exactly
+        remaining = (hashes & np.uint64((1 << (64 - self.precision)) - 1)).astype(np.float64)
+        rank = np.full(len(hashes), 64 - self.precision + 1, dtype=np.uint8)
+        nonzero = remaining > 0
+        rank[nonzero] = (64 - self.precision - np.floor(np.log2(remaining[nonzero]))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            return m * np.log(m / zeros)
+        return raw
+
+    @property
+    def relative_error(self):
+        """Standard error of the estimate, relative to the true count."""
+        return 1.04 / np.sqrt(len(self.registers))
+
+
+class CountMinSketch:
+    """Frequency sketch with a candidate list of the most frequent items."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, candidates=HEAVY_HITTER_CANDIDATES):
+        self.width = width
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.keys = [f"securecheck-cm{row:02d}" for row in range(depth)]
+        self.max_candidates = candidates
+        self.candidates = set()
+        self.total = 0
+
+    def _columns(self, values):
+        return [(_hash(values, key) % np.uint64(self.width)).astype(np.int64) for key in self.keys]
+
+    def add(self, values):
+        values = np.asarray(values, dtype=object)
+        if not len(values):
+            return
+        for row, columns in enumerate(self._columns(values)):
+            np.add.at(self.table[row], columns, 1)
+        self.total += len(values)
+        # Keep the items with the highest estimates among the old candidates and this batch
+        pool = np.array(sorted(self.candidates | set(values)), dtype=object)
+        estimates = self.estimate(pool)
+        self.candidates = set(pool[np.argsort(-estimates, kind='stable')[:self.max_candidates]])
+
+    def estimate(self, values):
+        values = np.asarray(values, dtype=object)
+        if not len(values):
+            return np.zeros(0, dtype=np.int64)
+        return np.min([self.table[row][columns] for row, columns in enumerate(self._columns(values))], axis=0)
+
+    @property
+    def overcount_bound(self):
+        """Most an estimate can exceed the true count, with probability 1 - e^-depth."""
+        return int(np.ceil(np.e / self.width * self.total))
+
+
+class ApproximateStats:
+    """Process-wide sketches and sample behind the dashboard's approximate mode."""
+
+    def __init__(self, seed=0):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._log_id_gaps = LogIdGaps()
+        self._rng = np.random.default_rng(seed)
+        self._sync_thread = None
+        self.last_sync_error = None
+        self.last_synced_at = None
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self.vehicles = HyperLogLog()
+            self.vehicles_by_country = {}
+            self.drug_vehicles = CountMinSketch()
+            self.searched_vehicles = CountMinSketch()
+            self.age_histograms = {}        # (driver_race, violation) -> stops per year of age
+            self.sample = pd.DataFrame(columns=SAMPLE_COLUMNS, dtype=object)
+            self.rows_seen = 0
+            self.high_water_mark = 0
+
+    # --- maintenance ---
+    def add_rows(self, frame):
+        """Folds a batch of stops into every sketch and the sample."""
+        if frame.empty:
+            return
+        vehicles = frame['vehicle_number'].astype(object)
+        vehicles = vehicles.where(vehicles.notna(), None)
+        has_vehicle = vehicles.notna().to_numpy()
+        flags = {column: pd.to_numeric(frame[column], errors='coerce').eq(1).fillna(False).to_numpy(dtype=bool)
+                 for column in ('drugs_related_stop', 'search_conducted')}
+        countries = frame['country_name'].astype(object).where(frame['country_name'].notna(), None)
+        ages = pd.to_numeric(frame['driver_age'], errors='coerce').round()
+        age_counts = (
+            pd.DataFrame({
+                'driver_race': frame['driver_race'].astype(object),
+                'violation': frame['violation'].astype(object),
+                'driver_age': ages.clip(0, MAX_AGE),
+            })
+            .dropna(subset=['driver_age'])
+            .groupby(['driver_race', 'violation', 'driver_age'], dropna=False)
+            .size()
+        )
+
+        with self._lock:
+            self.vehicles.add(vehicles[has_vehicle].to_numpy())
+            for country in countries.dropna().unique():
+                sketch = self.vehicles_by_country.setdefault(country, HyperLogLog())
+                sketch.add(vehicles[has_vehicle & (countries == country).to_numpy()].to_numpy())
+            self.drug_vehicles.add(vehicles[has_vehicle & flags['drugs_related_stop']].to_numpy())
+            self.searched_vehicles.add(vehicles[has_vehicle & flags['search_conducted']].to_numpy())
+            for (race, violation, age), count in age_counts.items():
+                key = (None if pd.isna(race) else race, None if pd.isna(violation) else violation)
+                histogram = self.age_histograms.setdefault(key, np.zeros(MAX_AGE + 1, dtype=np.int64))
+                histogram[int(age)] += count
+            self._sample_rows(frame[SAMPLE_COLUMNS].astype(object))
+            self.rows_seen += len(frame)
+
+    def _sample_rows(self, frame):
+        # Reservoir sampling (Algorithm R), vectorized over the batch
+        fill = max(0, min(len(frame), SAMPLE_SIZE - self.rows_seen))
+        if fill:
+            self.sample = pd.concat([self.sample, frame.iloc[:fill]], ignore_index=True)
+        rest = frame.iloc[fill:]
+        if rest.empty:
+            return
+        positions = np.arange(self.rows_seen + fill + 1, self.rows_seen + len(frame) + 1)
+        slots = (self._rng.random(len(rest)) * positions).astype(np.int64)
+        kept = np.flatnonzero(slots < SAMPLE_SIZE)
+        # When two rows of the batch draw the same slot, the later one wins, as in the sequential algorithm
+        _, last = np.unique(slots[kept][::-1], return_index=True)
+        kept = kept[len(kept) - 1 - last]
+        self.sample.iloc[slots[kept]] = rest.iloc[kept].to_numpy()
+
+    def seed(self, frame):
+        """Starts the sketches from a local snapshot so the first sync only fetches newer stops."""
+        if frame.empty or 'log_id' not in frame.columns:
+            return
+        with self._sync_lock:
+            self._reset()
+            self.add_rows(frame[SKETCH_COLUMNS])
+            self.high_water_mark = int(frame['log_id'].max())
+            self.last_synced_at = datetime.now()
+
+    def sync(self):
+        """Adds the stops logged since the last sync. Returns the number of new rows."""
+        require_columns('log_id')
+        with self._sync_lock:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT log_id, {', '.join(SKETCH_COLUMNS)} FROM policelog_data WHERE log_id > %s ORDER BY log_id",
+                    (self.high_water_mark,),
+                )
+                new_rows = pd.DataFrame(cursor.fetchall())
+            self.last_synced_at = datetime.now()
+            if new_rows.empty:
+                return 0
+            new_rows.columns = new_rows.columns.str.lower()
+            # Rows above a log_id gap that may still commit are read again on the next sync
+            mark = self._log_id_gaps.safe_mark(self.high_water_mark, new_rows['log_id'])
+            new_rows = new_rows[new_rows['log_id'].astype('int64') <= mark]
+            if not new_rows.empty:
+                self.add_rows(optimize_frame(new_rows))
+            self.high_water_mark = mark
+            return len(new_rows)
+
+    def start_background_sync(self, interval=30):
+        """Keeps the sketches current on a daemon thread."""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                    self.last_sync_error = None
+                except Exception as e:
+                    self.last_sync_error = str(e)
+                    print(f"Approximate Stats Sync Error: {e}")
+
+        self._sync_thread = threading.Thread(target=run, name='approximate-stats-sync', daemon=True)
+        self._sync_thread.start()
+
+    # --- answers: each returns (result, note on its error bounds) ---
+    def distinct_vehicles(self):
+        with self._lock:
+            sketches = {"All countries": self.vehicles, **self.vehicles_by_country}
+            rows = [(country, sketch.estimate(), sketch.relative_error) for country, sketch in sketches.items()]
+        result = pd.DataFrame([
+            {'country_name': country, 'distinct_vehicles': round(estimate),
+             'margin_95': round(Z_95 * error * estimate)}
+            for country, estimate, error in rows
+        ])
+        return result, f"HyperLogLog estimates; 95% of answers are within ±{Z_95 * rows[0][2]:.1%} of the true count."
+
+    def top_vehicles(self, flag):
+        """Top 10 vehicles by drug-related stops (flag='drugs_related_stop') or searches ('search_conducted')."""
+        sketch, column = {
+            'drugs_related_stop': (self.drug_vehicles, 'total_drug_related_stops'),
+            'search_conducted': (self.searched_vehicles, 'total_searches'),
+        }[flag]
+        with self._lock:
+            candidates = np.array(sorted(sketch.candidates), dtype=object)
+            estimates = sketch.estimate(candidates)
+            bound = sketch.overcount_bound
+        order = np.argsort(-estimates, kind='stable')[:10]
+        result = pd.DataFrame({'vehicle_number': candidates[order], column: estimates[order]})
+        result['max_overcount'] = bound
+        return result, (f"Count-min estimates; each count is at most {bound} above the true count "
+                        f"(probability {1 - np.exp(-CMS_DEPTH):.0%}) and never below it.")
+
+    def _histograms(self):
+        with self._lock:
+            return {key: histogram.copy() for key, histogram in self.age_histograms.items()}
+
+    def age_trends(self):
+        """Driver Violation Trends Based on Age and Race, with age quartiles."""
+        ages = np.arange(MAX_AGE + 1)
+        rows = []
+        for (race, violation), histogram in self._histograms().items():
+            stops = int(histogram.sum())
+            if race is None or violation is None or not stops:
+                continue
+            cumulative = np.cumsum(histogram)
+            quartiles = [int(np.searchsorted(cumulative, stops * q)) for q in (0.25, 0.5, 0.75)]
+            rows.append({'driver_race': race, 'violation': violation,
+                         'avg_driver_age': round(float(ages @ histogram) / stops, 1), 'total_stops': stops,
+                         'age_p25': quartiles[0], 'median_age': quartiles[1], 'age_p75': quartiles[2]})
+        if not rows:
+            return pd.DataFrame(), "No stops have been counted yet."
+        result = pd.DataFrame(rows)
+        result['percent_of_race'] = (result['total_stops'] * 100 / result.groupby('driver_race')['total_stops'].transform('sum')).round(2)
+        result = result.sort_values(['driver_race', 'percent_of_race'], ascending=[True, False], ignore_index=True)
+        return result, "From per-year age histograms: counts are exact and quartiles are exact to the year."
+
+    def younger_violations(self):
+        """Violations most common among drivers under 25."""
+        totals = {}
+        for (_, violation), histogram in self._histograms().items():
+            totals[violation] = totals.get(violation, 0) + int(histogram[:25].sum())
+        result = pd.DataFrame(list(totals.items()), columns=['violation', 'total_stops'])
+        result = result[result['total_stops'] > 0].sort_values('total_stops', ascending=False, ignore_index=True).head(10)
+        return result, "From per-year age histograms: counts are exact."
+
+    def demographics(self):
+        """Driver Demographics by Country, estimated from the reservoir sample with 95% margins."""
+        with self._lock:
+            sample = self.sample.copy()
+            population = self.rows_seen
+        if sample.empty:
+            return pd.DataFrame(), "No stops have been counted yet."
+        size = len(sample)
+        scale = population / size
+        # Finite population correction: the margins shrink to 0 when the sample is the whole table
+        fpc = np.sqrt((population - size) / (population - 1)) if population > 1 else 0.0
+        sample['driver_age'] = pd.to_numeric(sample['driver_age'], errors='coerce')
+        sample = sample.dropna(subset=['country_name', 'driver_gender', 'driver_race'])
+        groups = sample.groupby(['country_name', 'driver_gender', 'driver_race']).agg(
+            hits=('driver_age', 'size'), avg_driver_age=('driver_age', 'mean'),
+            age_std=('driver_age', 'std'), aged=('driver_age', 'count'),
+        ).reset_index()
+        country_hits = groups.groupby('country_name')['hits'].transform('sum')
+        share = groups['hits'] / country_hits
+        groups['total_stops'] = (groups['hits'] * scale).round().astype(int)
+        groups['total_stops_margin'] = (Z_95 * scale * np.sqrt(groups['hits'] * (1 - groups['hits'] / size)) * fpc).round().astype(int)
+        groups['percent_of_country'] = (share * 100).round(2)
+        groups['percent_margin'] = (Z_95 * np.sqrt(share * (1 - share) / country_hits) * 100 * fpc).round(2)
+        groups['avg_driver_age_margin'] = (Z_95 * groups['age_std'].fillna(0) / np.sqrt(groups['aged'].clip(lower=1)) * fpc).round(1)
+        groups['avg_driver_age'] = groups['avg_driver_age'].round(1)
+        result = groups[groups['total_stops'] > 10].sort_values(['country_name', 'total_stops'], ascending=[True, False])
+        columns = ['country_name', 'avg_driver_age', 'avg_driver_age_margin', 'driver_gender', 'driver_race',
+                   'total_stops', 'total_stops_margin', 'percent_of_country', 'percent_margin']
+        return result[columns].reset_index(drop=True), (
+            f"Estimated from a uniform sample of {size:,} of {population:,} stops; margins are 95% intervals."
+        )
+
+
+# Menu titles answered in approximate mode
+APPROXIMATE_QUERIES = {
+    "Top 10 vehicle_Number involved in drug-related stops": lambda stats: stats.top_vehicles('drugs_related_stop'),
+    "Most frequently searched vehicles": lambda stats: stats.top_vehicles('search_conducted'),
+    "violations,which are most common among younger drivers (<25)": ApproximateStats.younger_violations,
+    "Driver Violation Trends Based on Age and Race": ApproximateStats.age_trends,
+    "Driver Demographics by Country (Age, Gender, and Race)": ApproximateStats.demographics,
+}
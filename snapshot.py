@@ -0,0 +1,324 @@
+"""Persistent local columnar snapshot of policelog_data.
+
+The snapshot is a chain of Arrow IPC files that are memory-mapped on load, so a
+cold start reads the table from local disk instead of transferring it from MySQL.
+A base file holds the whole table under a numbered name next to SNAPSHOT_PATH
+(policelog_data.1.arrow, policelog_data.2.arrow, ...). Syncs fetch only rows
+past the stored watermark and write just those rows as a delta file of the newest
+base (policelog_data.2.1.arrow, policelog_data.2.2.arrow, ...), so a sync costs
+the size of the change, not of the table. Loads apply the deltas in order, a
+changed row replacing its previous version by log_id. Once there are
+MAX_DELTA_FILES deltas, or they hold more than COMPACT_FRACTION of the base's
+rows, the next sync compacts: it writes the merged table as a new base and the
+old chain is deleted once nothing maps it any more. A file is never replaced
+while mapped, which Windows refuses. A sync that finds nothing new leaves the
+files (and everything built from it) untouched.
+
+Changed rows are found by updated_at, new rows also by a log_id high-water mark
+guarded by db.LogIdGaps, so an insert that commits after higher ids (or with an
+updated_at older than the watermark) is still picked up. The watermarks live in
+the schema metadata of the newest file of the chain.
+
+Every dashboard session reads the same process-wide DataFrame of the snapshot
+(LocalSnapshot.frame). It is built from the memory-mapped table once per loaded
+version. The file already holds the compact dtypes, so it is built with few copies:
+numbers, dates and text reference the mapped file directly (until deltas are
+applied on top, which copies the merged frame once per load). Sessions never get a copy
+of their own. A load publishes the new (table, frame, watermark) as one object, so
+readers always see a consistent version. The previous version is freed once nothing
+holds it, so memory stays flat however many sessions are open. Treat the frame as
+read-only: select or copy before changing it.
+
+Deletes in MySQL are not seen by an incremental sync; run
+`python snapshot.py --rebuild` after purging rows.
+
+Run `python snapshot.py` to create or sync the snapshot outside the dashboard.
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from db import LOG_ID_GAP_TIMEOUT, LogIdGaps, get_db_cursor, require_columns
+from schema import optimize_frame
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots', 'policelog_data.arrow')
+
+# Updates committed out of timestamp order are re-read for as long as a log_id gap is waited
+# on, and de-duplicated by (log_id, updated_at); inserts are caught by the log_id mark instead
+WATERMARK_OVERLAP = timedelta(seconds=LOG_ID_GAP_TIMEOUT)
+WATERMARK_KEY = b'updated_at_watermark'
+WATERMARK_LOG_ID_KEY = b'log_id_watermark'
+HIGH_WATER_MARK_KEY = b'log_id_high_water_mark'
+
+# A sync compacts the chain into a new base once the deltas reach either limit
+MAX_DELTA_FILES = 16
+COMPACT_FRACTION = 0.1
+
+
+def snapshot_files(path=SNAPSHOT_PATH):
+    """Returns the numbered snapshot files written for `path` as [(number, file path)], oldest first."""
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    pattern = re.compile(rf'{re.escape(stem)}\.(\d+){re.escape(extension)}')
+    if not os.path.isdir(directory):
+        return []
+    numbered = [(int(match.group(1)), os.path.join(directory, entry)) for entry in os.listdir(directory)
+                if (match := pattern.fullmatch(entry))]
+    return sorted(numbered)
+
+
+def delta_files(path, number):
+    """Returns the delta files written on base file `number` as [(delta number, file path)], oldest first."""
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    pattern = re.compile(rf'{re.escape(stem)}\.{number}\.(\d+){re.escape(extension)}')
+    if not os.path.isdir(directory):
+        return []
+    numbered = [(int(match.group(1)), os.path.join(directory, entry)) for entry in os.listdir(directory)
+                if (match := pattern.fullmatch(entry))]
+    return sorted(numbered)
+
+
+def snapshot_chain(path=SNAPSHOT_PATH):
+    """Returns the files of the newest snapshot, its base file first and then its deltas in order.
+    A plain export at `path` is a chain of one; no data at all is an empty chain."""
+    numbered = snapshot_files(path)
+    if not numbered:
+        return [path] if os.path.exists(path) else []
+    number, base_path = numbered[-1]
+    return [base_path] + [delta_path for _, delta_path in delta_files(path, number)]
+
+
+def merge_changes(current, changes):
+    """Returns `current` with `changes` applied: changed rows replace their previous version by log_id."""
+    if current is None or current.empty:
+        merged = changes
+    else:
+        unchanged = current[~current['log_id'].isin(changes['log_id'])]
+        # Columns typed alike (most of them) concatenate as they are; the rest are re-typed from object
+        mismatched = {column: object for column in changes.columns
+                      if column in unchanged.columns and unchanged[column].dtype != changes[column].dtype}
+        merged = pd.concat([unchanged.astype(mismatched), changes.astype(mismatched)], ignore_index=True)
+    return optimize_frame(merged.sort_values('log_id', ignore_index=True))
+
+
+def current_snapshot_path(path=SNAPSHOT_PATH):
+    """Returns the newest snapshot file for `path`, or `path` itself (e.g. a plain export) if none was written."""
+    numbered = snapshot_files(path)
+    return numbered[-1][1] if numbered else path
+
+
+class _Version:
+    """One loaded snapshot: the mapped table, its shared frame, its watermark and the size of its chain."""
+
+    __slots__ = ('table', 'frame', 'watermark', 'watermark_log_id', 'base_rows', 'delta_files', 'delta_rows')
+
+    def __init__(self, table=None, frame=None, watermark=None, watermark_log_id=0, base_rows=0, delta_files=0,
+                 delta_rows=0):
+        self.table = table
+        self.frame = frame if frame is not None else pd.DataFrame()
+        self.watermark = watermark
+        self.watermark_log_id = watermark_log_id
+        self.base_rows = base_rows
+        self.delta_files = delta_files
+        self.delta_rows = delta_rows
+
+
+class LocalSnapshot:
+    """Memory-mapped Arrow snapshot of policelog_data with watermark-based sync."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.last_sync_error = None
+        self.last_synced_at = None
+        self.load_seconds = None
+        self.high_water_mark = 0
+        self._version = _Version()
+        self._log_id_gaps = LogIdGaps()
+        self._sync_thread = None
+
+    # --- loading ---
+    def load(self):
+        """Memory-maps the newest snapshot and its deltas if there is one. Never touches the database."""
+        chain = snapshot_chain(self.path)
+        if not chain:
+            return False
+        started = time.perf_counter()
+        tables = [ipc.open_file(pa.memory_map(path, 'r')).read_all() for path in chain]
+        metadata = tables[-1].schema.metadata or {}
+        watermark = metadata.get(WATERMARK_KEY)
+        watermark_log_id = int(metadata.get(WATERMARK_LOG_ID_KEY, b'0'))
+        # split_blocks keeps each column in its own block, so pandas does not consolidate
+        # (copy) columns of the same dtype; columns already typed pass through optimize_frame
+        frame = optimize_frame(tables[0].to_pandas(split_blocks=True))
+        table = tables[0]
+        if len(tables) > 1:
+            changes = None
+            for delta in tables[1:]:
+                changes = merge_changes(changes, optimize_frame(delta.to_pandas(split_blocks=True)))
+            frame = merge_changes(frame, changes)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+        # One assignment: a reader gets the old version or the new one, never a mix
+        self._version = _Version(table, frame, datetime.fromisoformat(watermark.decode()) if watermark else None,
+                                 watermark_log_id, tables[0].num_rows, len(tables) - 1,
+                                 sum(delta.num_rows for delta in tables[1:]))
+        self.high_water_mark = max(self.high_water_mark, int(metadata.get(HIGH_WATER_MARK_KEY, b'0')))
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        return True
+
+    @property
+    def table(self):
+        return self._version.table
+
+    @property
+    def frame(self):
+        """The snapshot as a typed DataFrame, shared by every session (built once per loaded version)."""
+        return self._version.frame
+
+    @property
+    def watermark(self):
+        return self._version.watermark
+
+    @property
+    def row_count(self):
+        table = self._version.table
+        return 0 if table is None else table.num_rows
+
+    # --- syncing ---
+    def _fetch_changes(self, since, since_log_id=0, high_water_mark=0):
+        query = "SELECT * FROM policelog_data"
+        params = None
+        if since is not None:
+            # New rows by log_id, whatever their updated_at. The overlap re-reads recent updates; rows
+            # at exactly the watermark time are read only past its log_id, so a batch sharing one
+            # timestamp is not fetched again on every sync
+            query += " WHERE log_id > %s OR (updated_at >= %s AND (updated_at <> %s OR log_id > %s))"
+            params = (high_water_mark, since - WATERMARK_OVERLAP, since, since_log_id)
+        with get_db_cursor() as cursor:
+            cursor.execute(query, params)
+            changes = pd.DataFrame(cursor.fetchall())
+        if not changes.empty:
+            changes.columns = changes.columns.str.lower()
+        return changes
+
+    def _write(self, frame, watermark, watermark_log_id, high_water_mark, delta):
+        """Writes `frame` as the next delta of the newest base file, or (delta=False) as a new base."""
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            WATERMARK_KEY: watermark.isoformat().encode(),
+            WATERMARK_LOG_ID_KEY: str(watermark_log_id).encode(),
+            HIGH_WATER_MARK_KEY: str(high_water_mark).encode(),
+        })
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        numbered = snapshot_files(self.path)
+        stem, extension = os.path.splitext(self.path)
+        if delta:
+            number = numbered[-1][0]
+            deltas = delta_files(self.path, number)
+            new_path = f"{stem}.{number}.{deltas[-1][0] + 1 if deltas else 1}{extension}"
+        else:
+            new_path = f"{stem}.{numbered[-1][0] + 1 if numbered else 1}{extension}"
+        temp_path = f"{new_path}.tmp"
+        with pa.OSFile(temp_path, 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        # Readers keep their mmap of the old file; new loads see the complete new one. The target
+        # never exists, so this also works on Windows, which cannot replace a mapped file.
+        os.replace(temp_path, new_path)
+
+    def _remove_old_files(self):
+        """Deletes the chains of older base files; ones still mapped are retried after the next sync."""
+        for number, old_path in snapshot_files(self.path)[:-1]:
+            for _, delta_path in delta_files(self.path, number):
+                try:
+                    os.remove(delta_path)
+                except PermissionError:
+                    pass
+            try:
+                os.remove(old_path)
+            except PermissionError:
+                # Windows keeps a file that a session or the embedded backend still maps
+                pass
+
+    def _compaction_due(self, version, new_rows):
+        """True when the next changes should be merged into a new base file rather than written as a delta."""
+        if version.table is None or not snapshot_files(self.path):
+            return True
+        return (version.delta_files + 1 > MAX_DELTA_FILES
+                or version.delta_rows + new_rows > COMPACT_FRACTION * version.base_rows)
+
+    def sync(self, rebuild=False):
+        """Pulls new or changed rows from MySQL into the snapshot. Returns the number fetched."""
+        require_columns('log_id', 'updated_at')
+        version = self._version
+        since = None if rebuild else version.watermark
+        high_water_mark = 0 if rebuild else self.high_water_mark
+        changes = self._fetch_changes(since, version.watermark_log_id, high_water_mark)
+        current = None if rebuild else version.frame
+        if not changes.empty:
+            changes = optimize_frame(changes)
+            # Stops below the first recent log_id gap, so an insert committing late is still read next time
+            high_water_mark = self._log_id_gaps.safe_mark(
+                high_water_mark, changes['log_id'][changes['log_id'] > high_water_mark].astype('int64'))
+        if not changes.empty and current is not None and 'updated_at' in current.columns:
+            # Rows re-read by the overlap that are already loaded at the same version are not changes
+            loaded = pd.MultiIndex.from_frame(current[['log_id', 'updated_at']].astype({'log_id': 'int64'}))
+            fetched = pd.MultiIndex.from_frame(changes[['log_id', 'updated_at']].astype({'log_id': 'int64'}))
+            changes = changes[~fetched.isin(loaded)]
+        if changes.empty:
+            self.high_water_mark = high_water_mark
+            self.last_synced_at = datetime.now()
+            return 0
+
+        newest = changes.sort_values(['updated_at', 'log_id']).iloc[-1]
+        watermark = (pd.Timestamp(newest['updated_at']).to_pydatetime(), int(newest['log_id']))
+        if since is not None:
+            # Rows re-read from the overlap window never move the watermark back
+            watermark = max(watermark, (since, version.watermark_log_id))
+        if rebuild or self._compaction_due(version, len(changes)):
+            self._write(merge_changes(current, changes), *watermark, high_water_mark, delta=False)
+        else:
+            self._write(changes.sort_values('log_id', ignore_index=True), *watermark, high_water_mark, delta=True)
+        self.high_water_mark = high_water_mark
+        self.load()
+        self._remove_old_files()
+        self.last_synced_at = datetime.now()
+        return len(changes)
+
+    def start_background_sync(self, interval=60):
+        """Syncs on a daemon thread so a slow MySQL never blocks the dashboard."""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sync()
+                    self.last_sync_error = None
+                except Exception as e:
+                    self.last_sync_error = str(e)
+                    print(f"Snapshot Sync Error: {e}")
+                time.sleep(interval)
+
+        self._sync_thread = threading.Thread(target=run, name='snapshot-sync', daemon=True)
+        self._sync_thread.start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create or sync the local policelog_data snapshot.")
+    parser.add_argument('--rebuild', action='store_true', help="re-download the whole table")
+    parser.add_argument('--path', default=SNAPSHOT_PATH, help="snapshot file location")
+    args = parser.parse_args()
+
+    snapshot = LocalSnapshot(args.path)
+    snapshot.load()
+    fetched = snapshot.sync(rebuild=args.rebuild)
+    print(f"Snapshot at {current_snapshot_path(snapshot.path)}: {snapshot.row_count} row(s), {fetched} fetched, watermark {snapshot.watermark}.")
@@ -0,0 +1,114 @@
+"""Synthetic policelog_data rows for benchmarks and offline demos.
+
+Rows follow the Policelog_data schema created in sample.ipynb. Categorical fields
+use skewed weights so GROUP BY results look like the real traffic_stops data:
+most stops are speeding, a few countries dominate, and vehicle numbers repeat
+with a Zipf-like distribution so the "top vehicles" queries have real winners.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'stop_date', 'stop_time', 'country_name', 'driver_gender',
+    'driver_age_raw', 'driver_age', 'driver_race', 'violation_raw',
+    'violation', 'search_conducted', 'search_type', 'stop_outcome',
+    'is_arrested', 'stop_duration', 'drugs_related_stop', 'vehicle_number',
+]
+
+VIOLATIONS = {
+    'Speeding': 0.56, 'Moving violation': 0.19, 'Equipment': 0.12,
+    'Other': 0.06, 'Registration/plates': 0.04, 'Seat belt': 0.03,
+}
+VIOLATION_RAW = {
+    'Speeding': ['Speeding'],
+    'Moving violation': ['Other Traffic Violation', 'Call for Service'],
+    'Equipment': ['Equipment/Inspection Violation'],
+    'Other': ['Motorist Assist/Courtesy', 'Suspicious Person', 'Violation of City/Town Ordinance'],
+    'Registration/plates': ['Registration Violation'],
+    'Seat belt': ['Seatbelt Violation'],
+}
+COUNTRIES = {'USA': 0.55, 'Canada': 0.3, 'India': 0.15}
+RACES = {'White': 0.62, 'Black': 0.14, 'Hispanic': 0.12, 'Asian': 0.08, 'Other': 0.04}
+GENDERS = {'M': 0.68, 'F': 0.32}
+OUTCOMES = {
+    'Citation': 0.84, 'Warning': 0.06, 'Arrest Driver': 0.03, 'No Action': 0.03,
+    'N/D': 0.02, 'Arrest Passenger': 0.02,
+}
+DURATIONS = {'0-15 Min': 0.7, '16-30 Min': 0.22, '30+ Min': 0.08}
+SEARCH_TYPES = ['Incident to Arrest', 'Probable Cause', 'Inventory', 'Reasonable Suspicion', 'Protective Frisk']
+# Searches are much more likely for some violations than others
+SEARCH_RATES = {
+    'Speeding': 0.02, 'Moving violation': 0.06, 'Equipment': 0.07,
+    'Other': 0.05, 'Registration/plates': 0.09, 'Seat belt': 0.03,
+}
+# Stops per hour of day: quiet small hours, busy mornings and late afternoons
+HOUR_WEIGHTS = np.array([3, 2, 1.5, 1, 1, 1.5, 3, 5, 7, 8, 8, 7, 6, 6, 6, 7, 8, 8, 7, 6, 5, 5, 4, 3])
+
+
+def _choice(rng, weights, size):
+    values = list(weights)
+    probabilities = np.array([weights[value] for value in values], dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=probabilities / probabilities.sum())]
+
+
+def generate_stops(size, seed=0, start_date='2020-01-01', end_date='2024-12-31'):
+    """Returns `size` synthetic stops as a DataFrame with the policelog_data columns."""
+    rng = np.random.default_rng(seed)
+
+    start, end = np.datetime64(start_date), np.datetime64(end_date)
+    stop_date = start + rng.integers(0, (end - start).astype(int) + 1, size=size).astype('timedelta64[D]')
+    hours = rng.choice(24, size=size, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    seconds = hours * 3600 + rng.integers(0, 3600, size=size)
+
+    violation = _choice(rng, VIOLATIONS, size)
+    violation_raw = np.array([VIOLATION_RAW[v][i % len(VIOLATION_RAW[v])] for i, v in
+                              zip(rng.integers(0, 3, size=size), violation)], dtype=object)
+
+    ages = np.clip(rng.gamma(shape=6.0, scale=6.0, size=size) + 16, 16, 90).astype(int)
+    birth_years = pd.DatetimeIndex(stop_date).year.to_numpy() - ages
+
+    search_rate = np.array([SEARCH_RATES[v] for v in violation])
+    search_conducted = rng.random(size) < search_rate
+    outcome = _choice(rng, OUTCOMES, size)
+    # Searched stops end in arrest far more often
+    searched_arrest = search_conducted & (rng.random(size) < 0.35)
+    outcome[searched_arrest] = 'Arrest Driver'
+    is_arrested = np.char.startswith(outcome.astype(str), 'Arrest')
+    drugs_related_stop = search_conducted & (rng.random(size) < 0.3) | (rng.random(size) < 0.002)
+
+    search_type = np.full(size, None, dtype=object)
+    search_type[search_conducted] = np.array(SEARCH_TYPES, dtype=object)[
+        rng.integers(0, len(SEARCH_TYPES), size=int(search_conducted.sum()))
+    ]
+
+    # Most vehicles are seen a handful of times; one stop in ten comes from a small,
+    # Zipf-distributed set of repeat offenders that tops the vehicle queries
+    vehicle_ids = rng.integers(1000, max(size // 3, 1001), size=size)
+    repeat = rng.random(size) < 0.1
+    vehicle_ids[repeat] = rng.zipf(1.5, size=int(repeat.sum())) % 1000
+    vehicle_number = pd.Series(vehicle_ids).map(lambda vid: f"TN{vid:08d}")
+
+    return pd.DataFrame({
+        'stop_date': pd.to_datetime(stop_date).strftime('%Y-%m-%d'),
+        'stop_time': [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds],
+        'country_name': _choice(rng, COUNTRIES, size),
+        'driver_gender': _choice(rng, GENDERS, size),
+        'driver_age_raw': birth_years,
+        'driver_age': ages,
+        'driver_race': _choice(rng, RACES, size),
+        'violation_raw': violation_raw,
+        'violation': violation,
+        'search_conducted': search_conducted.astype(int),
+        'search_type': search_type,
+        'stop_outcome': outcome,
+        'is_arrested': is_arrested.astype(int),
+        'stop_duration': _choice(rng, DURATIONS, size),
+        'drugs_related_stop': drugs_related_stop.astype(int),
+        'vehicle_number': vehicle_number.to_numpy(dtype=object),
+    }, columns=COLUMNS)
+
+
+def generate_chunks(size, chunk_size=500000, seed=0):
+    """Yields `size` synthetic stops in chunks, so 10M-row datasets never sit in memory twice."""
+    for chunk_number, offset in enumerate(range(0, size, chunk_size)):
+        yield generate_stops(min(chunk_size, size - offset), seed=seed + chunk_number)
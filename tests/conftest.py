@@ -0,0 +1,73 @@
+"""Shared fixtures: a cursor that renders SQL with pymysql's own parameter formatting, without a server."""
+import os
+import sys
+from contextlib import contextmanager
+
+import pymysql
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MogrifyCursor:
+    """Records each statement as pymysql would send it and answers from canned results."""
+
+    def __init__(self, results=None):
+        self._cursor = pymysql.connect(host='localhost', defer_connect=True).cursor()
+        self.results = results or {}
+        self.statements = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        sql = self._cursor.mogrify(query, params)
+        self.statements.append(sql)
+        self._rows = next((rows for marker, rows in self.results.items() if marker in sql), [])
+        return len(self._rows)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+@pytest.fixture
+def mogrify_cursor():
+    return MogrifyCursor()
+
+
+@pytest.fixture
+def fake_db(monkeypatch, mogrify_cursor):
+    """Points get_db_cursor in the given modules at `mogrify_cursor`."""
+    @contextmanager
+    def get_db_cursor():
+        yield mogrify_cursor
+
+    def patch(*modules):
+        for module in modules:
+            monkeypatch.setattr(module, 'get_db_cursor', get_db_cursor)
+            for check in ('require_columns', 'require_table'):
+                if hasattr(module, check):
+                    monkeypatch.setattr(module, check, lambda *names: None)
+        return mogrify_cursor
+    return patch
+
+
+@pytest.fixture
+def embedded_backend(tmp_path):
+    """An EmbeddedBackend over 3000 synthetic stops written as an Arrow snapshot file."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    from backends import EmbeddedBackend
+    from schema import optimize_frame
+    from synthetic import generate_stops
+
+    frame = optimize_frame(generate_stops(3000, seed=7))
+    frame.insert(0, 'log_id', range(1, len(frame) + 1))
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    path = str(tmp_path / 'policelog_data.arrow')
+    with pa.OSFile(path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return EmbeddedBackend(path)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import snapshot
+from backends import EmbeddedBackend, translate_mysql
+from metrics import core_metrics_query
+from queries import query_map
+from synthetic import generate_stops
+
+
+def test_translate_rewrites_placeholders_only_with_params():
+    sql = "SELECT * FROM policelog_data WHERE stop_date >= %s"
+    assert translate_mysql(sql, ['2024-01-01']).endswith("stop_date >= ?")
+    assert translate_mysql(sql) == sql
+
+
+def test_translate_reads_the_leading_number_of_stop_duration():
+    sql = translate_mysql("SELECT AVG(stop_duration) FROM policelog_data")
+    assert "AVG(stop_duration)" not in sql and "regexp_extract(stop_duration" in sql
+
+
+def test_every_shipped_query_runs_on_the_embedded_backend(embedded_backend):
+    for title, sql in {**query_map, 'Core Metrics': core_metrics_query}.items():
+        result = embedded_backend.execute(sql)
+        assert not result.empty, title
+        assert list(result.columns) == [column.lower() for column in result.columns], title
+
+
+def test_embedded_backend_binds_params(embedded_backend):
+    result = embedded_backend.execute("SELECT COUNT(*) AS stops FROM policelog_data WHERE log_id <= %s", [10])
+    assert result['stops'][0] == 10
+    assert embedded_backend.version()[1] == 3000
+
+
+def test_average_stop_duration_matches_mysql_coercion(embedded_backend):
+    # MySQL reads '0-15 Min' as 0, '16-30 Min' as 16 and '30+ Min' as 30
+    result = embedded_backend.execute(
+        "SELECT AVG(stop_duration) AS average FROM policelog_data WHERE stop_duration = '16-30 Min'")
+    assert result['average'][0] == 16
+
+
+def test_embedded_backend_applies_snapshot_deltas(tmp_path, fake_db):
+    cursor = fake_db(snapshot)
+    rows = generate_stops(500, seed=2).to_dict('records')
+    for log_id, row in enumerate(rows, start=1):
+        row.update(log_id=log_id, updated_at=datetime(2024, 5, 1, 12, 0, 0))
+    cursor.results = {'FROM policelog_data': rows}
+    local = snapshot.LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    local.sync()
+    backend = EmbeddedBackend(local.path)
+    first_version = backend.version()
+
+    later = datetime(2024, 5, 1, 12, 0, 5)
+    cursor.results = {'FROM policelog_data': [{**rows[0], 'country_name': 'Narnia', 'updated_at': later},
+                                              {**rows[1], 'log_id': 501, 'updated_at': later}]}
+    local.sync()
+    assert len(snapshot.snapshot_chain(local.path)) == 2
+    assert backend.version() != first_version and backend.version()[1] == 501
+    result = backend.execute("SELECT country_name, COUNT(*) AS stops FROM policelog_data WHERE log_id = 1 GROUP BY 1")
+    assert result.to_dict('records') == [{'country_name': 'Narnia', 'stops': 1}]
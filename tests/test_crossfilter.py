@@ -0,0 +1,51 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from crossfilter import BitmapIndex, _count
+from schema import optimize_frame
+from synthetic import generate_stops
+
+# 1000 rows leave a partial last 64-bit word, so padding bits are exercised too
+FRAME = optimize_frame(generate_stops(1000, seed=3))
+
+
+@pytest.fixture(scope='module')
+def index():
+    return BitmapIndex(FRAME)
+
+
+def test_and_selection_counts_match_a_pandas_mask(index):
+    filters = {'country_name': ['USA', 'India'], 'violation': ['Speeding'], 'driver_gender': ['F']}
+    mask = (FRAME['country_name'].isin(['USA', 'India']) & FRAME['violation'].eq('Speeding')
+            & FRAME['driver_gender'].eq('F'))
+    assert _count(index.select(filters, 'all')) == int(mask.sum())
+
+
+def test_or_selection_counts_match_a_pandas_mask(index):
+    filters = {'driver_race': ['Asian'], 'stop_outcome': ['Arrest Driver', 'Warning']}
+    mask = FRAME['driver_race'].eq('Asian') | FRAME['stop_outcome'].isin(['Arrest Driver', 'Warning'])
+    assert _count(index.select(filters, 'any')) == int(mask.sum())
+
+
+def test_summary_and_ledger_follow_the_selection(index):
+    date_range = (date(2022, 1, 1), date(2022, 12, 31))
+    selection = index.select({'country_name': ['Canada']}, 'all', date_range)
+    mask = (FRAME['country_name'].eq('Canada')
+            & FRAME['stop_date'].between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])))
+    summary = index.summary(selection)
+    outcome = FRAME['stop_outcome'].astype(str).str.lower()
+    assert summary['total_stops'] == int(mask.sum())
+    assert summary['arrests'] == int((mask & outcome.str.contains('arrest')).sum())
+    assert summary['drug_related'] == int((mask & FRAME['drugs_related_stop'].eq(True)).sum())
+
+    rows = index.ledger_rows(selection)
+    assert sorted(rows) == list(np.flatnonzero(mask.to_numpy()))
+    stamps = FRAME['stop_date'].iloc[rows] + FRAME['stop_time'].iloc[rows]
+    assert stamps.is_monotonic_decreasing
+
+
+def test_no_filters_select_every_row(index):
+    assert _count(index.select({})) == len(FRAME)
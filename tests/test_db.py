@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+import pytest
+
+import db
+
+
+def test_require_columns_fails_clearly_without_altering(monkeypatch, mogrify_cursor):
+    mogrify_cursor.results = {'information_schema.COLUMNS': [{'name': 'stop_date'}, {'name': 'log_id'}]}
+
+    @contextmanager
+    def get_db_cursor():
+        yield mogrify_cursor
+
+    monkeypatch.setattr(db, 'get_db_cursor', get_db_cursor)
+    monkeypatch.setattr(db, '_present_columns', set())
+    db.require_columns('log_id')
+    with pytest.raises(RuntimeError, match="python migrate.py"):
+        db.require_columns('log_id', 'updated_at')
+    assert not any(statement.lstrip().startswith('ALTER') for statement in mogrify_cursor.statements)
+
+
+def test_gap_holds_the_mark_until_the_late_rows_commit(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(db.time, 'monotonic', lambda: clock[0])
+    gaps = db.LogIdGaps(timeout=60)
+    # 11-15 belong to an ingest transaction that has not committed; 16 (autocommit) already has
+    assert gaps.safe_mark(10, [16]) == 10
+    assert gaps.safe_mark(10, [11, 12, 13, 14, 15, 16, 17]) == 17
+
+
+def test_gap_that_never_fills_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(db.time, 'monotonic', lambda: clock[0])
+    gaps = db.LogIdGaps(timeout=60)
+    assert gaps.safe_mark(10, [12, 13]) == 10
+    clock[0] += 61
+    assert gaps.safe_mark(10, [12, 13]) == 13
+
+
+def test_first_sync_starts_at_the_first_id():
+    assert db.LogIdGaps().safe_mark(0, [500, 501, 502]) == 502
+
+
+def test_read_mark_stops_before_a_recent_gap(mogrify_cursor):
+    mogrify_cursor.results = {
+        'MAX(log_id)': [{'max_log_id': 8}],
+        'SELECT log_id': [{'log_id': log_id} for log_id in (6, 8)],
+    }
+    assert db.LogIdGaps().read_mark(mogrify_cursor, 5) == 6
@@ -0,0 +1,66 @@
+import csv
+import os
+from datetime import date
+
+import pyarrow.parquet as pq
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from export import output_name, stream_query
+
+DESCRIPTION = [('log_id', FIELD_TYPE.LONGLONG), ('stop_date', FIELD_TYPE.DATE),
+               ('arrest_rate', FIELD_TYPE.NEWDECIMAL), ('violation', FIELD_TYPE.VAR_STRING)]
+ROWS = [(1, date(2024, 1, 1), 12.5, 'Speeding'), (2, date(2024, 1, 2), None, None),
+        (3, date(2024, 1, 3), 0.0, 'Seatbelt')]
+
+
+class StreamingCursor:
+    """A server-side cursor stand-in: hands out `rows` in fetchmany batches, optionally failing mid-stream."""
+
+    def __init__(self, rows, fail_after=None):
+        self.rows, self.fail_after, self.batches = list(rows), fail_after, 0
+        self.description = [(name, type_code, None, None, None, None, True) for name, type_code in DESCRIPTION]
+
+    def execute(self, sql):
+        self.sql = sql
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.batches == self.fail_after:
+            raise ConnectionError("Lost connection to MySQL server during query")
+        self.batches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_csv_output_has_header_and_every_row(tmp_path):
+    path = tmp_path / 'ledger.csv'
+    assert stream_query(StreamingCursor(ROWS), "SELECT 1", str(path), 'csv', batch_size=2) == 3
+    with open(path, newline='') as handle:
+        lines = list(csv.reader(handle))
+    assert lines[0] == ['log_id', 'stop_date', 'arrest_rate', 'violation']
+    assert lines[1:] == [['1', '2024-01-01', '12.5', 'Speeding'], ['2', '2024-01-02', '', ''],
+                         ['3', '2024-01-03', '0.0', 'Seatbelt']]
+
+
+def test_parquet_output_is_typed_from_the_description(tmp_path):
+    path = tmp_path / 'ledger.parquet'
+    assert stream_query(StreamingCursor(ROWS), "SELECT 1", str(path), 'parquet', batch_size=2) == 3
+    table = pq.read_table(path)
+    assert [str(field.type) for field in table.schema] == ['int64', 'date32[day]', 'double', 'string']
+    assert table.to_pylist()[1] == {'log_id': 2, 'stop_date': date(2024, 1, 2), 'arrest_rate': None, 'violation': None}
+    assert table.column('log_id').to_pylist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet', 'arrow'])
+def test_interrupted_export_leaves_no_partial_file(tmp_path, file_format):
+    path = tmp_path / f'ledger.{file_format}'
+    path.write_text("last complete export")
+    with pytest.raises(ConnectionError):
+        stream_query(StreamingCursor(ROWS, fail_after=1), "SELECT 1", str(path), file_format, batch_size=2)
+    # The previous export is untouched and the temporary file is gone
+    assert path.read_text() == "last complete export"
+    assert os.listdir(tmp_path) == [path.name]
+
+
+def test_output_name():
+    assert output_name("Top 5 Violations with Highest Arrest Rates") == 'top_5_violations_with_highest_arrest_rates'
@@ -0,0 +1,9 @@
+from instrumentation import QueryLog
+
+
+def test_failed_fetches_are_errors_not_cache_hits():
+    log = QueryLog()
+    for status in ('miss', 'hit', 'coalesced', 'error', 'error'):
+        log.record('fetch_data', query='SELECT 1', wall_ms=1.0, cache=status, rows=0)
+    row = log.summary().iloc[0]
+    assert (row['calls'], row['cache_hits'], row['errors']) == (5, 2, 2)
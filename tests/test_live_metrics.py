@@ -0,0 +1,38 @@
+import live_metrics
+from codes import CODE_COLUMNS
+from live_metrics import BOUNDED_CODED_CORE_METRICS_QUERY, BOUNDED_CORE_METRICS_QUERY, LiveMetrics
+
+
+def test_bounded_query_keeps_like_wildcards(mogrify_cursor):
+    mogrify_cursor.execute(BOUNDED_CORE_METRICS_QUERY, (5,))
+    sql = mogrify_cursor.statements[-1]
+    assert "LIKE '%arrest%'" in sql and "LIKE '%warning%'" in sql
+    assert "WHERE log_id <= 5" in sql
+
+
+def test_seed_counts_up_to_the_high_water_mark(fake_db):
+    cursor = fake_db(live_metrics)
+    cursor.results = {
+        'MAX(log_id)': [{'max_log_id': 7}],
+        "TABLE_NAME = 'code_backfill'": [{'present': 0}],
+        'SELECT log_id': [{'log_id': log_id} for log_id in range(1, 8)],
+        'GROUP BY': [{'violation': 'Speeding', 'driver_gender': 'M', 'total_stops': 3,
+                      'total_arrests': 1, 'total_warnings': 2, 'total_drug_related': 0}],
+    }
+    metrics = LiveMetrics()
+    metrics.seed()
+    assert metrics.seeded and metrics.high_water_mark == 7
+    assert metrics.summary()['total_stops'] == 3 and metrics.summary()['arrests'] == 1
+
+
+
+def test_seed_compares_outcome_codes_once_backfilled(fake_db):
+    cursor = fake_db(live_metrics)
+    cursor.results = {
+        'MAX(log_id)': [{'max_log_id': 0}],
+        "TABLE_NAME = 'code_backfill'": [{'present': 1}],
+        'FROM code_backfill': [{'code_column': column} for column in CODE_COLUMNS],
+    }
+    LiveMetrics().seed()
+    assert cursor.statements[-1] == cursor._cursor.mogrify(BOUNDED_CODED_CORE_METRICS_QUERY, (0,))
+    assert 'LIKE' not in cursor.statements[-1]
@@ -0,0 +1,52 @@
+import migrate
+
+
+def test_unique_keys_include_the_partitioning_column():
+    # MySQL rejects a unique key without stop_date on the partitioned table (error 1503)
+    for definition in migrate.UNIQUE_INDEXES.values():
+        assert 'stop_date' in definition
+
+
+def _schema(cursor, columns=(), indexes=(), objects=()):
+    cursor.results = {
+        'information_schema.COLUMNS': [{'name': name} for name in ['stop_date', 'stop_time', *columns]],
+        'information_schema.STATISTICS': [{'name': name} for name in ['PRIMARY', *indexes]],
+        'information_schema.TABLES': [{'name': name} for name in ['policelog_data', *objects]],
+    }
+    return cursor
+
+
+def test_migrate_adds_everything_to_a_bare_table(mogrify_cursor):
+    cursor = _schema(mogrify_cursor)
+    applied = migrate.migrate(cursor)
+    alter = next(sql for sql in cursor.statements if sql.startswith('ALTER TABLE'))
+    for name in [*migrate.SYNC_COLUMNS, *migrate.GENERATED_COLUMNS, *migrate.INDEXES, *migrate.UNIQUE_INDEXES]:
+        assert f" {name} " in alter
+    # One table rebuild, then the counter table, its row and the trigger
+    assert sum(sql.startswith('ALTER TABLE') for sql in cursor.statements) == 1
+    assert applied[-3:] == [*migrate.VERSION_STATEMENTS['policelog_version'],
+                            *migrate.VERSION_STATEMENTS['policelog_count_deletes']]
+
+
+def test_migrate_is_a_no_op_once_applied(mogrify_cursor):
+    cursor = _schema(
+        mogrify_cursor,
+        columns=[name.upper() for name in [*migrate.SYNC_COLUMNS, *migrate.GENERATED_COLUMNS]],
+        indexes=[*migrate.INDEXES, *migrate.UNIQUE_INDEXES],
+        objects=list(migrate.VERSION_STATEMENTS),
+    )
+    assert migrate.pending_alterations(cursor) == []
+    assert migrate.migrate(cursor) == []
+    assert all(sql.lstrip().startswith('SELECT') for sql in cursor.statements)
+
+
+def test_migrate_adds_only_the_missing_pieces(mogrify_cursor):
+    present_columns = [name for name in [*migrate.SYNC_COLUMNS, *migrate.GENERATED_COLUMNS] if name != 'stop_month']
+    present_indexes = [name for name in migrate.INDEXES if name != 'idx_stop_date_time']
+    cursor = _schema(mogrify_cursor, present_columns, present_indexes, objects=['policelog_version'])
+    assert migrate.migrate(cursor) == [
+        f"ADD COLUMN stop_month {migrate.GENERATED_COLUMNS['stop_month']}",
+        f"ADD INDEX idx_stop_date_time {migrate.INDEXES['idx_stop_date_time']}",
+        f"ADD UNIQUE INDEX uq_client_log_id {migrate.UNIQUE_INDEXES['uq_client_log_id']}",
+        *migrate.VERSION_STATEMENTS['policelog_count_deletes'],
+    ]
@@ -0,0 +1,24 @@
+from datetime import date
+
+import partitions
+
+
+def test_partitioning_appends_stop_date_to_unique_keys(mogrify_cursor):
+    mogrify_cursor.results = {
+        'stop_date IS NULL': [{'undated': 0}],
+        'MIN(stop_date)': [{'first_date': date(2024, 1, 15)}],
+        'information_schema.STATISTICS': [
+            {'name': 'uq_client_log_id', 'column_name': 'client_log_id'},
+            {'name': 'uq_stop_key', 'column_name': 'vehicle_number'},
+            {'name': 'uq_stop_key', 'column_name': 'stop_date'},
+        ],
+        'information_schema.COLUMNS': [{'name': 'log_id'}, {'name': 'stop_date'}],
+    }
+    partitions.partition_table(mogrify_cursor)
+    key_changes = next(sql for sql in mogrify_cursor.statements if 'ADD PRIMARY KEY' in sql)
+    assert "DROP INDEX uq_client_log_id" in key_changes
+    assert "ADD UNIQUE INDEX uq_client_log_id (client_log_id, stop_date)" in key_changes
+    assert "uq_stop_key" not in key_changes
+    # The keys are fixed before the table is partitioned
+    assert mogrify_cursor.statements.index(key_changes) < len(mogrify_cursor.statements) - 1
+    assert "PARTITION BY RANGE COLUMNS (stop_date)" in mogrify_cursor.statements[-1]
@@ -0,0 +1,88 @@
+import pymysql
+import pytest
+
+import db
+
+
+class FakeConnection:
+    """Stands in for a pymysql connection; `alive` decides whether ping succeeds."""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cursor(self):
+        return object()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """A pool whose connections are FakeConnections, also behind db.get_db_cursor."""
+    monkeypatch.setattr(db.pymysql, 'connect', lambda **kwargs: FakeConnection())
+    pool = db.ConnectionPool(max_size=2, acquire_timeout=0.05, host='fake')
+    monkeypatch.setattr(db, 'pool', pool)
+    return pool
+
+
+def test_exhausted_pool_raises_after_the_timeout(fake_pool):
+    held = [fake_pool.acquire(), fake_pool.acquire()]
+    with pytest.raises(db.PoolTimeoutError):
+        fake_pool.acquire()
+    assert fake_pool.stats()['timeouts'] == 1
+    released = held.pop()
+    fake_pool.release(released)
+    assert fake_pool.acquire() is released
+
+
+def test_released_connections_are_reused_and_rolled_back(fake_pool):
+    connection = fake_pool.acquire()
+    fake_pool.release(connection)
+    assert fake_pool.acquire() is connection
+    assert connection.rollbacks == 1 and fake_pool.stats()['created'] == 1
+
+
+def test_idle_and_old_connections_are_recycled(fake_pool):
+    connection = fake_pool.acquire()
+    fake_pool.release(connection)
+    fake_pool.idle_recycle = 0
+    replacement = fake_pool.acquire()
+    assert replacement is not connection and connection.closed
+
+    fake_pool.idle_recycle, fake_pool.max_lifetime = 300, 0
+    fake_pool.release(replacement)
+    assert fake_pool.acquire() is not replacement and replacement.closed
+    assert fake_pool.stats()['recycled'] == 2
+
+
+def test_stale_connections_fail_the_health_check_and_are_replaced(fake_pool):
+    connection = fake_pool.acquire()
+    fake_pool.release(connection)
+    connection.alive = False
+    fake_pool.health_check_interval = 0
+    assert fake_pool.acquire() is not connection
+    assert connection.closed and fake_pool.stats()['health_check_failures'] == 1
+
+
+def test_cursor_errors_return_the_connection_to_the_pool(fake_pool):
+    with pytest.raises(ValueError):
+        with db.get_db_cursor():
+            raise ValueError("bad row")
+    assert fake_pool.stats()['in_use'] == 0 and fake_pool.stats()['idle'] == 1
+
+    # A lost connection is closed instead of being handed to the next session
+    with pytest.raises(pymysql.err.OperationalError):
+        with db.get_db_cursor():
+            raise pymysql.err.OperationalError(2013, "Lost connection")
+    stats = fake_pool.stats()
+    assert (stats['in_use'], stats['idle'], stats['closed']) == (0, 0, 1)
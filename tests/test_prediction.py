@@ -0,0 +1,37 @@
+import pandas as pd
+
+from prediction import PredictionIndex
+
+
+def _stops():
+    rows = [
+        # The exact combination the form submits below
+        {'driver_gender': 'M', 'driver_age': 27, 'driver_race': 'White', 'stop_duration': '0-15 Min',
+         'search_conducted': 0, 'drugs_related_stop': 0, 'stop_outcome': 'Arrest', 'violation': 'DUI'},
+    ] + [
+        # Many coarser matches with a different answer
+        {'driver_gender': 'F', 'driver_age': 40, 'driver_race': 'Asian', 'stop_duration': '16-30 Min',
+         'search_conducted': 0, 'drugs_related_stop': 0, 'stop_outcome': 'Warning', 'violation': 'Speeding'},
+    ] * 5
+    return pd.DataFrame(rows)
+
+
+def test_form_labels_reach_the_exact_match():
+    index = PredictionIndex()
+    index.add_rows(_stops())
+    outcome, violation, support, level = index.lookup_form('Male', 27, 'White', '0', '0', '0-15 Minutes')
+    assert (outcome, violation, support, level) == ('Arrest', 'DUI', 1, "exact match")
+
+
+def test_sync_picks_up_rows_that_commit_after_higher_ids(fake_db):
+    import prediction
+
+    cursor = fake_db(prediction)
+    stop = _stops().iloc[0].to_dict()
+    index = PredictionIndex()
+    cursor.results = {'FROM policelog_data': [{**stop, 'log_id': 1}, {**stop, 'log_id': 3}]}
+    assert index.sync() == 1 and index.high_water_mark == 1
+    # log_id 2 was allocated first but committed last
+    cursor.results = {'FROM policelog_data': [{**stop, 'log_id': 2}, {**stop, 'log_id': 3}]}
+    assert index.sync() == 2 and index.high_water_mark == 3
+    assert index.rows_indexed == 3
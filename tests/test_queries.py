@@ -0,0 +1,54 @@
+from datetime import date
+
+import pandas as pd
+
+from codes import CODE_TABLES
+from metrics import coded_core_metrics_query, core_metrics_query
+from queries import filter_stop_dates, query_map, use_code_columns
+
+DATE_RANGE = (date(2024, 5, 1), date(2024, 5, 31))
+PREDICATE = "stop_date >= '2024-05-01' AND stop_date < '2024-06-01'"
+
+
+def test_filter_adds_a_where_clause():
+    sql = filter_stop_dates("SELECT COUNT(*) FROM policelog_data GROUP BY country_name", DATE_RANGE)
+    assert sql == f"SELECT COUNT(*) FROM policelog_data\nWHERE {PREDICATE} GROUP BY country_name"
+
+
+def test_filter_joins_an_existing_where_with_and():
+    sql = filter_stop_dates("SELECT * FROM policelog_data WHERE is_arrested = 1", DATE_RANGE)
+    assert sql == f"SELECT * FROM policelog_data\nWHERE {PREDICATE} AND is_arrested = 1"
+
+
+def test_filter_leaves_other_tables_alone():
+    sql = "SELECT * FROM policelog_data_archive WHERE is_arrested = 1"
+    assert filter_stop_dates(sql, DATE_RANGE) == sql
+
+
+def test_filter_covers_every_read_of_every_shipped_query():
+    for title, sql in query_map.items():
+        filtered = filter_stop_dates(sql, DATE_RANGE)
+        assert filtered.count(PREDICATE) == sql.count('policelog_data'), title
+
+
+def test_no_range_returns_the_query_unchanged():
+    assert filter_stop_dates(query_map[next(iter(query_map))], None) == query_map[next(iter(query_map))]
+
+
+def test_code_column_queries_give_the_same_answers(embedded_backend):
+    embedded_backend.execute("SELECT 1")  # loads policelog_data
+    connection = embedded_backend.connection
+    # The same CASE as codes.backfill_codes
+    for column, (code_column, labels, synonyms) in CODE_TABLES.items():
+        codes_by_label = {label: code for code, label in labels.items()}
+        cases = " ".join(f"WHEN '{synonym}' THEN {codes_by_label[label]}" for synonym, label in synonyms.items())
+        connection.execute(f"ALTER TABLE policelog_data ADD COLUMN {code_column} UTINYINT")
+        connection.execute(f"UPDATE policelog_data SET {code_column} = CASE LOWER(TRIM({column})) {cases} END")
+
+    coded = {title: use_code_columns(sql) for title, sql in query_map.items()}
+    assert any(coded[title] != query_map[title] for title in query_map)
+    for title, sql in {**coded, 'Core Metrics': coded_core_metrics_query}.items():
+        # Core Metrics has no ORDER BY, so rows are compared in a fixed order
+        result, expected = (frame.sort_values(list(frame.columns), ignore_index=True) for frame in
+                            (embedded_backend.execute(sql), embedded_backend.execute(query_map.get(title, core_metrics_query))))
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, obj=title)
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pandas as pd
+
+import backends
+from result_cache import VersionedResultCache
+
+
+def test_storing_over_a_key_keeps_the_byte_count_exact():
+    cache = VersionedResultCache(version_fn=lambda: (1, 'a', 1))
+    key = ('q', (2, 'b', 2))
+    # advance() carrying 'q' forward onto a result another session already stored
+    cache._store(key, pd.DataFrame({'x': [1]}))
+    cache._store(key, pd.DataFrame({'x': [1, 2]}))
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['bytes'] == cache._entries[key][1]
+
+
+def test_a_delete_changes_the_version_and_invalidates():
+    rows = {'count': 3}
+    cache = VersionedResultCache(version_fn=lambda: (3, 'ts', rows['count']), version_ttl=0)
+    assert cache.get('q', lambda query: pd.DataFrame({'n': [rows['count']]}))['n'][0] == 3
+    rows['count'] = 2  # a delete leaves both maxima unchanged
+    assert cache.get('q', lambda query: pd.DataFrame({'n': [rows['count']]}))['n'][0] == 2
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = VersionedResultCache(version_fn=lambda: (1, 'a', 0))
+    release = threading.Event()
+    loads = []
+
+    def loader(query):
+        loads.append(query)
+        release.wait(5)
+        return pd.DataFrame({'x': [1]})
+
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(cache.get_with_status('q', loader)[1]))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == ['q']
+    assert sorted(statuses) == ['coalesced'] * 3 + ['miss']
+
+
+def test_least_recently_used_results_are_evicted_past_the_byte_budget():
+    frame = pd.DataFrame({'x': range(100)})
+    size = int(frame.memory_usage(deep=True).sum())
+    cache = VersionedResultCache(version_fn=lambda: (1, 'a', 0), max_bytes=size * 2)
+    cache.get('a', lambda query: frame.copy())
+    cache.get('b', lambda query: frame.copy())
+    cache.get('a', lambda query: frame.copy())   # 'b' is now the least recently used
+    cache.get('c', lambda query: frame.copy())
+    assert {key[0] for key in cache._entries} == {'a', 'c'}
+    stats = cache.stats()
+    assert (stats['evictions'], stats['bytes']) == (1, size * 2)
+
+
+def test_mysql_version_reads_the_delete_counter_without_counting_rows(fake_db):
+    cursor = fake_db(backends)
+    cursor.results = {'MAX(log_id)': [{'max_log_id': 7, 'max_updated_at': 'ts', 'deletes': 2}]}
+    assert backends.MySQLBackend().version() == (7, 'ts', 2)
+    assert 'COUNT(' not in cursor.statements[-1]
@@ -0,0 +1,66 @@
+import re
+import time
+
+import pandas as pd
+
+import rollups
+from queries import query_map
+
+# Vehicle counts tie often; those LIMIT queries agree on the counts, not on which tied vehicles make the cut
+TIED_ORDER = {"Top 10 vehicle_Number involved in drug-related stops", "Most frequently searched vehicles"}
+
+
+def _duckdb(sql):
+    """Rewrites the MySQL-only parts of the rollup SQL for DuckDB."""
+    sql = sql.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT (dim_key) DO UPDATE SET")
+    sql = re.sub(r"VALUES\((\w+)\)", r"EXCLUDED.\1", sql)
+    # MySQL casts numbers to text in IFNULL(..., '<null>') and text to numbers in stop_duration * n
+    sql = re.sub(r"IFNULL\(([^,]+), '<null>'\)", r"IFNULL(CAST(\1 AS VARCHAR), '<null>')", sql)
+    sql = sql.replace("stop_duration * total_stops",
+                      "COALESCE(TRY_CAST(regexp_extract(stop_duration, '^[0-9]+') AS DOUBLE), 0) * total_stops")
+    return sql.replace('%s', '?')
+
+
+def _in_order(frame):
+    """Rows in a fixed order, since rows that tie on the ORDER BY keys may come back in any order."""
+    frame = frame.astype({column: float for column in frame.columns if frame[column].dtype.kind in 'iuf'})
+    return frame.sort_values(list(frame.columns), ignore_index=True)
+
+
+def test_rollup_answers_match_the_base_queries(embedded_backend):
+    embedded_backend.execute("SELECT 1")  # loads policelog_data
+    connection = embedded_backend.connection
+    for statement in rollups.SCHEMA_STATEMENTS[:-1]:
+        connection.execute(statement)
+    # Two refreshes, so the second one adds onto existing rollup rows
+    for bounds in ((0, 1000), (1000, 3000)):
+        for statement in rollups.REFRESH_STATEMENTS:
+            connection.execute(_duckdb(statement), list(bounds))
+
+    for title, rollup_sql in rollups.ROLLUP_QUERY_MAP.items():
+        from_rollups = embedded_backend.execute(_duckdb(rollup_sql))
+        from_base = embedded_backend.execute(query_map[title])
+        if title in TIED_ORDER:
+            from_rollups, from_base = from_rollups.iloc[:, 1:], from_base.iloc[:, 1:]
+        pd.testing.assert_frame_equal(_in_order(from_rollups), _in_order(from_base), check_dtype=False,
+                                      check_exact=False, obj=title)
+
+
+def test_rollup_queries_carry_their_mark():
+    title = next(iter(rollups.ROLLUP_QUERY_MAP))
+    assert rollups.rollup_query(title, 10) != rollups.rollup_query(title, 12)
+    assert rollups.rollup_query(title, 10).startswith(rollups.ROLLUP_QUERY_MAP[title])
+
+
+def test_refresher_runs_in_the_background_at_most_once_per_interval(monkeypatch):
+    marks = iter([10, 12])
+    monkeypatch.setattr(rollups, '_refresh', lambda: (0, next(marks)))
+    refresher = rollups.RollupRefresher(interval=60)
+    refresher.request()
+    refresher._thread.join()
+    assert refresher.request() == 10     # within the interval: no second refresh
+    assert refresher._thread.is_alive() is False
+    refresher._requested_at = time.monotonic() - 60
+    refresher.request()
+    refresher._thread.join()
+    assert refresher.mark == 12
@@ -0,0 +1,53 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from schema import memory_report, optimize_frame
+
+# As pymysql returns them: every column object dtype, NULLs as None
+RAW = pd.DataFrame({
+    'log_id': [1, 70000, 3, 4],
+    'driver_age': [19, None, 45, 88],
+    'violation_code': [-1, 2, None, 3],
+    'country_name': ['India', 'Canada', None, 'India'],
+    'is_arrested': [1, 0, None, 1],
+    'stop_date': [date(2024, 1, 1), None, date(2024, 2, 29), date(2024, 12, 31)],
+    'updated_at': [datetime(2024, 1, 1, 8, 30), datetime(2024, 1, 2), None, datetime(2024, 12, 31, 23, 59, 59)],
+    'stop_time': [timedelta(hours=8, minutes=5), None, timedelta(0), timedelta(hours=23, minutes=59)],
+    'arrest_rate': [12.5, None, 0.0, 100.0],
+}, dtype=object)
+
+
+def test_optimize_frame_keeps_values_and_nulls():
+    typed = optimize_frame(RAW)
+    assert str(typed['log_id'].dtype) == 'UInt32'
+    assert str(typed['driver_age'].dtype) == 'UInt8'
+    assert str(typed['violation_code'].dtype) == 'Int8'
+    assert isinstance(typed['country_name'].dtype, pd.CategoricalDtype)
+    assert str(typed['is_arrested'].dtype) == 'boolean'
+    for column in RAW.columns:
+        # Same nulls in the same rows, and the same value everywhere else
+        assert typed[column].isna().tolist() == RAW[column].isna().tolist(), column
+        for raw_value, typed_value in zip(RAW[column], typed[column]):
+            if raw_value is None:
+                continue
+            if isinstance(raw_value, date) and not isinstance(raw_value, datetime):
+                raw_value = pd.Timestamp(raw_value)
+            assert typed_value == raw_value, column
+    # Untyped columns (aggregates, aliases) are left alone and the input is not modified
+    assert typed['arrest_rate'].dtype == object
+    assert (RAW.dtypes == object).all()
+
+
+def test_optimize_frame_is_a_no_op_on_typed_frames():
+    typed = optimize_frame(RAW)
+    again = optimize_frame(typed)
+    pd.testing.assert_frame_equal(again, typed)
+
+
+def test_memory_report_shows_the_saving():
+    raw = pd.concat([RAW] * 500, ignore_index=True)
+    report = memory_report(raw, optimize_frame(raw))
+    assert report['rows'] == 2000
+    assert report['bytes_after'] < report['bytes_before']
+    assert report['reduction_percentage'] > 0
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from schema import optimize_frame
+from sketches import ApproximateStats, CountMinSketch, HyperLogLog
+from synthetic import generate_stops
+
+
+def test_hyperloglog_stays_within_its_error_bound():
+    for distinct in (500, 50000):
+        sketch = HyperLogLog()
+        values = np.array([f"TN{number:08d}" for number in range(distinct)], dtype=object)
+        # Each vehicle seen several times; repeats must not move the estimate
+        sketch.add(np.concatenate([values, values[: distinct // 2], values[::3]]))
+        # 3 standard errors: holds for all but ~0.3% of hash seeds, and these are fixed
+        assert abs(sketch.estimate() - distinct) <= 3 * sketch.relative_error * distinct
+
+
+def test_hyperloglog_merge_equals_one_sketch_over_both_inputs():
+    left, right, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    first, second = [f"A{i}" for i in range(3000)], [f"B{i}" for i in range(2000)]
+    left.add(first)
+    right.add(second)
+    both.add(first + second)
+    left.merge(right)
+    assert left.estimate() == both.estimate()
+
+
+def test_count_min_never_undercounts_and_stays_within_its_bound():
+    rng = np.random.default_rng(11)
+    values = np.array([f"TN{number:08d}" for number in rng.zipf(1.3, size=60000) % 20000], dtype=object)
+    sketch = CountMinSketch()
+    for batch in np.array_split(values, 6):
+        sketch.add(batch)
+    truth = pd.Series(values).value_counts()
+    estimates = pd.Series(sketch.estimate(truth.index.to_numpy(dtype=object)), index=truth.index)
+    assert (estimates >= truth).all()
+    # Holds per item with probability 1 - e^-4 (~98%); allow that share to exceed it
+    assert ((estimates - truth) > sketch.overcount_bound).mean() <= np.exp(-4)
+    # The heavy hitters make the candidate list
+    assert set(truth.index[:10]) <= sketch.candidates
+
+
+def test_sampled_demographics_cover_the_true_counts():
+    frame = optimize_frame(generate_stops(60000, seed=5))
+    stats = ApproximateStats(seed=1)
+    stats.add_rows(frame)
+    result, _ = stats.demographics()
+    truth = frame.groupby(['country_name', 'driver_gender', 'driver_race'], observed=True).size()
+    keys = list(zip(result['country_name'], result['driver_gender'], result['driver_race']))
+    error = (result['total_stops'] - truth.loc[keys].to_numpy()).abs()
+    # 95% intervals: allow a few misses across the groups, never a miss by more than double the margin
+    assert (error <= result['total_stops_margin']).mean() >= 0.85
+    assert (error <= 2 * result['total_stops_margin'] + 1).all()
+
+
+def test_age_histograms_are_exact():
+    frame = optimize_frame(generate_stops(5000, seed=9))
+    stats = ApproximateStats()
+    stats.add_rows(frame)
+    result, _ = stats.younger_violations()
+    truth = frame[frame['driver_age'] < 25].groupby('violation', observed=True).size()
+    assert dict(zip(result['violation'], result['total_stops'])) == {k: int(v) for k, v in truth.items() if v}
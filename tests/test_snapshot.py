@@ -0,0 +1,120 @@
+import os
+from datetime import datetime
+
+import snapshot
+from snapshot import LocalSnapshot
+
+BACKFILLED_AT = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _rows(count, updated_at=BACKFILLED_AT, first_id=1):
+    return [{'log_id': log_id, 'country_name': 'India', 'driver_gender': 'M', 'updated_at': updated_at}
+            for log_id in range(first_id, first_id + count)]
+
+
+def test_idle_sync_does_not_rewrite_the_snapshot(tmp_path, fake_db):
+    cursor = fake_db(snapshot)
+    # Every row shares the backfilled timestamp; the fake server ignores the WHERE clause
+    cursor.results = {'FROM policelog_data': _rows(1000)}
+    local = LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    assert local.sync() == 1000
+    assert (local.watermark, local._version.watermark_log_id) == (BACKFILLED_AT, 1000)
+    table = local.table
+
+    assert local.sync() == 0
+    assert local.table is table
+    assert "log_id > 1000" in cursor.statements[-1]
+
+
+def test_sync_merges_only_new_or_changed_rows(tmp_path, fake_db):
+    cursor = fake_db(snapshot)
+    cursor.results = {'FROM policelog_data': _rows(10)}
+    local = LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    local.sync()
+
+    later = datetime(2024, 5, 1, 12, 0, 3)
+    edited = {**_rows(1, later, first_id=4)[0], 'country_name': 'USA'}
+    cursor.results = {'FROM policelog_data': _rows(10) + [edited] + _rows(2, later, first_id=11)}
+    assert local.sync() == 3
+    assert local.row_count == 12
+    assert local.frame.set_index('log_id').loc[4, 'country_name'] == 'USA'
+    assert (local.watermark, local._version.watermark_log_id) == (later, 12)
+
+
+def test_sync_never_replaces_a_mapped_file(tmp_path, fake_db, monkeypatch):
+    cursor = fake_db(snapshot)
+    cursor.results = {'FROM policelog_data': _rows(10)}
+    local = LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    local.sync()
+    first = local.table
+
+    # Windows refuses to delete (or replace) a file that is still mapped
+    def remove_unmapped(path):
+        raise PermissionError(f"{path} is in use")
+
+    remove = os.remove
+    monkeypatch.setattr(snapshot.os, 'remove', remove_unmapped)
+    cursor.results = {'FROM policelog_data': _rows(2, datetime(2024, 5, 1, 12, 0, 3), first_id=11)}
+    assert local.sync() == 2
+    assert [number for number, _ in snapshot.snapshot_files(local.path)] == [1, 2]
+    assert local.row_count == 12 and first.num_rows == 10
+
+    monkeypatch.setattr(snapshot.os, 'remove', remove)
+    cursor.results = {'FROM policelog_data': _rows(1, datetime(2024, 5, 1, 12, 0, 6), first_id=13)}
+    local.sync()
+    # One new row is a delta on base 2; base 1 is no longer mapped and goes
+    assert [number for number, _ in snapshot.snapshot_files(local.path)] == [2]
+    assert [number for number, _ in snapshot.delta_files(local.path, 2)] == [1]
+    assert LocalSnapshot(local.path).load() and local.row_count == 13
+
+
+def test_sync_writes_changes_as_deltas_and_compacts(tmp_path, fake_db, monkeypatch):
+    monkeypatch.setattr(snapshot, 'MAX_DELTA_FILES', 3)
+    cursor = fake_db(snapshot)
+    cursor.results = {'FROM policelog_data': _rows(1000)}
+    local = LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    local.sync()
+    base_path = snapshot.current_snapshot_path(local.path)
+    base_mtime = os.stat(base_path).st_mtime_ns
+
+    for step in range(1, 4):
+        later = datetime(2024, 5, 1, 12, 0, step)
+        edited = {**_rows(1, later, first_id=step)[0], 'country_name': 'USA'}
+        cursor.results = {'FROM policelog_data': [edited] + _rows(2, later, first_id=999 + 2 * step)}
+        assert local.sync() == 3
+        # Only the changed rows are written; the base file is left as it is
+        assert os.stat(base_path).st_mtime_ns == base_mtime
+        assert len(snapshot.snapshot_chain(local.path)) == 1 + step
+        assert local.row_count == 1000 + 2 * step
+
+    frame = local.frame.set_index('log_id')
+    assert (frame.loc[[1, 2, 3], 'country_name'] == 'USA').all() and frame.loc[4, 'country_name'] == 'India'
+    # A cold start applies the same deltas
+    cold = LocalSnapshot(local.path)
+    assert cold.load()
+    assert cold.frame.equals(local.frame) and cold.watermark == local.watermark
+
+    cursor.results = {'FROM policelog_data': _rows(1, datetime(2024, 5, 1, 12, 0, 9), first_id=1007)}
+    local.sync()
+    assert snapshot.snapshot_chain(local.path) == [snapshot.current_snapshot_path(local.path)]
+    assert [number for number, _ in snapshot.snapshot_files(local.path)] == [2]
+    assert local.row_count == 1007 and local.frame['log_id'].is_monotonic_increasing
+
+
+def test_sync_reads_inserts_that_commit_behind_the_watermark(tmp_path, fake_db):
+    cursor = fake_db(snapshot)
+    # log_id 4 is allocated but not committed yet
+    cursor.results = {'FROM policelog_data': _rows(3) + _rows(3, first_id=5)}
+    local = LocalSnapshot(str(tmp_path / 'policelog_data.arrow'))
+    local.sync()
+    assert local.high_water_mark == 3
+
+    # It commits with an updated_at long before the updated_at watermark and overlap
+    late = _rows(1, datetime(2024, 5, 1, 11, 0, 0), first_id=4)
+    # The server returns it with the rows above the mark, which are already loaded
+    cursor.results = {'FROM policelog_data': late + _rows(3, first_id=5)}
+    assert local.sync() == 1
+    assert "WHERE log_id > 3 OR" in cursor.statements[-1]
+    assert local.high_water_mark == 7 and local.row_count == 7
+    cold = LocalSnapshot(local.path)
+    assert cold.load() and cold.high_water_mark == 7
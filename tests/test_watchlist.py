@@ -0,0 +1,37 @@
+import pandas as pd
+
+from watchlist import WatchlistIndex
+
+
+def _stops(*events):
+    return pd.DataFrame([
+        {'log_id': log_id, 'vehicle_number': vehicle, 'stop_date': '2024-05-01',
+         'drugs_related_stop': drugs, 'search_conducted': searched, 'is_arrested': arrested}
+        for log_id, (vehicle, drugs, searched, arrested) in enumerate(events, start=1)
+    ])
+
+
+def test_one_drug_stop_or_arrest_or_two_searches_flag_a_vehicle():
+    watchlist = WatchlistIndex()
+    watchlist.seed(_stops(
+        ('DRUG1', 1, 0, 0),
+        ('ARREST1', 0, 0, 1),
+        ('SEARCH2', 0, 1, 0), ('SEARCH2', 0, 1, 0),
+        ('SEARCH1', 0, 1, 0),
+        ('CLEAN', 0, 0, 0), ('CLEAN', 0, 0, 0),
+    ))
+    assert watchlist.lookup('DRUG1')['reasons'] == ["1 drug-related stop(s)"]
+    assert watchlist.lookup('ARREST1')['reasons'] == ["1 arrest(s)"]
+    assert watchlist.lookup('SEARCH2')['reasons'] == ["2 search(es)"]
+    assert watchlist.lookup('SEARCH1') is None
+    assert watchlist.lookup('CLEAN') is None
+    assert watchlist.flagged_count() == 3
+    assert watchlist.high_water_mark == 7
+
+
+def test_searches_add_up_across_batches_and_spellings():
+    watchlist = WatchlistIndex(use_bloom_filter=True)
+    watchlist.add_rows(_stops(('tn 01-ab 1234', 0, 1, 0)))
+    assert watchlist.lookup('TN01AB1234') is None
+    watchlist.add_rows(_stops(('TN01AB1234', 0, 1, 0)))
+    assert watchlist.lookup('tn01ab1234')['reasons'] == ["2 search(es)"]
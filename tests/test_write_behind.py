@@ -0,0 +1,80 @@
+import pymysql
+import pytest
+
+import write_behind
+from db import PoolTimeoutError
+from write_behind import WriteBehindQueue, is_transient
+
+STOP = {
+    'stop_date': '2024-05-01', 'stop_time': '10:15:00', 'country_name': 'India', 'driver_gender': 'M',
+    'driver_age_raw': 27, 'driver_age': 27, 'driver_race': 'White', 'violation_raw': 'Speeding',
+    'violation': 'Speeding', 'search_conducted': 0, 'search_type': None, 'stop_outcome': 'Warning',
+    'is_arrested': 0, 'stop_duration': '0-15 Min', 'drugs_related_stop': 0, 'vehicle_number': 'TN01AB1234',
+}
+
+
+@pytest.mark.parametrize('error, transient', [
+    (pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query"), True),
+    (pymysql.err.OperationalError(2006, "MySQL server has gone away"), True),
+    (pymysql.err.OperationalError(1213, "Deadlock found"), True),
+    (PoolTimeoutError("no free connection"), True),
+    (pymysql.err.OperationalError(1054, "Unknown column 'x' in 'field list'"), False),
+    (pymysql.err.OperationalError(1142, "INSERT command denied"), False),
+    (pymysql.err.DataError(1406, "Data too long for column"), False),
+])
+def test_transient_errors_are_classified_by_errno(error, transient):
+    assert is_transient(error) is transient
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_behind, 'require_columns', lambda *columns: None)
+    monkeypatch.setattr(write_behind, 'ensure_code_schema', lambda: None)
+    queue = WriteBehindQueue(retry_delay=0, journal_path=str(tmp_path / 'pending_logs.jsonl'),
+                             version_fn=lambda: None)
+    # Flushed by the tests, not the background thread
+    monkeypatch.setattr(queue, '_start', lambda: None)
+    return queue
+
+
+def test_permanent_error_moves_the_batch_aside(queue, monkeypatch):
+    def insert(batch):
+        raise pymysql.err.OperationalError(1142, "INSERT command denied")
+    monkeypatch.setattr(queue, '_insert', insert)
+    queue._buffer.append((0, {**STOP, 'client_log_id': 'a'}))
+    assert queue.flush() == 0
+    assert queue.pending() == 0 and queue.stats()['rejected'] == 1
+
+
+def test_replayed_batch_keeps_its_client_log_ids(queue, monkeypatch):
+    inserted = []
+
+    def insert(batch):
+        inserted.append(list(batch['client_log_id']))
+        if len(inserted) == 1:
+            raise pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+    monkeypatch.setattr(queue, '_insert', insert)
+    queue.submit(STOP)
+    assert queue.flush() == 1
+    assert inserted[0] == inserted[1] and inserted[0][0]
+    assert "ON DUPLICATE KEY UPDATE" in write_behind.WRITE_QUERY
+
+
+def test_invalid_stop_is_refused_before_queueing(queue):
+    with pytest.raises(ValueError, match="unknown stop_outcome"):
+        queue.submit({**STOP, 'stop_outcome': 'Let go'})
+    assert queue.pending() == 0
+
+
+def test_form_choices_keep_their_source_spelling():
+    import pandas as pd
+
+    from codes import OUTCOME_CHOICES, VIOLATION_CHOICES
+    from ingest import normalize_chunk
+
+    records = [{**STOP, 'stop_outcome': outcome} for outcome in OUTCOME_CHOICES]
+    records += [{**STOP, 'violation': violation} for violation in VIOLATION_CHOICES]
+    clean, quarantined = normalize_chunk(pd.DataFrame(records))
+    assert quarantined.empty
+    assert list(clean['stop_outcome'][:len(OUTCOME_CHOICES)]) == OUTCOME_CHOICES
+    assert clean['outcome_code'].notna().all() and clean['violation_code'].notna().all()
@@ -0,0 +1,190 @@
+"""Vehicle watchlist for instant alerts at the check post.
+
+Vehicles are flagged from their stop history: any drug-related stop, any arrest,
+or repeated searches. Only vehicles with at least one such event are kept, each
+with its event counters, in a dict keyed by normalized vehicle number. A lookup
+is one hash probe instead of the "top vehicles" GROUP BY queries.
+
+An optional Bloom filter holds the flagged vehicle numbers in a few bits each and
+answers "definitely not flagged" for clean vehicles. In process the dict probe is
+already faster, so it is off by default; it is meant for terminals that should
+screen vehicles without a copy of the full index.
+
+New stops are folded in incrementally by log_id high-water mark, like the
+prediction index.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+
+import pandas as pd
+
+from db import LogIdGaps, get_db_cursor, require_columns
+from schema import optimize_frame
+
+EVENT_COLUMNS = ['vehicle_number', 'stop_date', 'drugs_related_stop', 'search_conducted', 'is_arrested']
+
+# A vehicle is flagged when any of its counters reaches the threshold
+FLAG_THRESHOLDS = {'drug_stops': 1, 'arrests': 1, 'searches': 2}
+FLAG_REASONS = {'drug_stops': "drug-related stop(s)", 'arrests': "arrest(s)", 'searches': "search(es)"}
+
+
+def normalize_vehicle_number(vehicle_number):
+    """Upper-cases and drops spaces and separators, so 'tn 01-ab 1234' matches 'TN01AB1234'."""
+    return re.sub(r'[^0-9A-Z]', '', str(vehicle_number).upper())
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate` false positives."""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class _Record:
+    """Event counters for one vehicle."""
+
+    __slots__ = ('drug_stops', 'arrests', 'searches', 'last_stop_date')
+
+    def __init__(self):
+        self.drug_stops = 0
+        self.arrests = 0
+        self.searches = 0
+        self.last_stop_date = None
+
+    def reasons(self):
+        return [f"{getattr(self, counter)} {FLAG_REASONS[counter]}"
+                for counter, threshold in FLAG_THRESHOLDS.items() if getattr(self, counter) >= threshold]
+
+
+class WatchlistIndex:
+    """Hash index of flagged vehicle numbers, optionally fronted by a Bloom filter."""
+
+    def __init__(self, use_bloom_filter=False, bloom_capacity=100000):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._log_id_gaps = LogIdGaps()
+        self._vehicles = {}
+        self.bloom = BloomFilter(bloom_capacity) if use_bloom_filter else None
+        self.high_water_mark = 0
+        self.rows_indexed = 0
+        self.last_sync_error = None
+        self._sync_thread = None
+
+    def add_rows(self, frame):
+        """Folds a batch of stops into the per-vehicle counters."""
+        if frame.empty:
+            return
+        # Typed snapshot frames hold nullable booleans, MySQL rows hold 0/1; eq(1) reads both
+        flags = {column: pd.to_numeric(frame[column], errors='coerce').eq(1).fillna(False).astype(bool)
+                 for column in ('drugs_related_stop', 'search_conducted', 'is_arrested')}
+        events = pd.DataFrame({
+            'vehicle': frame['vehicle_number'].astype('string').map(normalize_vehicle_number, na_action='ignore'),
+            'drug_stops': flags['drugs_related_stop'].astype(int),
+            'searches': flags['search_conducted'].astype(int),
+            'arrests': flags['is_arrested'].astype(int),
+            'stop_date': pd.to_datetime(frame['stop_date'], errors='coerce'),
+        })
+        # Only stops with an event can flag a vehicle; the rest never enter the index
+        events = events[events['vehicle'].notna() & (events[['drug_stops', 'searches', 'arrests']].sum(axis=1) > 0)]
+        totals = events.groupby('vehicle').agg(
+            drug_stops=('drug_stops', 'sum'), searches=('searches', 'sum'),
+            arrests=('arrests', 'sum'), last_stop_date=('stop_date', 'max'),
+        )
+        with self._lock:
+            for row in totals.itertuples():
+                vehicle = row.Index
+                record = self._vehicles.get(vehicle)
+                if record is None:
+                    record = self._vehicles[vehicle] = _Record()
+                was_flagged = bool(record.reasons())
+                record.drug_stops += int(row.drug_stops)
+                record.searches += int(row.searches)
+                record.arrests += int(row.arrests)
+                if pd.notna(row.last_stop_date) and (record.last_stop_date is None or row.last_stop_date > record.last_stop_date):
+                    record.last_stop_date = row.last_stop_date
+                if self.bloom is not None and not was_flagged and record.reasons():
+                    self.bloom.add(vehicle)
+            self.rows_indexed += len(frame)
+
+    def lookup(self, vehicle_number):
+        """Returns {'vehicle_number', 'reasons', 'last_stop_date'} for a flagged vehicle, else None."""
+        vehicle = normalize_vehicle_number(vehicle_number)
+        if not vehicle or (self.bloom is not None and vehicle not in self.bloom):
+            return None
+        record = self._vehicles.get(vehicle)
+        reasons = record.reasons() if record is not None else []
+        if not reasons:
+            return None
+        return {'vehicle_number': vehicle, 'reasons': reasons, 'last_stop_date': record.last_stop_date}
+
+    def flagged_count(self):
+        with self._lock:
+            return sum(1 for record in self._vehicles.values() if record.reasons())
+
+    def seed(self, frame):
+        """Indexes a local snapshot of the table so the first sync only fetches newer stops."""
+        if frame.empty or 'log_id' not in frame.columns:
+            return
+        with self._sync_lock:
+            self.add_rows(frame[['log_id'] + EVENT_COLUMNS])
+            self.high_water_mark = max(self.high_water_mark, int(frame['log_id'].max()))
+
+    def sync(self):
+        """Indexes stops logged since the last sync. Returns the number of new rows."""
+        require_columns('log_id')
+        # One sync at a time, so two sessions never fold the same rows in twice
+        with self._sync_lock:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT log_id, {', '.join(EVENT_COLUMNS)} FROM policelog_data WHERE log_id > %s ORDER BY log_id",
+                    (self.high_water_mark,),
+                )
+                new_rows = pd.DataFrame(cursor.fetchall())
+            if new_rows.empty:
+                return 0
+            new_rows.columns = new_rows.columns.str.lower()
+            # Rows above a log_id gap that may still commit are read again on the next sync
+            mark = self._log_id_gaps.safe_mark(self.high_water_mark, new_rows['log_id'])
+            new_rows = new_rows[new_rows['log_id'].astype('int64') <= mark]
+            if not new_rows.empty:
+                self.add_rows(optimize_frame(new_rows))
+            self.high_water_mark = mark
+            return len(new_rows)
+
+    def start_background_sync(self, interval=30):
+        """Picks up stops from other writers (bulk ingest, other dashboards) on a daemon thread."""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                    self.last_sync_error = None
+                except Exception as e:
+                    self.last_sync_error = str(e)
+                    print(f"Watchlist Sync Error: {e}")
+
+        self._sync_thread = threading.Thread(target=run, name='watchlist-sync', daemon=True)
+        self._sync_thread.start()
@@ -0,0 +1,270 @@
+"""Batched write-behind queue for stops logged from the dashboard form.
+
+Submitting a stop only appends it to an in-memory buffer and a local journal file,
+so the form returns at once even when several terminals log at the same time. A
+background thread inserts the buffer as one multi-row INSERT when it holds
+`batch_size` stops or its oldest stop is `flush_interval` seconds old.
+
+- Transient MySQL errors (server unreachable or gone, lost connection, lock wait
+  timeout, deadlock, pool timeout) are retried with backoff; the stops stay
+  buffered and journaled until MySQL accepts them.
+- Stops are validated and coded like bulk ingest (ingest.normalize_chunk); stops
+  that fail validation, or that fail with any other error, are moved to a rejected
+  journal with the reason instead of blocking the queue.
+- Each stop carries a client-generated client_log_id (unique together with its
+  stop_date, added by `python migrate.py`), so re-inserting a batch whose commit
+  was acknowledged too late (lost connection) does not save its stops twice.
+- The journal is replayed on start-up, so buffered stops survive a restart.
+
+The queue writes to MySQL only; the dashboard disables saving on the embedded
+backend.
+
+After every flush, listeners receive the inserted stops plus the table version
+before and after the insert. The versions are None unless the batch was the only
+change in between. A listener can then carry cached results forward by the delta
+instead of recomputing them over the whole table.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pymysql
+
+from backends import MySQLBackend, backend
+from codes import ensure_code_schema
+from db import PoolTimeoutError, get_db_cursor, require_columns
+from ingest import COLUMNS, INSERT_COLUMNS, normalize_chunk
+from snapshot import SNAPSHOT_PATH
+
+JOURNAL_PATH = os.path.join(os.path.dirname(SNAPSHOT_PATH), 'pending_logs.jsonl')
+# Can't connect (2003), server gone (2006), lost connection (2013), lock wait timeout (1205), deadlock (1213)
+TRANSIENT_ERRNOS = {2003, 2006, 2013, 1205, 1213}
+RECORD_COLUMNS = COLUMNS + ['client_log_id']
+WRITE_COLUMNS = INSERT_COLUMNS + ['client_log_id']
+# A replayed stop that is already saved matches its client_log_id and changes nothing
+WRITE_QUERY = f"""INSERT INTO policelog_data ({", ".join(WRITE_COLUMNS)})
+VALUES ({", ".join(["%s"] * len(WRITE_COLUMNS))})
+ON DUPLICATE KEY UPDATE client_log_id = client_log_id"""
+
+
+def is_transient(error):
+    """True for errors worth retrying: the stops can be saved once MySQL is reachable again."""
+    if isinstance(error, (PoolTimeoutError, pymysql.err.InterfaceError)):
+        return True
+    return isinstance(error, pymysql.err.MySQLError) and bool(error.args) and error.args[0] in TRANSIENT_ERRNOS
+
+
+class WriteBehindQueue:
+    """Buffers stop records and inserts them into policelog_data in batches."""
+
+    def __init__(self, batch_size=50, flush_interval=2.0, max_retries=5, retry_delay=0.5,
+                 journal_path=JOURNAL_PATH, version_fn=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.journal_path = journal_path
+        self.version_fn = version_fn or MySQLBackend().version
+
+        self._buffer = []               # (enqueued_at, record)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._stats = {'submitted': 0, 'flushed': 0, 'batches': 0, 'retries': 0, 'rejected': 0}
+        self.last_error = None
+        self.last_flush_at = None
+        self._replay_journal()
+
+    # --- journal ---
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as handle:
+            records = [json.loads(line) for line in handle if line.strip()]
+        for record in records:
+            # Journals written before client_log_id existed
+            if not record.get('client_log_id'):
+                record['client_log_id'] = str(uuid.uuid4())
+        self._buffer = [(time.monotonic(), record) for record in records]
+        if records and not backend.embedded:
+            print(f"Write-behind queue: replaying {len(records)} unsaved stop(s) from {self.journal_path}")
+            self._rewrite_journal(records)
+            self._start()
+
+    def _rewrite_journal(self, records, path=None):
+        path = path or self.journal_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as handle:
+            for record in records:
+                handle.write(json.dumps(record, default=str) + '\n')
+        os.replace(temp_path, path)
+
+    def _append_rejected(self, records):
+        rejected_path = self.journal_path.replace('.jsonl', '.rejected.jsonl')
+        with open(rejected_path, 'a') as handle:
+            for record in records:
+                handle.write(json.dumps(record, default=str) + '\n')
+
+    # --- public interface ---
+    def add_listener(self, listener):
+        """Registers listener(batch, version_before, version_after), called after every successful flush."""
+        self._listeners.append(listener)
+
+    def submit(self, record):
+        """Queues one stop (a dict keyed by policelog_data column) and returns immediately.
+
+        Raises ValueError with the reasons when the stop fails validation, so the officer
+        is told at once instead of the stop being rejected at the next flush.
+        """
+        record = {column: record.get(column) for column in COLUMNS}
+        _, quarantined = normalize_chunk(pd.DataFrame([record], columns=COLUMNS))
+        if not quarantined.empty:
+            raise ValueError(quarantined['reason'].iloc[0])
+        record['client_log_id'] = str(uuid.uuid4())
+        with self._condition:
+            self._buffer.append((time.monotonic(), record))
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, 'a') as handle:
+                handle.write(json.dumps(record, default=str) + '\n')
+            self._stats['submitted'] += 1
+            self._condition.notify()
+        self._start()
+
+    def pending(self):
+        with self._condition:
+            return len(self._buffer)
+
+    def stats(self):
+        with self._condition:
+            snapshot = dict(self._stats)
+            snapshot['pending'] = len(self._buffer)
+        snapshot['last_flush_at'] = str(self.last_flush_at)
+        snapshot['last_error'] = self.last_error
+        return snapshot
+
+    # --- flushing ---
+    def _start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def _due(self):
+        if not self._buffer:
+            return False
+        return len(self._buffer) >= self.batch_size or time.monotonic() - self._buffer[0][0] >= self.flush_interval
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due():
+                    self._condition.wait(timeout=self.flush_interval / 4)
+            try:
+                self.flush()
+            except Exception as e:
+                # Stops stay buffered and journaled; try again after a pause
+                self.last_error = str(e)
+                print(f"Write-Behind Flush Error: {e}")
+                time.sleep(self.flush_interval)
+
+    def _insert(self, batch):
+        with get_db_cursor() as cursor:
+            # pymysql rewrites executemany on INSERT ... VALUES into one multi-row INSERT
+            cursor.executemany(WRITE_QUERY, batch[WRITE_COLUMNS].values.tolist())
+
+    def _delta_versions(self, version_before, rows):
+        """Returns (version_before, version_after) if the last insert was the only change, else (None, None)."""
+        if version_before is None:
+            return None, None
+        try:
+            version_after = self.version_fn()
+            # The delta is exactly this batch when only its rows are newer than the old high-water mark
+            # and the newest change in the table is one of them; the delete counter rules out deletes
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*) AS new_rows, MAX(updated_at) AS max_updated_at FROM policelog_data WHERE log_id > %s",
+                    (version_before[0] or 0,),
+                )
+                row = cursor.fetchone()
+        except Exception as e:
+            print(f"Write-Behind Version Error: {e}")
+            return None, None
+        delta_only = row['new_rows'] == rows and row['max_updated_at'] == version_after[1]
+        if delta_only and version_after[2] == version_before[2]:
+            return version_before, version_after
+        return None, None
+
+    def flush(self):
+        """Inserts up to `batch_size` buffered stops now. Returns the number inserted."""
+        with self._flush_lock:
+            with self._condition:
+                records = [record for _, record in self._buffer[:self.batch_size]]
+            if not records:
+                return 0
+            # Validation failures never reach MySQL; they leave the buffer with this batch
+            frame = pd.DataFrame(records, columns=RECORD_COLUMNS)
+            batch, quarantined = normalize_chunk(frame)
+            batch['client_log_id'] = frame.loc[batch.index, 'client_log_id']
+            quarantined['client_log_id'] = frame.loc[quarantined.index, 'client_log_id']
+            invalid = quarantined.to_dict('records')
+            if invalid:
+                print(f"Write-Behind Invalid Stop(s): {'; '.join(quarantined['reason'].unique())}")
+            if batch.empty:
+                self._drop(len(records), invalid)
+                return 0
+
+            # A missing migration raises here and keeps the stops queued rather than rejecting them
+            require_columns('client_log_id')
+            ensure_code_schema()
+            try:
+                version_before = self.version_fn()
+            except Exception:
+                version_before = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._insert(batch)
+                    break
+                except Exception as e:
+                    if is_transient(e):
+                        if attempt == self.max_retries:
+                            raise
+                        self._stats['retries'] += 1
+                        time.sleep(self.retry_delay * 2 ** attempt)
+                        continue
+                    # Retrying will not help; set the batch aside so later stops can still be saved
+                    self._drop(len(records), invalid + batch.assign(reason=str(e)).to_dict('records'))
+                    self.last_error = str(e)
+                    print(f"Write-Behind Rejected Batch: {e}")
+                    return 0
+
+            self._drop(len(records), invalid)
+            version_before, version_after = self._delta_versions(version_before, len(batch))
+            self._stats['flushed'] += len(batch)
+            self._stats['batches'] += 1
+            self.last_error = None
+            self.last_flush_at = pd.Timestamp.now()
+
+        for listener in self._listeners:
+            try:
+                listener(batch, version_before, version_after)
+            except Exception as e:
+                print(f"Write-Behind Listener Error: {e}")
+        return len(batch)
+
+    def _drop(self, count, rejected=()):
+        """Removes the first `count` buffered stops, moving `rejected` records to the rejected journal."""
+        if rejected:
+            self._append_rejected(rejected)
+        with self._condition:
+            del self._buffer[:count]
+            self._stats['rejected'] += len(rejected)
+            self._rewrite_journal([record for _, record in self._buffer])
+
+
+# Module-level queue, shared by every session in the process like the connection pool in db.py.
+log_writer = WriteBehindQueue()